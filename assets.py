@@ -0,0 +1,112 @@
+"""
+Recursos estáticos con nombres por contenido, servidos con caché inmutable.
+
+``build_assets.py`` descarga las hojas de estilo y scripts de terceros a ``static/vendor/``,
+verificando su integridad, y escribe en ``static/dist/`` una copia de cada recurso, propio o de
+terceros, cuyo nombre incluye el hash de su contenido (``main.3f2a9c1d.js``). Los recursos propios
+se publican sin minificar, sólo precomprimidos: cada copia va con sus variantes ``.gz`` y ``.br``,
+y un ``manifest.json`` relaciona cada nombre original con el suyo.
+
+Con el manifiesto presente, ``url_for('static', filename='main.js')`` devuelve la ruta con hash,
+esas rutas se sirven con ``Cache-Control: public, max-age=31536000, immutable`` (en su variante
+comprimida si el cliente la acepta) y el ETag de la página de preferencias incluye la versión
+del manifiesto, para que un despliegue nuevo invalide las páginas en caché. Sin manifiesto los
+recursos se sirven como siempre y los de terceros se piden a su CDN.
+"""
+
+import json
+import mimetypes
+import os
+
+from flask import request, send_from_directory, url_for
+
+DIRECTORIO_DIST = 'dist'
+
+# Recursos de terceros: nombre local en static/vendor/ -> (URL de origen, integridad SRI)
+RECURSOS_EXTERNOS = {
+    'fastbootstrap.min.css': (
+        'https://cdn.jsdelivr.net/npm/fastbootstrap@2.2.0/dist/css/fastbootstrap.min.css',
+        'sha256-V6lu+OdYNKTKTsVFBuQsyIlDiRWiOmtC8VQ8Lzdm2i4=',
+    ),
+    'bootstrap.bundle.min.js': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+        'sha384-MrcW6ZMFYlzcLA8Nl+NtUVF0sA7MsXsP1UyJoMp4YLEuNSfAP+JcXn/tWtIaxVXM',
+    ),
+}
+
+# Variantes precomprimidas en orden de preferencia: (Content-Encoding, extensión)
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def leer_manifiesto(ruta) -> dict:
+    """Lee el manifiesto generado por ``build_assets.py``; devuelve un diccionario vacío si no existe."""
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return {}
+
+
+def registrar_recursos(app):
+    """
+    Reescribe las URLs de ``static`` según el manifiesto y sirve los recursos con hash.
+
+    Registra siempre la función de plantilla ``recurso_externo``. Si no hay manifiesto no
+    registra nada más.
+
+    :return: El manifiesto cargado (``{'version': ..., 'archivos': {...}}``), o un diccionario vacío.
+    """
+    ruta = app.config.get('SAID_ASSETS_MANIFEST') or os.path.join(app.static_folder, DIRECTORIO_DIST, 'manifest.json')
+    manifiesto = leer_manifiesto(ruta)
+    archivos = manifiesto.get('archivos', {})
+    app.config['SAID_ASSETS_VERSION'] = manifiesto.get('version')
+
+    @app.template_global()
+    def recurso_externo(nombre):
+        """URL e integridad de un recurso de terceros: la copia local si existe, si no el CDN."""
+        local = f'vendor/{nombre}'
+        if local in archivos or os.path.exists(os.path.join(app.static_folder, local)):
+            return {"url": url_for('static', filename=local), "integridad": None}
+        url, integridad = RECURSOS_EXTERNOS[nombre]
+        return {"url": url, "integridad": integridad}
+
+    if not archivos:
+        return manifiesto
+
+    con_hash = set(archivos.values())
+
+    @app.url_defaults
+    def reescribir_estaticos(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in archivos:
+            values['filename'] = archivos[values['filename']]
+
+    @app.before_request
+    def servir_con_hash():
+        if request.endpoint != 'static' or request.view_args.get('filename') not in con_hash:
+            return None
+        nombre = request.view_args['filename']
+        directorio = app.static_folder
+        aceptadas = request.accept_encodings
+        for codificacion, extension in CODIFICACIONES:
+            if aceptadas[codificacion] and os.path.exists(os.path.join(directorio, nombre + extension)):
+                response = send_from_directory(directorio, nombre + extension, max_age=31536000,
+                                               mimetype=_tipo_mime(nombre))
+                response.headers['Content-Encoding'] = codificacion
+                break
+        else:
+            response = send_from_directory(directorio, nombre, max_age=31536000)
+        response.headers['Cache-Control'] = CACHE_INMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
+
+    return manifiesto
+
+
+def _tipo_mime(nombre):
+    # El tipo de la variante comprimida es el del archivo original, no el de .gz o .br
+    tipo, _ = mimetypes.guess_type(nombre)
+    if tipo and tipo.startswith('text/'):
+        return f'{tipo}; charset=utf-8'
+    return tipo or 'application/octet-stream'
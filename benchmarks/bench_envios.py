@@ -0,0 +1,331 @@
+"""
+Benchmark de carga para la ventana de envío de preferencias.
+
+Levanta la aplicación de ``wsgi.py`` en un servidor local con hilos (o apunta a uno ya
+levantado con ``--url``) y simula sesiones de profesores concurrentes:
+
+1. ``GET /auth?token=...`` con un JWT firmado con ``SECRET_KEY``;
+2. ``GET /preferences`` (la grilla se lee del HTML, como lo haría el navegador);
+3. con probabilidad ``--submit-ratio``, ``POST /submit`` con preferencias al azar;
+4. con probabilidad ``--reload-ratio``, otra vez ``GET /preferences`` con ``If-None-Match``.
+
+Informa p50/p95/p99, throughput y sentencias SQL por request (del encabezado
+``Server-Timing``, por lo que se activa ``SAID_INSTRUMENTACION_SQL``) y guarda el resultado en
+JSON. Con ``--baseline`` compara el p95 de cada paso contra una corrida anterior y termina con
+código 1 si alguno empeoró más que ``--max-regression`` por ciento.
+
+Ejemplos::
+
+    python benchmarks/bench_envios.py --database-url sqlite:////tmp/said-bench.db --seed
+    python benchmarks/bench_envios.py --sessions 2000 --concurrency 32 --baseline anterior.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASOS = ('auth', 'preferences', 'submit', 'reload')
+PATRON_BLOQUE = re.compile(r'data-id="(\d+)"')
+PATRON_SERVER_TIMING = re.compile(r'db;dur=([\d.]+);desc="(\d+) consultas"')
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    """Deja que la respuesta 302 de /auth se mida por separado de /preferences."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Resultados:
+    """Acumula las mediciones de todos los hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.sentencias = defaultdict(list)
+        self.db_ms = defaultdict(list)
+        self.estados = defaultdict(lambda: defaultdict(int))
+        self.errores = defaultdict(int)
+
+    def registrar(self, paso, segundos, estado, server_timing):
+        with self._lock:
+            self.latencias[paso].append(segundos * 1000)
+            self.estados[paso][str(estado)] += 1
+            if estado >= 400 or estado == 0:
+                self.errores[paso] += 1
+            coincidencia = PATRON_SERVER_TIMING.search(server_timing or '')
+            if coincidencia:
+                self.db_ms[paso].append(float(coincidencia.group(1)))
+                self.sentencias[paso].append(int(coincidencia.group(2)))
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano de una lista no vacía."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+
+def _promedio(valores):
+    return round(sum(valores) / len(valores), 2) if valores else None
+
+
+def generar_token(cedula, secreto):
+    import jwt
+
+    ahora = datetime.now(timezone.utc)
+    payload = {"user_id": cedula, "exp": ahora + timedelta(minutes=30), "iat": ahora, "aud": 'horariosFIUM2025'}
+    return jwt.encode(payload, secreto, algorithm="HS256")
+
+
+def _pedir(abridor, resultados, paso, url, datos=None, encabezados=None):
+    pedido = urllib.request.Request(url, data=datos, headers=encabezados or {})
+    inicio = time.perf_counter()
+    try:
+        with abridor.open(pedido, timeout=60) as respuesta:
+            cuerpo = respuesta.read()
+            estado, cabeceras = respuesta.status, respuesta.headers
+    except urllib.error.HTTPError as error:
+        cuerpo = error.read()
+        estado, cabeceras = error.code, error.headers
+    except OSError:
+        resultados.registrar(paso, time.perf_counter() - inicio, 0, None)
+        return 0, {}, b''
+    resultados.registrar(paso, time.perf_counter() - inicio, estado, cabeceras.get('Server-Timing'))
+    return estado, cabeceras, cuerpo
+
+
+def sesion(base, cedula, secreto, resultados, azar, proporcion_envio, proporcion_recarga):
+    """Recorre /auth → /preferences → /submit como lo haría un profesor."""
+    abridor = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _SinRedirecciones,
+    )
+    estado, _, _ = _pedir(abridor, resultados, 'auth', f"{base}/auth?token={generar_token(cedula, secreto)}")
+    if estado != 302:
+        return
+
+    estado, cabeceras, cuerpo = _pedir(abridor, resultados, 'preferences', f"{base}/preferences")
+    if estado != 200:
+        return
+    etag = cabeceras.get('ETag')
+    bloques = PATRON_BLOQUE.findall(cuerpo.decode('utf-8', 'replace'))
+
+    if bloques and azar.random() < proporcion_envio:
+        elegidos = azar.sample(bloques, k=azar.randint(1, len(bloques)))
+        datos = json.dumps({
+            "preferences": {bloque: azar.randint(1, 3) for bloque in elegidos},
+            "min_dias": azar.random() < 0.5,
+        }).encode()
+        _pedir(abridor, resultados, 'submit', f"{base}/submit", datos, {'Content-Type': 'application/json'})
+        etag = None
+
+    if azar.random() < proporcion_recarga:
+        _pedir(abridor, resultados, 'reload', f"{base}/preferences", encabezados={'If-None-Match': etag} if etag else {})
+
+
+def _iniciar_servidor(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class _SinLog(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    servidor = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_SinLog)
+    threading.Thread(target=servidor.serve_forever, name='said-bench', daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_port}"
+
+
+def _cedulas(app):
+    from entities import Profesor, db
+
+    with app.app_context():
+        consulta = db.session.query(Profesor.cedula).filter(Profesor.puede_dictar.any())
+        return [cedula for (cedula,) in consulta.order_by(Profesor.cedula)]
+
+
+def _commit_git():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def resumir(resultados, duracion, sesiones):
+    """Arma el resumen por paso y global a partir de las mediciones."""
+    pasos = {}
+    for paso in PASOS:
+        latencias = resultados.latencias.get(paso)
+        if not latencias:
+            continue
+        pasos[paso] = {
+            "requests": len(latencias),
+            "errores": resultados.errores.get(paso, 0),
+            "estados": dict(resultados.estados[paso]),
+            "p50_ms": round(percentil(latencias, 50), 2),
+            "p95_ms": round(percentil(latencias, 95), 2),
+            "p99_ms": round(percentil(latencias, 99), 2),
+            "max_ms": round(max(latencias), 2),
+            "sentencias_promedio": _promedio(resultados.sentencias.get(paso)),
+            "sentencias_max": max(resultados.sentencias[paso]) if resultados.sentencias.get(paso) else None,
+            "db_ms_promedio": _promedio(resultados.db_ms.get(paso)),
+        }
+    total = sum(p["requests"] for p in pasos.values())
+    return {
+        "duracion_s": round(duracion, 3),
+        "sesiones": sesiones,
+        "requests": total,
+        "errores": sum(p["errores"] for p in pasos.values()),
+        "requests_por_s": round(total / duracion, 2) if duracion else None,
+        "sesiones_por_s": round(sesiones / duracion, 2) if duracion else None,
+        "pasos": pasos,
+    }
+
+
+def comparar(actual, base, maximo_regresion):
+    """Devuelve las líneas de comparación de p95 y si alguna supera la regresión permitida."""
+    lineas, regresion = [], False
+    for paso, datos in actual["resumen"]["pasos"].items():
+        anterior = base.get("resumen", {}).get("pasos", {}).get(paso)
+        if not anterior or not anterior.get("p95_ms"):
+            continue
+        cambio = (datos["p95_ms"] - anterior["p95_ms"]) / anterior["p95_ms"] * 100
+        marca = ''
+        if cambio > maximo_regresion:
+            marca, regresion = '  <-- regresión', True
+        lineas.append(f"{paso:<12} p95 {anterior['p95_ms']:>9.1f} -> {datos['p95_ms']:>9.1f} ms ({cambio:+.1f}%){marca}")
+    return lineas, regresion
+
+
+def imprimir(resumen):
+    print(f"{'paso':<12}{'reqs':>7}{'err':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'sql':>7}{'db ms':>8}")
+    for paso, datos in resumen["pasos"].items():
+        sql = datos["sentencias_promedio"]
+        db_ms = datos["db_ms_promedio"]
+        print(
+            f"{paso:<12}{datos['requests']:>7}{datos['errores']:>6}{datos['p50_ms']:>9.1f}{datos['p95_ms']:>9.1f}"
+            f"{datos['p99_ms']:>9.1f}{sql if sql is not None else '-':>7}{db_ms if db_ms is not None else '-':>8}"
+        )
+    print(
+        f"{resumen['requests']} requests en {resumen['duracion_s']} s: "
+        f"{resumen['requests_por_s']} req/s, {resumen['sesiones_por_s']} sesiones/s, {resumen['errores']} errores"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', help="Base a usar al levantar la app (por defecto DATABASE_URL o .env)")
+    parser.add_argument('--url', help="Usar un servidor ya levantado (por ejemplo gunicorn) en vez de uno propio")
+    parser.add_argument('--seed', action='store_true', help="Recrear la base con datos sintéticos antes de medir")
+    parser.add_argument('--professors', type=int, default=500, help="Profesores a generar con --seed")
+    parser.add_argument('--subjects', type=int, default=80, help="Materias a generar con --seed")
+    parser.add_argument('--blocks-per-day', type=int, default=6, help="Bloques por día a generar con --seed")
+    parser.add_argument('--density', type=float, default=0.4, help="Densidad de preferencias previas con --seed")
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--submit-ratio', type=float, default=0.8)
+    parser.add_argument('--reload-ratio', type=float, default=0.3)
+    parser.add_argument('--random-seed', type=int, default=2025)
+    parser.add_argument('--output', help="Archivo JSON de salida (por defecto benchmarks/resultados/<fecha>.json)")
+    parser.add_argument('--baseline', help="Resultado JSON anterior contra el cual comparar")
+    parser.add_argument('--max-regression', type=float, default=20.0, help="Aumento de p95 tolerado, en por ciento")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SECRET_KEY', secrets.token_hex(16))
+    os.environ['SAID_INSTRUMENTACION_SQL'] = 'true'
+    sys.path.insert(0, RAIZ)
+    from wsgi import app
+
+    secreto = app.secret_key
+    if args.seed:
+        from initialize_db import generar_datos_sinteticos
+
+        generar_datos_sinteticos(
+            profesores=args.professors,
+            materias=args.subjects,
+            bloques_por_dia=args.blocks_per_day,
+            densidad=args.density,
+            semilla=args.random_seed,
+        )
+    cedulas = _cedulas(app)
+    if not cedulas:
+        parser.error("la base no tiene profesores con materias asignadas; usar --seed")
+
+    servidor = None
+    base = args.url.rstrip('/') if args.url else None
+    if base is None:
+        servidor, base = _iniciar_servidor(app)
+
+    resultados = Resultados()
+    azar = random.Random(args.random_seed)
+    trabajos = [(cedula, random.Random(azar.random())) for cedula in (azar.choice(cedulas) for _ in range(args.sessions))]
+    inicio = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as ejecutor:
+            futuros = [
+                ejecutor.submit(
+                    sesion, base, cedula, secreto, resultados, azar_sesion, args.submit_ratio, args.reload_ratio,
+                )
+                for cedula, azar_sesion in trabajos
+            ]
+            for futuro in futuros:
+                futuro.result()
+    finally:
+        duracion = time.perf_counter() - inicio
+        if servidor is not None:
+            servidor.shutdown()
+
+    salida = {
+        "fecha": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "commit": _commit_git(),
+        "python": platform.python_version(),
+        "base_de_datos": app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1],
+        "parametros": {
+            "url": args.url,
+            "sesiones": args.sessions,
+            "concurrencia": args.concurrency,
+            "proporcion_envio": args.submit_ratio,
+            "proporcion_recarga": args.reload_ratio,
+            "semilla": args.random_seed,
+            "profesores": len(cedulas),
+            "almacenamiento": app.config.get('SAID_ALMACENAMIENTO_PREFERENCIAS'),
+        },
+        "resumen": resumir(resultados, duracion, args.sessions),
+    }
+    imprimir(salida["resumen"])
+
+    ruta = args.output or os.path.join(RAIZ, 'benchmarks', 'resultados', f"{datetime.now():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(salida, archivo, ensure_ascii=False, indent=2)
+    print(f"Resultado guardado en {ruta}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as archivo:
+            lineas, regresion = comparar(salida, json.load(archivo), args.max_regression)
+        print("\n".join(lineas))
+        if regresion:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
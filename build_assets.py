@@ -0,0 +1,151 @@
+"""
+Genera los recursos estáticos que sirve ``assets.py``.
+
+1. Descarga a ``static/vendor/`` las hojas de estilo y scripts de terceros de
+   ``assets.RECURSOS_EXTERNOS`` que falten, verificando su hash de integridad (SRI). Esa
+   carpeta se versiona, para que los despliegues no dependan del CDN.
+2. Escribe en ``static/dist/`` cada recurso con el hash de su contenido en el nombre, más sus
+   variantes ``.gz`` y ``.br`` (esta última si está instalado el paquete ``brotli``), y el
+   ``manifest.json`` que lee la aplicación al arrancar. ``static/*.css`` y ``static/*.js`` se
+   publican sin minificar: la compresión se lleva la mayor parte de la ganancia sin el riesgo
+   de alterar cadenas o expresiones regulares.
+
+Termina con error si falta la copia local de algún recurso de terceros, salvo con ``--allow-cdn``.
+
+Debe correrse en cada despliegue, antes de reiniciar los workers::
+
+    python build_assets.py
+    python build_assets.py --offline   # sin descargar, con los recursos de vendor/ versionados
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import urllib.request
+
+from assets import DIRECTORIO_DIST, RECURSOS_EXTERNOS
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+DIRECTORIO_STATIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+
+def verificar_integridad(contenido: bytes, integridad: str) -> bool:
+    """Compara el contenido con un valor SRI como ``sha384-<base64>``."""
+    algoritmo, esperado = integridad.split('-', 1)
+    return base64.b64encode(hashlib.new(algoritmo, contenido).digest()).decode() == esperado
+
+
+def descargar_externos(directorio, forzar=False):
+    """
+    Descarga los recursos de terceros que falten en ``<directorio>/vendor``.
+
+    :raises ValueError: Si un recurso descargado no coincide con su hash de integridad.
+    :return: Los nombres de los recursos descargados.
+    """
+    destino = os.path.join(directorio, 'vendor')
+    os.makedirs(destino, exist_ok=True)
+    descargados = []
+    for nombre, (url, integridad) in RECURSOS_EXTERNOS.items():
+        ruta = os.path.join(destino, nombre)
+        if os.path.exists(ruta) and not forzar:
+            continue
+        with urllib.request.urlopen(url, timeout=30) as respuesta:
+            contenido = respuesta.read()
+        if not verificar_integridad(contenido, integridad):
+            raise ValueError(f"{url} no coincide con su hash de integridad {integridad}")
+        with open(ruta, 'wb') as archivo:
+            archivo.write(contenido)
+        descargados.append(nombre)
+    return descargados
+
+
+def _fuentes(directorio):
+    """Recursos a publicar: (nombre relativo a static, contenido)."""
+    for nombre in sorted(os.listdir(directorio)):
+        ruta = os.path.join(directorio, nombre)
+        if not os.path.isfile(ruta) or not nombre.endswith(('.css', '.js')):
+            continue
+        with open(ruta, 'rb') as archivo:
+            yield nombre, archivo.read()
+    vendor = os.path.join(directorio, 'vendor')
+    if os.path.isdir(vendor):
+        for nombre in sorted(os.listdir(vendor)):
+            with open(os.path.join(vendor, nombre), 'rb') as archivo:
+                yield f'vendor/{nombre}', archivo.read()
+
+
+def construir(directorio=DIRECTORIO_STATIC):
+    """
+    Reescribe ``<directorio>/dist`` con los recursos con hash y el manifiesto.
+
+    :return: El manifiesto escrito.
+    """
+    dist = os.path.join(directorio, DIRECTORIO_DIST)
+    fuentes = list(_fuentes(directorio))
+    shutil.rmtree(dist, ignore_errors=True)
+    os.makedirs(dist)
+
+    archivos = {}
+    for nombre, contenido in fuentes:
+        base, extension = os.path.splitext(nombre)
+        hash_contenido = hashlib.sha256(contenido).hexdigest()[:10]
+        publicado = f'{DIRECTORIO_DIST}/{base}.{hash_contenido}{extension}'
+        ruta = os.path.join(directorio, publicado)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as archivo:
+            archivo.write(contenido)
+        # mtime=0 hace que la misma entrada produzca siempre el mismo .gz
+        with open(ruta + '.gz', 'wb') as archivo:
+            archivo.write(gzip.compress(contenido, 9, mtime=0))
+        if brotli is not None:
+            with open(ruta + '.br', 'wb') as archivo:
+                archivo.write(brotli.compress(contenido, quality=11))
+        archivos[nombre] = publicado
+
+    version = hashlib.sha256(json.dumps(archivos, sort_keys=True).encode()).hexdigest()[:10]
+    manifiesto = {"version": version, "archivos": archivos}
+    with open(os.path.join(dist, 'manifest.json'), 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, indent=2, sort_keys=True)
+    return manifiesto
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera los recursos estáticos con hash y precomprimidos.")
+    parser.add_argument('--static', default=DIRECTORIO_STATIC, help="Directorio static de la aplicación")
+    parser.add_argument('--offline', action='store_true', help="No descargar los recursos de terceros")
+    parser.add_argument('--refresh-vendor', action='store_true',
+                        help="Volver a descargar los recursos de terceros aunque ya existan")
+    parser.add_argument('--allow-cdn', action='store_true',
+                        help="Compilar aunque falte la copia local de algún recurso de terceros")
+    args = parser.parse_args(argv)
+
+    if not args.offline:
+        for nombre in descargar_externos(args.static, forzar=args.refresh_vendor):
+            print(f"Descargado vendor/{nombre}")
+    faltantes = [n for n in RECURSOS_EXTERNOS if not os.path.exists(os.path.join(args.static, 'vendor', n))]
+    if faltantes:
+        print(f"Sin copia local en vendor/: {', '.join(faltantes)}", file=sys.stderr)
+        if not args.allow_cdn:
+            print("Descárguelos con acceso a la red o compile con --allow-cdn para usar el CDN", file=sys.stderr)
+            return 1
+    if brotli is None:
+        print("brotli no está instalado; solo se generan variantes .gz", file=sys.stderr)
+
+    manifiesto = construir(args.static)
+    for nombre, publicado in manifiesto["archivos"].items():
+        print(f"{nombre} -> {publicado}")
+    print(f"Versión {manifiesto['version']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
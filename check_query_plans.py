@@ -0,0 +1,166 @@
+"""
+Verifica que las consultas frecuentes de la capa de servicios usen índices.
+
+Ejecuta las funciones de ``services`` que atienden cada request (verificación del profesor, ETag,
+página de preferencias, preferencias previas, materias y turnos) para algunos profesores de la
+base, captura las sentencias SELECT que emiten y corre ``EXPLAIN`` sobre cada una con sus mismos
+parámetros. Termina con código 1 si alguna recorre secuencialmente una tabla con al menos
+``--min-rows`` filas.
+
+Debe correrse contra una base local poblada a escala, por ejemplo::
+
+    python initialize_db.py --professors 2000 --subjects 300
+    python check_query_plans.py --min-rows 1000
+
+Las cargas completas de la caché de datos de referencia (sentencias sin ``WHERE``) no se
+verifican: recorren tablas pequeñas una vez por cambio de versión.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+from sqlalchemy import event, func, select
+
+_ESCANEO_SQLITE = re.compile(r'^SCAN (\w+)')
+
+
+def capturar_consultas(app, cedulas):
+    """
+    Ejecuta las consultas de lectura de cada request para las cédulas dadas.
+
+    :return: Una lista de tuplas (función, sentencia, parámetros), sin repetir sentencias.
+    """
+    from entities import db
+    import services
+
+    funciones = [
+        services.verificar_profesor,
+        services.obtener_etag_preferencias,
+        services.cargar_pagina_preferencias,
+        services.get_previous_preferences,
+        services.listar_turnos_materias_profesor,
+    ]
+    capturadas = []
+    vistas = set()
+    actual = [None]
+
+    def capturar(conn, cursor, sentencia, parametros, context, executemany):
+        if sentencia.lstrip().upper().startswith('SELECT') and sentencia not in vistas:
+            vistas.add(sentencia)
+            capturadas.append((actual[0], sentencia, parametros))
+
+    with app.app_context():
+        motor = db.engine
+        event.listen(motor, 'before_cursor_execute', capturar)
+        try:
+            actual[0] = 'obtener_datos_referencia'
+            services.limpiar_cache_referencia()
+            services.obtener_datos_referencia()
+            for ci in cedulas:
+                for funcion in funciones:
+                    actual[0] = funcion.__name__
+                    funcion(ci)
+        finally:
+            event.remove(motor, 'before_cursor_execute', capturar)
+            db.session.rollback()
+    return capturadas
+
+
+def tablas_escaneadas(conexion, sentencia, parametros):
+    """
+    Corre ``EXPLAIN`` sobre una sentencia.
+
+    :return: Los nombres de las tablas que el plan recorre secuencialmente.
+    """
+    if conexion.dialect.name == 'postgresql':
+        plan = conexion.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + sentencia, parametros).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        tablas = []
+        pendientes = [plan[0]['Plan']]
+        while pendientes:
+            nodo = pendientes.pop()
+            if nodo.get('Node Type') == 'Seq Scan':
+                tablas.append(nodo['Relation Name'])
+            pendientes.extend(nodo.get('Plans', ()))
+        return tablas
+
+    tablas = []
+    for *_, detalle in conexion.exec_driver_sql('EXPLAIN QUERY PLAN ' + sentencia, parametros):
+        coincidencia = _ESCANEO_SQLITE.match(detalle)
+        # 'SCAN t USING COVERING INDEX' también recorre todas las entradas del índice
+        if coincidencia:
+            tablas.append(coincidencia.group(1))
+    return tablas
+
+
+def verificar_planes(app, min_filas=1000, muestras=3):
+    """
+    Verifica los planes de las consultas frecuentes.
+
+    :param min_filas: Tamaño a partir del cual un recorrido secuencial se considera un problema.
+    :param muestras: Cantidad de profesores (primero, del medio, último) sobre los que se consulta.
+    :return: Una tupla (consultas verificadas, problemas); cada problema es un diccionario con la
+        función, la tabla, su cantidad de filas y la sentencia.
+    """
+    from entities import db, Profesor
+
+    with app.app_context():
+        cedulas = db.session.scalars(select(Profesor.cedula).order_by(Profesor.cedula)).all()
+        db.session.rollback()
+    if not cedulas:
+        raise ValueError("La base no tiene profesores; poblarla con initialize_db.py")
+    indices = sorted({round(i * (len(cedulas) - 1) / max(muestras - 1, 1)) for i in range(muestras)})
+    consultas = capturar_consultas(app, [cedulas[i] for i in indices])
+
+    problemas = []
+    verificadas = 0
+    filas_por_tabla = {}
+    with app.app_context():
+        tablas = db.metadata.tables
+        with db.engine.connect() as conexion:
+            for funcion, sentencia, parametros in consultas:
+                if not re.search(r'\bWHERE\b', sentencia, re.IGNORECASE):
+                    continue
+                verificadas += 1
+                for nombre in tablas_escaneadas(conexion, sentencia, parametros):
+                    tabla = tablas.get(nombre)
+                    if tabla is None:
+                        continue
+                    if nombre not in filas_por_tabla:
+                        filas_por_tabla[nombre] = conexion.execute(select(func.count()).select_from(tabla)).scalar()
+                    if filas_por_tabla[nombre] >= min_filas:
+                        problemas.append({
+                            "funcion": funcion,
+                            "tabla": nombre,
+                            "filas": filas_por_tabla[nombre],
+                            "sentencia": sentencia,
+                        })
+    return verificadas, problemas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', help="Base a verificar (por defecto, la de la aplicación)")
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help="Filas a partir de las cuales un recorrido secuencial falla (por defecto 1000)")
+    parser.add_argument('--samples', type=int, default=3, help="Profesores consultados (por defecto 3)")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    from said import app
+
+    verificadas, problemas = verificar_planes(app, args.min_rows, args.samples)
+    for problema in problemas:
+        print(f"{problema['funcion']}: recorrido secuencial de {problema['tabla']} "
+              f"({problema['filas']} filas)\n    {' '.join(problema['sentencia'].split())}")
+    print(f"{verificadas} consultas verificadas, {len(problemas)} recorridos secuenciales.")
+    return 1 if problemas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
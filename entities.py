@@ -1,7 +1,53 @@
+import os
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+# Estrategias de carga de las relaciones de PuedeDictar.
+# 'select' carga de forma perezosa (una consulta por acceso), 'selectin' agrupa la carga
+# de toda una colección en una sola consulta IN y 'joined' la resuelve con un JOIN.
+# CARGA_PUEDE_DICTAR aplica a Profesor.puede_dictar y CARGA_REFERENCIAS_PUEDE_DICTAR a
+# las referencias de cada fila hacia su Materia y su Turno.
+ESTRATEGIAS_CARGA = ('select', 'selectin', 'joined')
+CARGA_PUEDE_DICTAR = os.getenv('SAID_CARGA_PUEDE_DICTAR', 'selectin')
+CARGA_REFERENCIAS_PUEDE_DICTAR = os.getenv('SAID_CARGA_REFERENCIAS_PUEDE_DICTAR', 'joined')
+for _estrategia in (CARGA_PUEDE_DICTAR, CARGA_REFERENCIAS_PUEDE_DICTAR):
+    if _estrategia not in ESTRATEGIAS_CARGA:
+        raise ValueError(f"Estrategia de carga inválida: {_estrategia}")
+
+# Cada valor de preferencia (0 a 3) ocupa 2 bits: el bloque con id ``i`` se guarda en el
+# byte ``i // 4``, desplazado ``2 * (i % 4)`` bits. Un valor 0 equivale a no tener preferencia.
+BITS_POR_PREFERENCIA = 2
+PREFERENCIAS_POR_BYTE = 8 // BITS_POR_PREFERENCIA
+
+
+def empaquetar_grilla(preferencias) -> bytes:
+    """Empaqueta un diccionario {bloque_horario_id: valor} en 2 bits por bloque."""
+    activas = {int(bloque): int(valor) for bloque, valor in preferencias.items() if valor}
+    if not activas:
+        return b''
+    datos = bytearray(max(activas) // PREFERENCIAS_POR_BYTE + 1)
+    for bloque, valor in activas.items():
+        if bloque < 0 or not 0 <= valor <= 3:
+            raise ValueError(f"Preferencia inválida para el bloque {bloque}: {valor}")
+        desplazamiento = BITS_POR_PREFERENCIA * (bloque % PREFERENCIAS_POR_BYTE)
+        datos[bloque // PREFERENCIAS_POR_BYTE] |= valor << desplazamiento
+    return bytes(datos)
+
+
+def desempaquetar_grilla(datos) -> dict:
+    """Devuelve el diccionario {bloque_horario_id: valor} de una grilla empaquetada, sin los ceros."""
+    preferencias = {}
+    for indice, byte in enumerate(datos or b''):
+        if not byte:
+            continue
+        for posicion in range(PREFERENCIAS_POR_BYTE):
+            valor = (byte >> (BITS_POR_PREFERENCIA * posicion)) & 0b11
+            if valor:
+                preferencias[indice * PREFERENCIAS_POR_BYTE + posicion] = valor
+    return preferencias
+
+
 class Persona(db.Model):
     __tablename__ = 'personas'
     cedula = db.Column(db.String, primary_key=True)
@@ -14,15 +60,20 @@ class Persona(db.Model):
 
 class Profesor(db.Model):
     __tablename__ = 'profesores'
-    cedula = db.Column(db.String, db.ForeignKey('personas.cedula'), nullable=False)
+    # Todas las vistas buscan al profesor por cédula; una persona es a lo sumo un profesor
+    cedula = db.Column(db.String, db.ForeignKey('personas.cedula'), nullable=False, unique=True, index=True)
     nombre = db.Column(db.String, unique=True, primary_key=True)
     nombre_completo = db.Column(db.String, unique=True)
     ultima_modificacion = db.Column(db.DateTime, nullable=True)
     min_max_dias = db.Column(db.Boolean)
+    # Grilla semanal empaquetada (ver empaquetar_grilla), usada en el modo de almacenamiento 'grilla'
+    grilla_preferencias = db.Column(db.LargeBinary, nullable=True)
+    # Se incrementa con cada escritura de preferencias; PATCH /api/preferences la exige en If-Match
+    version_preferencias = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # Rename the backref to avoid conflict
     preferencias = db.relationship('Prioridad', backref='profesor_pref', lazy=True)
-    puede_dictar = db.relationship('PuedeDictar', backref='profesor_puede_dic', lazy=True)
+    puede_dictar = db.relationship('PuedeDictar', backref='profesor_puede_dic', lazy=CARGA_PUEDE_DICTAR)
 
     def __repr__(self):
         return f'<Profesor {self.nombre_completo}>'
@@ -35,7 +86,11 @@ class Materia(db.Model):
     # cantidad_dias = db.Column(db.Integer, db.CheckConstraint("cantidad_dias IN (0, 1, 2, 3, 4, 5)"), nullable=False)
     # carga_horaria = db.Column(db.Integer, db.CheckConstraint("carga_horaria >= 0"), nullable=False)
 
-    puede_dictar = db.relationship('PuedeDictar', backref='materia_puede_dic', lazy=True)
+    puede_dictar = db.relationship(
+        'PuedeDictar',
+        backref=db.backref('materia_puede_dic', lazy=CARGA_REFERENCIAS_PUEDE_DICTAR),
+        lazy=True
+    )
 
     def __repr__(self):
         return f'<Materia {self.nombre}>'
@@ -67,6 +122,8 @@ class BloqueHorario(db.Model):
             ['hora_inicio', 'hora_fin'],
             ['horarios.hora_inicio', 'horarios.hora_fin']
         ),
+        # Los bloques de cada turno se obtienen uniendo por (hora_inicio, hora_fin)
+        db.Index('ix_bloques_horarios_horas', 'hora_inicio', 'hora_fin'),
     )
 
     # Define the relationship with Horario
@@ -95,6 +152,11 @@ class Turno(db.Model):
     nombre = db.Column(db.String, primary_key=True)
 
     turnos_horarios = db.relationship('TurnoHorario', backref='turno_backref', lazy=True)
+    puede_dictar = db.relationship(
+        'PuedeDictar',
+        backref=db.backref('turno_puede_dic', lazy=CARGA_REFERENCIAS_PUEDE_DICTAR),
+        lazy=True
+    )
 
     def __repr__(self):
         return f'<Turno {self.nombre}>'
@@ -104,7 +166,7 @@ class TurnoHorario(db.Model):
     __tablename__ = 'turnos_horarios'
     hora_inicio = db.Column(db.Time, nullable=False)
     hora_fin = db.Column(db.Time, nullable=False)
-    turno = db.Column(db.String, db.ForeignKey('turnos.nombre'))
+    turno = db.Column(db.String, db.ForeignKey('turnos.nombre'), index=True)
 
     # Define foreign keys for the composite primary key in Horario
     __table_args__ = (
@@ -133,4 +195,82 @@ class PuedeDictar(db.Model):
     grupos_max = db.Column(db.Integer, db.CheckConstraint("grupos_max > 0"), default=1)
 
     def __repr__(self):
-        return f'<PuedeDictar {self.profesor} - {self.materia} ({self.turno})>'
\ No newline at end of file
+        return f'<PuedeDictar {self.profesor} - {self.materia} ({self.turno})>'
+
+
+class EnvioPendiente(db.Model):
+    __tablename__ = 'envios_pendientes'
+    # Último envío aceptado de cada profesor en el modo de escritura diferida, a la espera de
+    # que el procesador lo aplique sobre prioridades (o la grilla). Un envío nuevo reemplaza al anterior.
+    profesor = db.Column(db.String, db.ForeignKey('profesores.nombre'), primary_key=True)
+    envio = db.Column(db.String, nullable=False)
+    preferencias = db.Column(db.Text, nullable=False)
+    min_max_dias = db.Column(db.Boolean)
+    recibido = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<EnvioPendiente {self.profesor} ({self.envio})>'
+
+
+class ProgresoEnvios(db.Model):
+    __tablename__ = 'progreso_envios'
+    # Contadores de profesores que ya enviaron sus preferencias, por dimensión ('total', 'turno'
+    # o 'materia'). guardar_respuesta los actualiza con cada envío y
+    # services.reconstruir_progreso_envios los recalcula desde cero.
+    dimension = db.Column(db.String, primary_key=True)
+    clave = db.Column(db.String, primary_key=True)
+    total_profesores = db.Column(db.Integer, nullable=False, default=0)
+    enviados = db.Column(db.Integer, nullable=False, default=0)
+    ultimo_envio = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ProgresoEnvios {self.dimension}:{self.clave} {self.enviados}/{self.total_profesores}>'
+
+
+class DemandaBloque(db.Model):
+    __tablename__ = 'demanda_bloques'
+    # Cantidad de profesores que marcaron cada bloque con cada valor (1, 2 o 3), por dimensión
+    # ('total', 'turno' o 'materia', como en progreso_envios). Se actualiza con la diferencia de
+    # cada envío; los no disponibles son los enviados de la dimensión menos estas cantidades.
+    dimension = db.Column(db.String, primary_key=True)
+    clave = db.Column(db.String, primary_key=True)
+    bloque_horario = db.Column(db.Integer, db.ForeignKey('bloques_horarios.id'), primary_key=True)
+    valor = db.Column(db.Integer, db.CheckConstraint("valor IN (1, 2, 3)"), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DemandaBloque {self.dimension}:{self.clave} {self.bloque_horario}={self.valor} x{self.cantidad}>'
+
+
+class Asignacion(db.Model):
+    __tablename__ = 'asignaciones'
+    # Horario generado por solver.py: cada fila ubica una sesión semanal de un grupo de una
+    # materia y turno que el profesor puede dictar. Cada corrida del solver reemplaza la tabla.
+    profesor = db.Column(db.String, db.ForeignKey('profesores.nombre'), primary_key=True)
+    materia = db.Column(db.String, db.ForeignKey('materias.nombre'), primary_key=True)
+    turno = db.Column(db.String, db.ForeignKey('turnos.nombre'), primary_key=True)
+    grupo = db.Column(db.Integer, primary_key=True)
+    bloque_horario = db.Column(db.Integer, db.ForeignKey('bloques_horarios.id'), primary_key=True)
+    # Preferencia del profesor por el bloque (1 a 3)
+    valor = db.Column(db.Integer, nullable=False)
+    generado = db.Column(db.DateTime, nullable=False)
+
+    # Un profesor no puede dictar dos grupos en el mismo bloque
+    __table_args__ = (
+        db.UniqueConstraint('profesor', 'bloque_horario', name='uq_asignaciones_profesor_bloque'),
+    )
+
+    def __repr__(self):
+        return f'<Asignacion {self.profesor} {self.materia} ({self.turno}) g{self.grupo} @{self.bloque_horario}>'
+
+
+class VersionReferencia(db.Model):
+    __tablename__ = 'versiones_referencia'
+    # Fila única (id = 1) cuyo sello cambia con cada escritura administrativa sobre
+    # bloques, horarios, turnos, materias o asignaciones.
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.String, nullable=False)
+    actualizado = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<VersionReferencia {self.version}>'
@@ -0,0 +1,225 @@
+"""
+Exportación en streaming de las preferencias recolectadas para armar los horarios.
+
+Los profesores se leen con un cursor del lado del servidor y se procesan en lotes: por cada
+lote se buscan las filas de PuedeDictar y las preferencias con una consulta IN cada una y el
+lote serializado se entrega como un único trozo, por lo que la memoria usada no depende del
+tamaño de la facultad.
+"""
+
+import csv
+import io
+import json
+from itertools import islice
+
+from entities import db, Profesor, Prioridad, PuedeDictar, desempaquetar_grilla
+from services import modo_grilla
+
+FORMATOS = ('ndjson', 'csv', 'parquet')
+TIPOS_MIME = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+TAMANO_LOTE = 500
+
+COLUMNAS = [
+    "profesor",
+    "cedula",
+    "nombre_completo",
+    "min_max_dias",
+    "ultima_modificacion",
+    "puede_dictar",
+    "preferencias",
+]
+
+
+def iterar_profesores(tamano_lote=TAMANO_LOTE):
+    """
+    Recorre todos los profesores en lotes, con sus asignaciones y preferencias.
+
+    :param tamano_lote: Cantidad de profesores por lote.
+    :return: Un generador de listas de diccionarios, uno por profesor.
+    """
+    grilla = modo_grilla()
+    profesores = iter(
+        db.session.query(
+            Profesor.nombre,
+            Profesor.cedula,
+            Profesor.nombre_completo,
+            Profesor.min_max_dias,
+            Profesor.ultima_modificacion,
+            Profesor.grilla_preferencias,
+        )
+        .order_by(Profesor.nombre)
+        .yield_per(tamano_lote)
+    )
+
+    while True:
+        lote = list(islice(profesores, tamano_lote))
+        if not lote:
+            return
+        nombres = [profesor.nombre for profesor in lote]
+
+        asignaciones = {}
+        for pd in (
+            PuedeDictar.query
+            .filter(PuedeDictar.profesor.in_(nombres))
+            .order_by(PuedeDictar.profesor, PuedeDictar.materia, PuedeDictar.turno)
+        ):
+            asignaciones.setdefault(pd.profesor, []).append({
+                "materia": pd.materia,
+                "turno": pd.turno,
+                "grupos_max": pd.grupos_max,
+            })
+
+        preferencias = {}
+        if grilla:
+            for profesor in lote:
+                preferencias[profesor.nombre] = sorted(desempaquetar_grilla(profesor.grilla_preferencias).items())
+        else:
+            for nombre, bloque_id, valor in (
+                db.session.query(Prioridad.profesor, Prioridad.bloque_horario, Prioridad.valor)
+                .filter(Prioridad.profesor.in_(nombres))
+                .order_by(Prioridad.profesor, Prioridad.bloque_horario)
+            ):
+                preferencias.setdefault(nombre, []).append((bloque_id, valor))
+
+        yield [
+            {
+                "profesor": profesor.nombre,
+                "cedula": profesor.cedula,
+                "nombre_completo": profesor.nombre_completo,
+                "min_max_dias": profesor.min_max_dias,
+                "ultima_modificacion": profesor.ultima_modificacion,
+                "puede_dictar": asignaciones.get(profesor.nombre, []),
+                "preferencias": [
+                    {"bloque_horario": bloque_id, "valor": valor}
+                    for bloque_id, valor in preferencias.get(profesor.nombre, [])
+                ],
+            }
+            for profesor in lote
+        ]
+
+
+def _a_json(registro):
+    fecha = registro["ultima_modificacion"]
+    return {**registro, "ultima_modificacion": fecha.isoformat() if fecha else None}
+
+
+def _exportar_ndjson(lotes):
+    for lote in lotes:
+        yield "".join(json.dumps(_a_json(registro), ensure_ascii=False) + "\n" for registro in lote).encode("utf-8")
+
+
+def _exportar_csv(lotes):
+    salida = io.StringIO()
+    escritor = csv.DictWriter(salida, fieldnames=COLUMNAS)
+    escritor.writeheader()
+    yield salida.getvalue().encode("utf-8")
+    salida.seek(0)
+    salida.truncate()
+    for lote in lotes:
+        for registro in lote:
+            registro = _a_json(registro)
+            escritor.writerow({
+                **registro,
+                "puede_dictar": json.dumps(registro["puede_dictar"], ensure_ascii=False),
+                "preferencias": json.dumps(registro["preferencias"]),
+            })
+        yield salida.getvalue().encode("utf-8")
+        salida.seek(0)
+        salida.truncate()
+
+
+class _SalidaEnTrozos:
+    """Archivo de solo escritura que acumula los trozos escritos hasta que se los vacía."""
+
+    def __init__(self):
+        self.trozos = []
+        self.posicion = 0
+        self.closed = False
+
+    def write(self, datos):
+        self.trozos.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self):
+        datos = b"".join(self.trozos)
+        self.trozos = []
+        return datos
+
+
+class FormatoNoDisponible(RuntimeError):
+    """El formato pedido necesita una dependencia opcional que no está instalada."""
+
+
+def _importar_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise FormatoNoDisponible("La exportación a Parquet requiere el paquete pyarrow.") from exc
+    return pa, pq
+
+
+def _exportar_parquet(lotes, pa, pq):
+    esquema = pa.schema([
+        ("profesor", pa.string()),
+        ("cedula", pa.string()),
+        ("nombre_completo", pa.string()),
+        ("min_max_dias", pa.bool_()),
+        ("ultima_modificacion", pa.timestamp("us")),
+        ("puede_dictar", pa.list_(pa.struct([
+            ("materia", pa.string()),
+            ("turno", pa.string()),
+            ("grupos_max", pa.int32()),
+        ]))),
+        ("preferencias", pa.list_(pa.struct([
+            ("bloque_horario", pa.int32()),
+            ("valor", pa.int8()),
+        ]))),
+    ])
+    salida = _SalidaEnTrozos()
+    escritor = pq.ParquetWriter(pa.PythonFile(salida, mode="w"), esquema)
+    try:
+        for lote in lotes:
+            escritor.write_table(pa.Table.from_pylist(lote, schema=esquema))
+            yield salida.vaciar()
+    finally:
+        escritor.close()
+    yield salida.vaciar()
+
+
+def exportar(formato, tamano_lote=TAMANO_LOTE):
+    """
+    Exporta las preferencias, asignaciones y min_max_dias de todos los profesores.
+
+    NDJSON y Parquet conservan las listas anidadas; en CSV las columnas ``puede_dictar`` y
+    ``preferencias`` contienen JSON.
+
+    :param formato: Uno de FORMATOS.
+    :param tamano_lote: Cantidad de profesores por lote.
+    :raises FormatoNoDisponible: Si el formato necesita un paquete que no está instalado; se
+        verifica antes de devolver el generador, para poder responder con un error y no con un
+        archivo truncado.
+    :return: Un generador de trozos de bytes, uno por lote.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportación desconocido: {formato}")
+    if formato == 'parquet':
+        return _exportar_parquet(iterar_profesores(tamano_lote), *_importar_pyarrow())
+    lotes = iterar_profesores(tamano_lote)
+    if formato == 'ndjson':
+        return _exportar_ndjson(lotes)
+    return _exportar_csv(lotes)
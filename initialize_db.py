@@ -1,8 +1,14 @@
-from datetime import time
+import argparse
+import csv
+import io
+import random
+from datetime import datetime, time, timedelta
+from itertools import islice
 
 def initialize_database():
     from said import app
     from entities import db, Profesor, Materia, Horario, BloqueHorario, Turno, TurnoHorario, PuedeDictar, Persona
+    from services import invalidar_datos_referencia, reconstruir_demanda_bloques, reconstruir_progreso_envios
 
     with app.app_context():
         db.drop_all()
@@ -49,40 +55,340 @@ def initialize_database():
         db.session.add_all([pd1, pd2])
 
         db.session.commit()
+        invalidar_datos_referencia()
+        reconstruir_progreso_envios()
+        reconstruir_demanda_bloques()
     print("Test data loaded successfully.")
 
     print("Base de datos inicializada y tablas creadas.")
 
-def cargar_personas_desde_excel(path_xlsx):
+DIAS = ['lun', 'mar', 'mie', 'jue', 'vie']
+TURNOS_SINTETICOS = ['Mañana', 'Tarde', 'Noche']
+
+
+def _copiar_postgres(conexion, tabla, columnas, filas):
+    """Carga filas con COPY ... FROM STDIN usando la conexión del driver (psycopg o psycopg2)."""
+    crudo = conexion.connection.driver_connection
+    sentencia = f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN"
+    with crudo.cursor() as cursor:
+        if conexion.dialect.driver == 'psycopg':
+            with cursor.copy(sentencia) as copia:
+                for fila in filas:
+                    copia.write_row([fila[columna] for columna in columnas])
+            return
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for fila in filas:
+            escritor.writerow([
+                '\\x' + valor.hex() if isinstance(valor, bytes) else valor
+                for valor in (fila[columna] for columna in columnas)
+            ])
+        buffer.seek(0)
+        cursor.copy_expert(f"{sentencia} WITH (FORMAT csv)", buffer)
+
+
+def insertar_en_lotes(modelo, filas, tamano_lote=5000):
+    """
+    Inserta filas nuevas de un modelo de la forma más rápida que permita el motor.
+
+    En PostgreSQL se usa COPY; en el resto, INSERT con executemany de a ``tamano_lote`` filas.
+
+    :param modelo: Clase del modelo a escribir.
+    :param filas: Lista de diccionarios {columna: valor}, todos con las mismas columnas.
+    """
+    if not filas:
+        return
+    from sqlalchemy import insert
+    from entities import db
+
+    conexion = db.session.connection()
+    if conexion.dialect.name == 'postgresql':
+        _copiar_postgres(conexion, modelo.__tablename__, list(filas[0]), filas)
+        return
+    for inicio in range(0, len(filas), tamano_lote):
+        db.session.execute(insert(modelo), filas[inicio:inicio + tamano_lote])
+
+
+def generar_datos_sinteticos(profesores=500, materias=80, bloques_por_dia=6, densidad=0.4, semilla=2025,
+                             tamano_lote=5000):
+    """
+    Recrea la base con un conjunto de datos sintético y consistente del tamaño pedido.
+
+    Cada día tiene ``bloques_por_dia`` bloques consecutivos desde las 8:00, repartidos en hasta
+    tres turnos. Cada profesor puede dictar entre una y cuatro combinaciones de materia y turno, y
+    marca una preferencia en cada bloque de sus turnos con probabilidad ``densidad``. Con la misma
+    semilla se obtiene siempre el mismo conjunto. Las filas se escriben por lotes de
+    ``tamano_lote`` profesores (con COPY en PostgreSQL) y, si la aplicación está en modo
+    ``grilla``, las preferencias se guardan empaquetadas en lugar de en ``prioridades``.
+
+    :return: Un diccionario con la cantidad de filas escritas en cada tabla.
+    """
+    if not 1 <= bloques_por_dia <= 30:
+        raise ValueError("bloques_por_dia debe estar entre 1 y 30")
+    if not 0 <= densidad <= 1:
+        raise ValueError("densidad debe estar entre 0 y 1")
+
     from said import app
-    from entities import db, Persona, Profesor
+    from entities import (
+        db, Persona, Profesor, Materia, Horario, BloqueHorario, Turno, TurnoHorario, PuedeDictar,
+        Prioridad, empaquetar_grilla,
+    )
+    from services import (
+        invalidar_datos_referencia, modo_grilla, reconstruir_demanda_bloques, reconstruir_progreso_envios,
+    )
+
+    azar = random.Random(semilla)
+    duracion = max(30, min(120, (15 * 60) // bloques_por_dia))
+    inicio_dia = datetime(2025, 1, 1, 8, 0)
+    horas = [
+        ((inicio_dia + timedelta(minutes=i * duracion)).time(),
+         (inicio_dia + timedelta(minutes=(i + 1) * duracion)).time())
+        for i in range(bloques_por_dia)
+    ]
+    turnos = TURNOS_SINTETICOS[:min(len(TURNOS_SINTETICOS), bloques_por_dia)]
+    horas_turno = {
+        turno: horas[i * bloques_por_dia // len(turnos):(i + 1) * bloques_por_dia // len(turnos)]
+        for i, turno in enumerate(turnos)
+    }
+    bloques = [
+        {"id": i, "dia": dia, "hora_inicio": hora_inicio, "hora_fin": hora_fin}
+        for i, (dia, (hora_inicio, hora_fin)) in enumerate((dia, h) for dia in DIAS for h in horas)
+    ]
+    bloques_turno = {
+        turno: [b["id"] for b in bloques if (b["hora_inicio"], b["hora_fin"]) in rango]
+        for turno, rango in horas_turno.items()
+    }
+    nombres_materias = [f"MAT{i:04d}" for i in range(materias)]
+    combinaciones = [(materia, turno) for materia in nombres_materias for turno in turnos]
+    ultimo_envio = datetime(2025, 3, 1)
+    reporte = {tabla: 0 for tabla in ("profesores", "materias", "bloques_horarios", "puede_dictar", "prioridades")}
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        grilla = modo_grilla()
+
+        insertar_en_lotes(Horario, [{"hora_inicio": i, "hora_fin": f} for i, f in horas])
+        insertar_en_lotes(Turno, [{"nombre": turno} for turno in turnos])
+        insertar_en_lotes(TurnoHorario, [
+            {"hora_inicio": i, "hora_fin": f, "turno": turno} for turno, rango in horas_turno.items() for i, f in rango
+        ])
+        insertar_en_lotes(BloqueHorario, bloques, tamano_lote)
+        insertar_en_lotes(Materia, [
+            {"nombre": nombre, "nombre_completo": f"Materia {i}"} for i, nombre in enumerate(nombres_materias)
+        ], tamano_lote)
+        reporte["bloques_horarios"] = len(bloques)
+        reporte["materias"] = len(nombres_materias)
+
+        for desde in range(0, profesores, tamano_lote):
+            personas, filas_profesores, filas_puede_dictar, filas_prioridades = [], [], [], []
+            for n in range(desde, min(desde + tamano_lote, profesores)):
+                cedula = str(10_000_000 + n)
+                nombre = f"p{n:06d}"
+                asignadas = azar.sample(combinaciones, k=min(len(combinaciones), azar.randint(1, 4)))
+                disponibles = sorted({b for _, turno in asignadas for b in bloques_turno[turno]})
+                preferencias = {b: azar.randint(1, 3) for b in disponibles if azar.random() < densidad}
+
+                personas.append({"cedula": cedula, "nombre": f"Profesor {n}", "mail": f"{nombre}@example.com"})
+                filas_profesores.append({
+                    "cedula": cedula,
+                    "nombre": nombre,
+                    "nombre_completo": f"Profesor {n}",
+                    "ultima_modificacion": (
+                        ultimo_envio - timedelta(minutes=azar.randint(0, 20_000)) if preferencias else None
+                    ),
+                    "min_max_dias": azar.random() < 0.5 if preferencias else None,
+                    "grilla_preferencias": empaquetar_grilla(preferencias) if grilla and preferencias else None,
+                })
+                filas_puede_dictar.extend(
+                    {"profesor": nombre, "materia": materia, "turno": turno, "grupos_max": azar.randint(1, 3)}
+                    for materia, turno in asignadas
+                )
+                if not grilla:
+                    filas_prioridades.extend(
+                        {"profesor": nombre, "bloque_horario": b, "valor": valor} for b, valor in preferencias.items()
+                    )
+
+            insertar_en_lotes(Persona, personas, tamano_lote)
+            insertar_en_lotes(Profesor, filas_profesores, tamano_lote)
+            insertar_en_lotes(PuedeDictar, filas_puede_dictar, tamano_lote)
+            insertar_en_lotes(Prioridad, filas_prioridades, tamano_lote)
+            reporte["profesores"] += len(filas_profesores)
+            reporte["puede_dictar"] += len(filas_puede_dictar)
+            reporte["prioridades"] += len(filas_prioridades)
+
+        db.session.commit()
+        invalidar_datos_referencia()
+        reconstruir_progreso_envios()
+        reconstruir_demanda_bloques()
+
+    print(f"Datos sintéticos generados: {reporte}")
+    return reporte
+
+
+def leer_planilla_en_lotes(path_xlsx, tamano_lote=1000):
+    """
+    Lee la primera hoja de una planilla en modo de solo lectura, de a ``tamano_lote`` filas.
+
+    :return: Un generador de DataFrames con las columnas del encabezado de la hoja.
+    """
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    libro = load_workbook(path_xlsx, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = [str(celda).strip() if celda is not None else "" for celda in next(filas, ())]
+        ancho = len(encabezado)
+        while True:
+            lote = [tuple(fila[:ancho]) + (None,) * (ancho - len(fila)) for fila in islice(filas, tamano_lote)]
+            if not lote:
+                return
+            yield pd.DataFrame(lote, columns=encabezado)
+    finally:
+        libro.close()
+
+
+def normalizar_lote_personas(df):
+    """
+    Normaliza un lote de la planilla de profesores sin recorrerlo fila por fila.
+
+    Las cédulas numéricas se convierten a texto sin decimales y el nombre corto del profesor
+    se arma con la inicial en minúscula de cada palabra del nombre.
+
+    :return: Un DataFrame con las columnas cedula, nombre, mail e iniciales, sin filas incompletas.
+    """
     import pandas as pd
-    df = pd.read_excel(path_xlsx)
-    # Espera columnas: 'Cedula', 'Nombre', 'Mail'
+
+    cedula = df["Cedula"].astype("string").str.strip()
+    numericas = pd.to_numeric(df["Cedula"], errors="coerce")
+    enteras = numericas.notna() & (numericas % 1 == 0)
+    cedula = cedula.mask(enteras, numericas.where(enteras).astype("Int64").astype("string"))
+
+    nombre = df["Nombre"].astype("string").str.strip()
+    normalizado = pd.DataFrame({
+        "cedula": cedula,
+        "nombre": nombre,
+        "mail": df["Mail"].astype("string").fillna("") if "Mail" in df else "",
+        "iniciales": nombre.str.findall(r"(?<!\S)\S").str.join("").str.lower(),
+    })
+    validas = normalizado["cedula"].fillna("").ne("") & normalizado["nombre"].fillna("").ne("")
+    return normalizado[validas]
+
+
+def cargar_personas_desde_excel(path_xlsx, tamano_lote=1000):
+    """
+    Importa o actualiza personas y profesores desde una planilla con columnas Cedula, Nombre y Mail.
+
+    La planilla se lee en streaming y cada lote se escribe con un INSERT ... ON CONFLICT DO UPDATE
+    multi-fila por tabla. Las filas sin cédula o nombre y las cédulas repetidas se omiten; si dos
+    filas del mismo lote generan el mismo nombre corto, prevalece la última, como con ``merge``, y
+    las anteriores se informan y se cuentan en ``profesores.omitidos`` (la persona sí se guarda).
+    Tampoco se escribe el profesor cuya cédula ya pertenece a otro nombre corto en la base, que
+    violaría el índice único de ``profesores.cedula``: se informa para corregirlo a mano.
+
+    :return: Un diccionario con las filas insertadas, actualizadas y omitidas de cada tabla.
+    """
+    from said import app
+    from entities import db, Persona, Profesor
+    from services import reconstruir_demanda_bloques, reconstruir_progreso_envios, upsert_filas
+
+    reporte = {
+        "personas": {"insertadas": 0, "actualizadas": 0},
+        "profesores": {"insertados": 0, "actualizados": 0, "omitidos": 0},
+        "omitidas": 0,
+    }
+    cedulas_vistas = set()
+
     with app.app_context():
-        for _, row in df.iterrows():
-            ci: str = str(row['Cedula']).strip()
-            nombre: str = row['Nombre']
-            mail = row['Mail']
-            if pd.isna(mail):
-                mail = ""
-            print(f"CI: {ci}, Nombre: {nombre}, Mail: {mail}")
-            persona = Persona(
-                cedula=ci,
-                nombre=nombre,  # Primer nombre
-                mail=mail,
+        for df in leer_planilla_en_lotes(path_xlsx, tamano_lote):
+            lote = normalizar_lote_personas(df)
+            repetidas = lote["cedula"].duplicated(keep="first") | lote["cedula"].isin(cedulas_vistas)
+            reporte["omitidas"] += len(df) - len(lote) + int(repetidas.sum())
+            lote = lote[~repetidas]
+            if lote.empty:
+                continue
+            cedulas_vistas.update(lote["cedula"])
+            profesores = lote.drop_duplicates("iniciales", keep="last")
+            pisadas = lote[lote["iniciales"].duplicated(keep="last")]
+            for fila in pisadas.itertuples():
+                ganadora = profesores[profesores["iniciales"] == fila.iniciales].iloc[0]
+                print(
+                    f"Profesor omitido: '{fila.nombre}' ({fila.cedula}) y '{ganadora['nombre']}' "
+                    f"({ganadora['cedula']}) generan el nombre corto '{fila.iniciales}'; prevalece el último"
+                )
+            reporte["profesores"]["omitidos"] += len(pisadas)
+
+            # El índice único sobre profesores.cedula (migración 0002) rechaza un segundo profesor
+            # con la misma cédula, y el upsert solo resuelve conflictos de nombre: si la cédula ya
+            # es de otro nombre corto, el profesor no se escribe y se informa para depurarlo a mano
+            duenos = dict(
+                db.session.query(Profesor.cedula, Profesor.nombre)
+                .filter(Profesor.cedula.in_(profesores["cedula"].tolist()))
             )
-            nombre = ''.join(word[0].lower() for word in nombre.split())
-            profesor = Profesor(
-                cedula=ci,
-                nombre=nombre,
-                nombre_completo=nombre,
+            dueno = profesores["cedula"].map(duenos)
+            conflicto = dueno.notna() & dueno.ne(profesores["iniciales"])
+            for cedula, iniciales, anterior in zip(
+                profesores["cedula"][conflicto], profesores["iniciales"][conflicto], dueno[conflicto]
+            ):
+                print(f"Profesor omitido: la cédula {cedula} ya es de '{anterior}', no de '{iniciales}'")
+            reporte["profesores"]["omitidos"] += int(conflicto.sum())
+            profesores = profesores[~conflicto]
+
+            cedulas = lote["cedula"].tolist()
+            nombres = profesores["iniciales"].tolist()
+            personas_existentes = {
+                c for (c,) in db.session.query(Persona.cedula).filter(Persona.cedula.in_(cedulas))
+            }
+            profesores_existentes = {
+                n for (n,) in db.session.query(Profesor.nombre).filter(Profesor.nombre.in_(nombres))
+            }
+
+            upsert_filas(
+                Persona,
+                lote[["cedula", "nombre", "mail"]].to_dict("records"),
+                actualizar=["nombre", "mail"],
+                tamano_lote=tamano_lote,
             )
-            db.session.merge(persona)  # merge para upsert
-            db.session.merge(profesor)  # merge para upsert
-        db.session.commit()
-        print("Profesores cargados correctamente.")
+            upsert_filas(
+                Profesor,
+                [
+                    {"cedula": cedula, "nombre": iniciales, "nombre_completo": iniciales}
+                    for cedula, iniciales in zip(profesores["cedula"], profesores["iniciales"])
+                ],
+                actualizar=["cedula", "nombre_completo"],
+                tamano_lote=tamano_lote,
+            )
+            db.session.commit()
+
+            reporte["personas"]["actualizadas"] += len(personas_existentes)
+            reporte["personas"]["insertadas"] += len(cedulas) - len(personas_existentes)
+            reporte["profesores"]["actualizados"] += len(profesores_existentes)
+            reporte["profesores"]["insertados"] += len(nombres) - len(profesores_existentes)
+
+        reconstruir_progreso_envios()
+        reconstruir_demanda_bloques()
+
+    print(f"Profesores cargados correctamente: {reporte}")
+    return reporte
 
 if __name__ == "__main__":
-    initialize_database()
-    cargar_personas_desde_excel("profesores.xlsx")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Inicializa la base de datos local con datos de prueba.")
+    parser.add_argument("--professors", type=int, help="Generar un conjunto sintético con esta cantidad de profesores")
+    parser.add_argument("--subjects", type=int, default=80, help="Materias del conjunto sintético")
+    parser.add_argument("--blocks-per-day", type=int, default=6, help="Bloques horarios por día")
+    parser.add_argument("--density", type=float, default=0.4, help="Probabilidad de preferencia en cada bloque disponible")
+    parser.add_argument("--seed", type=int, default=2025, help="Semilla del generador")
+    args = parser.parse_args()
+
+    if args.professors is not None:
+        generar_datos_sinteticos(
+            profesores=args.professors,
+            materias=args.subjects,
+            bloques_por_dia=args.blocks_per_day,
+            densidad=args.density,
+            semilla=args.seed,
+        )
+    else:
+        initialize_database()
+        cargar_personas_desde_excel("profesores.xlsx")
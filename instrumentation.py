@@ -0,0 +1,148 @@
+"""
+Instrumentación opcional por request: sentencias SQL, tiempo en base de datos y de render.
+
+Cuando está activa, cada respuesta lleva un encabezado ``Server-Timing`` con las métricas
+``db`` (con la cantidad de sentencias en la descripción), ``render`` y ``total``, y se escribe
+un registro por request con sus métricas como campos. Si un endpoint supera su presupuesto de sentencias se
+registra además una advertencia.
+
+Configuración:
+
+- ``SAID_INSTRUMENTACION_SQL``: activa la instrumentación.
+- ``SAID_PRESUPUESTO_SQL``: máximo de sentencias por request para cualquier endpoint (0 = sin límite).
+- ``SAID_PRESUPUESTOS_SQL``: máximos por endpoint, por ejemplo ``index=3,submit=6``.
+"""
+
+import logging
+import time
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('said.instrumentacion')
+
+_eventos_registrados = False
+
+
+def leer_presupuestos(valor) -> dict:
+    """Convierte ``'index=3,submit=6'`` en ``{'index': 3, 'submit': 6}``."""
+    presupuestos = {}
+    for parte in (valor or '').split(','):
+        if '=' in parte:
+            endpoint, limite = parte.split('=', 1)
+            presupuestos[endpoint.strip()] = int(limite)
+    return presupuestos
+
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('said_inicio_sql', []).append(time.perf_counter())
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info['said_inicio_sql'].pop()
+    if has_request_context() and 'said_sql' in g:
+        g.said_sql["sentencias"] += 1
+        g.said_sql["db"] += time.perf_counter() - inicio
+
+
+def _error_al_ejecutar(contexto):
+    if contexto.connection is not None:
+        pendientes = contexto.connection.info.get('said_inicio_sql')
+        if pendientes:
+            pendientes.pop()
+
+
+def _antes_de_render(sender, template, context, **extra):
+    if 'said_sql' in g:
+        g.said_sql["renders"].append(time.perf_counter())
+
+
+def _despues_de_render(sender, template, context, **extra):
+    if 'said_sql' in g and g.said_sql["renders"]:
+        inicio = g.said_sql["renders"].pop()
+        if not g.said_sql["renders"]:
+            g.said_sql["render"] += time.perf_counter() - inicio
+
+
+def metricas_request():
+    """
+    Devuelve las métricas acumuladas del request en curso, o None si no se están midiendo.
+
+    :return: Un diccionario con ``sentencias`` y los segundos de ``db``, ``render`` y ``total``.
+    """
+    if not has_request_context() or 'said_sql' not in g:
+        return None
+    datos = g.said_sql
+    return {
+        "sentencias": datos["sentencias"],
+        "db": datos["db"],
+        "render": datos["render"],
+        "total": time.perf_counter() - datos["inicio"],
+    }
+
+
+def instrumentar(app):
+    """
+    Registra los hooks de instrumentación en la aplicación si ``SAID_INSTRUMENTACION_SQL`` está activo.
+
+    Con la instrumentación apagada no se registra ningún hook.
+    """
+    global _eventos_registrados
+    if not app.config.get('SAID_INSTRUMENTACION_SQL'):
+        return
+
+    if not _eventos_registrados:
+        event.listen(Engine, 'before_cursor_execute', _antes_de_ejecutar)
+        event.listen(Engine, 'after_cursor_execute', _despues_de_ejecutar)
+        event.listen(Engine, 'handle_error', _error_al_ejecutar)
+        _eventos_registrados = True
+    before_render_template.connect(_antes_de_render, app)
+    template_rendered.connect(_despues_de_render, app)
+
+    presupuesto_general = int(app.config.get('SAID_PRESUPUESTO_SQL') or 0)
+    presupuestos = leer_presupuestos(app.config.get('SAID_PRESUPUESTOS_SQL'))
+
+    @app.before_request
+    def iniciar_medicion():
+        g.said_sql = {
+            "inicio": time.perf_counter(),
+            "sentencias": 0,
+            "db": 0.0,
+            "render": 0.0,
+            "renders": [],
+        }
+
+    @app.after_request
+    def informar_medicion(response):
+        metricas = metricas_request()
+        if metricas is None:
+            return response
+
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={metricas["db"] * 1000:.1f};desc="{metricas["sentencias"]} consultas", '
+            f'render;dur={metricas["render"] * 1000:.1f}, '
+            f'total;dur={metricas["total"] * 1000:.1f}'
+        )
+
+        endpoint = request.endpoint or 'desconocido'
+        registro = {
+            "endpoint": endpoint,
+            "metodo": request.method,
+            "ruta": request.path,
+            "estado": response.status_code,
+            "sentencias": metricas["sentencias"],
+            "db_ms": round(metricas["db"] * 1000, 2),
+            "render_ms": round(metricas["render"] * 1000, 2),
+            "total_ms": round(metricas["total"] * 1000, 2),
+        }
+        logger.info("request instrumentado", extra=registro)
+
+        limite = presupuestos.get(endpoint, presupuesto_general)
+        if limite and metricas["sentencias"] > limite:
+            logger.warning(
+                "El endpoint %s ejecutó %d sentencias SQL (presupuesto: %d)",
+                endpoint, metricas["sentencias"], limite,
+            )
+        return response
@@ -0,0 +1,172 @@
+"""
+Logs estructurados en JSON que no bloquean a los hilos que atienden requests.
+
+Los registros del logger ``said`` (``app.logger``) y de sus hijos (``said.instrumentacion``,
+``said.perfilado``, ...) se encolan en memoria y un único hilo los escribe en stderr como una
+línea JSON cada uno. Si la cola se llena, los registros nuevos se descartan en lugar de esperar.
+Cada registro lleva el identificador del request en curso (tomado de ``X-Request-ID`` o
+generado), y cada request deja un registro en ``said.requests`` con su duración.
+
+Configuración:
+
+- ``SAID_LOG_NIVEL``: nivel del logger ``said`` (por defecto ``INFO``).
+- ``SAID_LOG_NIVELES``: niveles por logger, por ejemplo ``said.requests=WARNING,sqlalchemy.engine=INFO``.
+- ``SAID_LOG_MUESTREO_DEBUG``: fracción de los registros DEBUG que se conservan (por defecto 1).
+- ``SAID_LOG_COLA``: capacidad de la cola (por defecto 10000 registros).
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+logger = logging.getLogger('said.requests')
+
+_ATRIBUTOS_ESTANDAR = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+_manejador = None
+_lock = threading.Lock()
+
+
+def leer_niveles(valor) -> dict:
+    """Convierte ``'said.requests=WARNING,sqlalchemy.engine=INFO'`` en un diccionario de niveles."""
+    niveles = {}
+    for parte in (valor or '').split(','):
+        if '=' in parte:
+            nombre, nivel = parte.split('=', 1)
+            niveles[nombre.strip()] = nivel.strip().upper()
+    return niveles
+
+
+class FormateadorJSON(logging.Formatter):
+    """Escribe cada registro como un objeto JSON en una línea, con sus campos ``extra``."""
+
+    def format(self, record):
+        datos = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            datos["request_id"] = record.request_id
+        datos.update(
+            (clave, valor) for clave, valor in vars(record).items() if clave not in _ATRIBUTOS_ESTANDAR
+        )
+        if record.exc_text:
+            datos["excepcion"] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FiltroContexto(logging.Filter):
+    """Agrega el identificador del request en curso; corre en el hilo que emite el registro."""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class FiltroMuestreo(logging.Filter):
+    """Conserva solo una fracción de los registros DEBUG; los de nivel mayor pasan siempre."""
+
+    def __init__(self, fraccion):
+        super().__init__()
+        self.fraccion = fraccion
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.fraccion
+
+
+class ManejadorCola(logging.handlers.QueueHandler):
+    """QueueHandler que descarta registros en lugar de bloquear cuando la cola está llena."""
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+    def prepare(self, record):
+        # El mensaje y la traza se resuelven acá, porque los argumentos pueden cambiar después
+        registro = copy.copy(record)
+        registro.msg = record.getMessage()
+        registro.args = None
+        if record.exc_info:
+            registro.exc_text = logging.Formatter().formatException(record.exc_info)
+        registro.exc_info = None
+        return registro
+
+
+def _iniciar_cola(capacidad):
+    global _listener, _manejador
+    with _lock:
+        if _manejador is None:
+            cola = queue.Queue(capacidad)
+            salida = logging.StreamHandler(sys.stderr)
+            salida.setFormatter(FormateadorJSON())
+            _manejador = ManejadorCola(cola)
+            _manejador.addFilter(FiltroContexto())
+            _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+            _listener.start()
+            atexit.register(_listener.stop)
+    return _manejador
+
+
+def configurar_logs(app):
+    """
+    Dirige los logs de la aplicación a la cola y registra los identificadores de request.
+
+    El hilo escritor se crea una sola vez por proceso; cada aplicación registra sus propios hooks.
+    """
+    manejador = _iniciar_cola(int(app.config.get('SAID_LOG_COLA') or 10000))
+    fraccion = float(app.config.get('SAID_LOG_MUESTREO_DEBUG', 1))
+    if not any(isinstance(f, FiltroMuestreo) for f in manejador.filters):
+        manejador.addFilter(FiltroMuestreo(fraccion))
+    else:
+        next(f for f in manejador.filters if isinstance(f, FiltroMuestreo)).fraccion = fraccion
+
+    raiz = logging.getLogger('said')
+    raiz.setLevel(app.config.get('SAID_LOG_NIVEL') or 'INFO')
+    raiz.propagate = False
+    if manejador not in raiz.handlers:
+        raiz.addHandler(manejador)
+    for nombre, nivel in leer_niveles(app.config.get('SAID_LOG_NIVELES')).items():
+        registrado = logging.getLogger(nombre)
+        registrado.setLevel(nivel)
+        if not nombre.startswith('said') and manejador not in registrado.handlers:
+            registrado.addHandler(manejador)
+
+    @app.before_request
+    def asignar_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.said_log_inicio = time.perf_counter()
+
+    @app.after_request
+    def registrar_request(response):
+        inicio = g.pop('said_log_inicio', None)
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        if inicio is not None and logger.isEnabledFor(logging.INFO):
+            logger.info("request", extra={
+                "metodo": request.method,
+                "ruta": request.path,
+                "endpoint": request.endpoint,
+                "estado": response.status_code,
+                "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2),
+            })
+        return response
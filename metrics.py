@@ -0,0 +1,118 @@
+"""
+Métricas de la aplicación en formato Prometheus, expuestas en ``/metrics``.
+
+Con varios workers de gunicorn hay que definir ``PROMETHEUS_MULTIPROC_DIR`` antes de iniciar
+el servidor: cada proceso escribe sus valores en archivos mmap de ese directorio y ``/metrics``
+los agrega al responder, sin ningún servicio externo (ver ``gunicorn.conf.py``).
+"""
+
+import os
+import time
+
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from pooling import agregar_observador_espera, estadisticas_pool
+
+REQUESTS = Counter(
+    'said_requests_total',
+    'Requests atendidos por endpoint, método y estado.',
+    ['endpoint', 'method', 'status'],
+)
+LATENCIA = Histogram(
+    'said_request_duration_seconds',
+    'Duración de los requests por endpoint y estado.',
+    ['endpoint', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+PREFERENCIAS_POR_ENVIO = Histogram(
+    'said_submit_preferences',
+    'Cantidad de preferencias recibidas por llamada a guardar_respuesta.',
+    buckets=(0, 5, 10, 20, 40, 60, 80, 120, 200),
+)
+ENVIOS_DIFERIDOS = Counter(
+    'said_write_behind_submissions_total',
+    'Envíos en modo de escritura diferida, por etapa (encolado, aplicado, descartado).',
+    ['etapa'],
+)
+PEDIDOS_LIMITADOS = Counter(
+    'said_rate_limited_total',
+    'Pedidos rechazados con 429 por el limitador, por endpoint y dimensión.',
+    ['endpoint', 'dimension'],
+)
+POOL_EN_USO = Gauge(
+    'said_db_pool_checked_out',
+    'Conexiones del pool en uso.',
+    multiprocess_mode='livesum',
+)
+POOL_DISPONIBLES = Gauge(
+    'said_db_pool_checked_in',
+    'Conexiones del pool libres.',
+    multiprocess_mode='livesum',
+)
+POOL_DESBORDE = Gauge(
+    'said_db_pool_overflow',
+    'Conexiones abiertas por encima del tamaño del pool.',
+    multiprocess_mode='livesum',
+)
+ESPERA_POOL = Histogram(
+    'said_db_pool_wait_seconds',
+    'Tiempo para obtener una conexión del pool.',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+CACHE_REFERENCIA = Counter(
+    'said_reference_cache_total',
+    'Accesos a la caché de datos de referencia según su resultado '
+    '(acierto, verificado, recarga o sin_version).',
+    ['resultado'],
+)
+
+agregar_observador_espera(ESPERA_POOL.observe)
+
+
+def generar_metricas():
+    """
+    Serializa las métricas de todos los procesos en el formato de texto de Prometheus.
+
+    :return: Una tupla (contenido, tipo MIME).
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
+
+
+def registrar_metricas(app, db):
+    """Mide cada request de la aplicación y actualiza los indicadores del pool de conexiones."""
+
+    @app.before_request
+    def iniciar_cronometro():
+        g.said_inicio_request = time.perf_counter()
+
+    @app.after_request
+    def medir_request(response):
+        inicio = g.pop('said_inicio_request', None)
+        if inicio is None:
+            return response
+        endpoint = request.endpoint or 'desconocido'
+        estado = str(response.status_code)
+        REQUESTS.labels(endpoint, request.method, estado).inc()
+        LATENCIA.labels(endpoint, estado).observe(time.perf_counter() - inicio)
+
+        pool = estadisticas_pool(db.engine)
+        if 'en_uso' in pool:
+            POOL_EN_USO.set(pool['en_uso'])
+            POOL_DISPONIBLES.set(pool['disponibles'])
+            POOL_DESBORDE.set(pool['desborde'])
+        return response
@@ -0,0 +1,69 @@
+"""
+Entorno de Alembic para SAID.
+
+Las migraciones se comparan contra los modelos de ``entities.py`` y se aplican sobre la base de
+la aplicación. Para otra base: ``alembic -x url=postgresql://... upgrade head``.
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from entities import db
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get('configurar_logs', True):
+    fileConfig(config.config_file_name)
+
+target_metadata = db.metadata
+
+
+def _url():
+    url = context.get_x_argument(as_dictionary=True).get('url') or config.get_main_option('sqlalchemy.url')
+    if url:
+        return url
+    from said import app
+    return app.config['SQLALCHEMY_DATABASE_URI']
+
+
+def run_migrations_offline() -> None:
+    """Genera el SQL de las migraciones sin conectarse a la base."""
+    context.configure(
+        url=_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Aplica las migraciones sobre la base (o sobre la conexión recibida en ``config.attributes``)."""
+    conexion = config.attributes.get('connection')
+    if conexion is not None:
+        _migrar(conexion)
+        return
+    motor = create_engine(_url(), poolclass=pool.NullPool)
+    with motor.connect() as conexion:
+        _migrar(conexion)
+
+
+def _migrar(conexion):
+    context.configure(
+        connection=conexion,
+        target_metadata=target_metadata,
+        # SQLite no admite la mayoría de los ALTER TABLE; en modo batch se recrea la tabla
+        render_as_batch=conexion.dialect.name == 'sqlite',
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
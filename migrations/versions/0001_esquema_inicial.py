@@ -0,0 +1,109 @@
+"""Esquema inicial, equivalente al que creaba db.create_all() antes de las migraciones
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+Contiene solo las tablas originales de la aplicación. Una base creada con ``db.create_all()``
+antes de las migraciones ya tiene este esquema y se marca con ``alembic stamp 0001`` antes de
+``alembic upgrade head``; las tablas agregadas después están en la revisión ``0001a``.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'horarios',
+        sa.Column('hora_inicio', sa.Time(), nullable=False),
+        sa.Column('hora_fin', sa.Time(), nullable=False),
+        sa.PrimaryKeyConstraint('hora_inicio', 'hora_fin'),
+    )
+    op.create_table(
+        'materias',
+        sa.Column('nombre', sa.String(), nullable=False),
+        sa.Column('nombre_completo', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('nombre'),
+        sa.UniqueConstraint('nombre_completo'),
+    )
+    op.create_table(
+        'personas',
+        sa.Column('cedula', sa.String(), nullable=False),
+        sa.Column('nombre', sa.String(), nullable=False),
+        sa.Column('mail', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('cedula'),
+    )
+    op.create_table(
+        'turnos',
+        sa.Column('nombre', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('nombre'),
+    )
+    op.create_table(
+        'bloques_horarios',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('dia', sa.String(), sa.CheckConstraint("dia IN ('lun', 'mar', 'mie', 'jue', 'vie')"), nullable=False),
+        sa.Column('hora_inicio', sa.Time(), nullable=False),
+        sa.Column('hora_fin', sa.Time(), nullable=False),
+        sa.ForeignKeyConstraint(['hora_inicio', 'hora_fin'], ['horarios.hora_inicio', 'horarios.hora_fin']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'profesores',
+        sa.Column('cedula', sa.String(), nullable=False),
+        sa.Column('nombre', sa.String(), nullable=False),
+        sa.Column('nombre_completo', sa.String(), nullable=True),
+        sa.Column('ultima_modificacion', sa.DateTime(), nullable=True),
+        sa.Column('min_max_dias', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['cedula'], ['personas.cedula']),
+        sa.PrimaryKeyConstraint('nombre'),
+        sa.UniqueConstraint('nombre'),
+        sa.UniqueConstraint('nombre_completo'),
+    )
+    op.create_table(
+        'turnos_horarios',
+        sa.Column('hora_inicio', sa.Time(), nullable=False),
+        sa.Column('hora_fin', sa.Time(), nullable=False),
+        sa.Column('turno', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['hora_inicio', 'hora_fin'], ['horarios.hora_inicio', 'horarios.hora_fin']),
+        sa.ForeignKeyConstraint(['turno'], ['turnos.nombre']),
+        sa.PrimaryKeyConstraint('hora_inicio', 'hora_fin', 'turno'),
+    )
+    op.create_table(
+        'prioridades',
+        sa.Column('profesor', sa.String(), nullable=False),
+        sa.Column('bloque_horario', sa.Integer(), nullable=False),
+        sa.Column('valor', sa.Integer(), sa.CheckConstraint('valor IN (0, 1, 2, 3)'), nullable=False),
+        sa.ForeignKeyConstraint(['bloque_horario'], ['bloques_horarios.id']),
+        sa.ForeignKeyConstraint(['profesor'], ['profesores.nombre']),
+        sa.PrimaryKeyConstraint('profesor', 'bloque_horario'),
+    )
+    op.create_table(
+        'puede_dictar',
+        sa.Column('profesor', sa.String(), nullable=False),
+        sa.Column('materia', sa.String(), nullable=False),
+        sa.Column('turno', sa.String(), nullable=False),
+        sa.Column('grupos_max', sa.Integer(), sa.CheckConstraint('grupos_max > 0'), nullable=True),
+        sa.ForeignKeyConstraint(['materia'], ['materias.nombre']),
+        sa.ForeignKeyConstraint(['profesor'], ['profesores.nombre']),
+        sa.ForeignKeyConstraint(['turno'], ['turnos.nombre']),
+        sa.PrimaryKeyConstraint('profesor', 'materia', 'turno'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for tabla in (
+        'puede_dictar', 'prioridades', 'turnos_horarios', 'profesores', 'bloques_horarios',
+        'turnos', 'personas', 'materias', 'horarios',
+    ):
+        op.drop_table(tabla)
@@ -0,0 +1,65 @@
+"""Tablas y columnas de los servicios agregados sobre el esquema inicial
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18 12:15:00
+
+- ``profesores.grilla_preferencias``: preferencias empaquetadas del modo de almacenamiento 'grilla'.
+- ``versiones_referencia``: sello de la caché de datos de referencia.
+- ``envios_pendientes``: cola del modo de escritura diferida.
+- ``progreso_envios``: contadores del informe de progreso de envíos.
+
+Una base creada con ``db.create_all()`` que ya tiene estas tablas se marca con
+``alembic stamp 0001a`` en lugar de ``0001``.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001a'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('profesores') as batch_op:
+        batch_op.add_column(sa.Column('grilla_preferencias', sa.LargeBinary(), nullable=True))
+    op.create_table(
+        'versiones_referencia',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.String(), nullable=False),
+        sa.Column('actualizado', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'envios_pendientes',
+        sa.Column('profesor', sa.String(), nullable=False),
+        sa.Column('envio', sa.String(), nullable=False),
+        sa.Column('preferencias', sa.Text(), nullable=False),
+        sa.Column('min_max_dias', sa.Boolean(), nullable=True),
+        sa.Column('recibido', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['profesor'], ['profesores.nombre']),
+        sa.PrimaryKeyConstraint('profesor'),
+    )
+    op.create_table(
+        'progreso_envios',
+        sa.Column('dimension', sa.String(), nullable=False),
+        sa.Column('clave', sa.String(), nullable=False),
+        sa.Column('total_profesores', sa.Integer(), nullable=False),
+        sa.Column('enviados', sa.Integer(), nullable=False),
+        sa.Column('ultimo_envio', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('dimension', 'clave'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for tabla in ('progreso_envios', 'envios_pendientes', 'versiones_referencia'):
+        op.drop_table(tabla)
+    with op.batch_alter_table('profesores') as batch_op:
+        batch_op.drop_column('grilla_preferencias')
@@ -0,0 +1,43 @@
+"""Índices para las consultas frecuentes
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-18 12:30:00
+
+- ``profesores.cedula``: todas las vistas buscan al profesor por cédula. El índice es único;
+  si la base tiene cédulas repetidas hay que depurarlas antes de migrar. La importación de
+  ``initialize_db.py`` omite (e informa) los profesores cuya cédula ya es de otro nombre corto.
+- ``turnos_horarios.turno``: la clave primaria empieza por las horas, no por el turno.
+- ``bloques_horarios (hora_inicio, hora_fin)``: unión con los horarios de cada turno.
+- ``envios_pendientes.recibido``: orden en que el procesador de escritura diferida toma la cola.
+
+``puede_dictar`` y ``prioridades`` ya se filtran por profesor a través de su clave primaria,
+que empieza por esa columna.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_profesores_cedula', 'profesores', ['cedula'], unique=True)
+    op.create_index('ix_turnos_horarios_turno', 'turnos_horarios', ['turno'])
+    op.create_index('ix_bloques_horarios_horas', 'bloques_horarios', ['hora_inicio', 'hora_fin'])
+    op.create_index('ix_envios_pendientes_recibido', 'envios_pendientes', ['recibido'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_envios_pendientes_recibido', table_name='envios_pendientes')
+    op.drop_index('ix_bloques_horarios_horas', table_name='bloques_horarios')
+    op.drop_index('ix_turnos_horarios_turno', table_name='turnos_horarios')
+    op.drop_index('ix_profesores_cedula', table_name='profesores')
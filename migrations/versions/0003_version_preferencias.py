@@ -0,0 +1,32 @@
+"""Versión de las preferencias de cada profesor
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 15:00:00
+
+``profesores.version_preferencias`` se incrementa con cada escritura de preferencias y es la
+precondición (``If-Match``) de ``PATCH /api/preferences``.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('profesores') as tabla:
+        tabla.add_column(sa.Column('version_preferencias', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('profesores') as tabla:
+        tabla.drop_column('version_preferencias')
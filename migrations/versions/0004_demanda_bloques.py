@@ -0,0 +1,39 @@
+"""Contadores de demanda por bloque horario
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 17:00:00
+
+La tabla se llena con ``flask --app said reconstruir-demanda`` y desde entonces se actualiza
+con cada envío.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'demanda_bloques',
+        sa.Column('dimension', sa.String(), nullable=False),
+        sa.Column('clave', sa.String(), nullable=False),
+        sa.Column('bloque_horario', sa.Integer(), nullable=False),
+        sa.Column('valor', sa.Integer(), sa.CheckConstraint('valor IN (1, 2, 3)'), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['bloque_horario'], ['bloques_horarios.id']),
+        sa.PrimaryKeyConstraint('dimension', 'clave', 'bloque_horario', 'valor'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('demanda_bloques')
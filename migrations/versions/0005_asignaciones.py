@@ -0,0 +1,42 @@
+"""Asignaciones generadas por el solver de horarios
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 19:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'asignaciones',
+        sa.Column('profesor', sa.String(), nullable=False),
+        sa.Column('materia', sa.String(), nullable=False),
+        sa.Column('turno', sa.String(), nullable=False),
+        sa.Column('grupo', sa.Integer(), nullable=False),
+        sa.Column('bloque_horario', sa.Integer(), nullable=False),
+        sa.Column('valor', sa.Integer(), nullable=False),
+        sa.Column('generado', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['bloque_horario'], ['bloques_horarios.id']),
+        sa.ForeignKeyConstraint(['materia'], ['materias.nombre']),
+        sa.ForeignKeyConstraint(['profesor'], ['profesores.nombre']),
+        sa.ForeignKeyConstraint(['turno'], ['turnos.nombre']),
+        sa.PrimaryKeyConstraint('profesor', 'materia', 'turno', 'grupo', 'bloque_horario'),
+        sa.UniqueConstraint('profesor', 'bloque_horario', name='uq_asignaciones_profesor_bloque'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('asignaciones')
@@ -0,0 +1,113 @@
+"""
+Configuración del pool de conexiones a partir de variables de entorno y sus estadísticas.
+
+Variables reconocidas (todas opcionales):
+
+- ``SAID_DB_POOL_SIZE``: conexiones persistentes por proceso (por defecto 5).
+- ``SAID_DB_MAX_OVERFLOW``: conexiones adicionales permitidas en picos (por defecto 10).
+- ``SAID_DB_POOL_TIMEOUT``: segundos de espera máxima por una conexión (por defecto 30).
+- ``SAID_DB_POOL_RECYCLE``: segundos tras los cuales se reabre una conexión (por defecto 1800).
+- ``SAID_DB_POOL_PRE_PING``: verificar la conexión antes de usarla (por defecto ``true``).
+- ``SAID_DB_PGBOUNCER``: con ``true`` no se mantiene pool propio (NullPool) y se desactivan
+  las sentencias preparadas, como requiere PgBouncer en modo transacción.
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+VERDADEROS = ('1', 'true', 'yes', 'si', 'sí', 'on')
+
+_esperas = {"cantidad": 0, "total": 0.0, "maxima": 0.0}
+_esperas_lock = threading.Lock()
+_observadores_espera = []
+
+
+def agregar_observador_espera(funcion):
+    """Registra una función que recibe los segundos de cada pedido de conexión al pool."""
+    _observadores_espera.append(funcion)
+
+
+def _registrar_espera(segundos):
+    with _esperas_lock:
+        _esperas["cantidad"] += 1
+        _esperas["total"] += segundos
+        if segundos > _esperas["maxima"]:
+            _esperas["maxima"] = segundos
+    for funcion in _observadores_espera:
+        funcion(segundos)
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide cuánto tarda cada pedido de conexión, incluida la espera en la cola."""
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _registrar_espera(time.perf_counter() - inicio)
+
+
+def _booleano(valor) -> bool:
+    return str(valor).strip().lower() in VERDADEROS
+
+
+def opciones_motor(url, entorno=None) -> dict:
+    """
+    Arma las opciones de ``create_engine`` para la URL de base de datos dada.
+
+    :param url: URL de conexión de SQLAlchemy.
+    :param entorno: Diccionario de variables de entorno (por defecto ``os.environ``).
+    :return: Un diccionario apto para ``SQLALCHEMY_ENGINE_OPTIONS``.
+    """
+    entorno = os.environ if entorno is None else entorno
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        # Flask-SQLAlchemy ya elige el pool adecuado para SQLite
+        return {}
+
+    if _booleano(entorno.get('SAID_DB_PGBOUNCER', 'false')):
+        opciones = {"poolclass": NullPool}
+        if url.get_driver_name() == 'psycopg':
+            # psycopg 3 prepara sentencias automáticamente; PgBouncer en modo transacción no lo admite
+            opciones["connect_args"] = {"prepare_threshold": None}
+        return opciones
+
+    return {
+        "poolclass": PoolMedido,
+        "pool_size": int(entorno.get('SAID_DB_POOL_SIZE', 5)),
+        "max_overflow": int(entorno.get('SAID_DB_MAX_OVERFLOW', 10)),
+        "pool_timeout": float(entorno.get('SAID_DB_POOL_TIMEOUT', 30)),
+        "pool_recycle": int(entorno.get('SAID_DB_POOL_RECYCLE', 1800)),
+        "pool_pre_ping": _booleano(entorno.get('SAID_DB_POOL_PRE_PING', 'true')),
+    }
+
+
+def estadisticas_pool(engine) -> dict:
+    """
+    Devuelve el estado actual del pool de un motor y las esperas acumuladas del proceso.
+
+    :param engine: Motor de SQLAlchemy.
+    :return: Un diccionario con el tamaño, las conexiones en uso, libres y de desborde, y la
+        cantidad, el total y el máximo de segundos esperados por una conexión.
+    """
+    pool = engine.pool
+    estadisticas = {"clase": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        estadisticas.update(
+            tamano=pool.size(),
+            en_uso=pool.checkedout(),
+            disponibles=pool.checkedin(),
+            desborde=max(pool.overflow(), 0),
+        )
+    with _esperas_lock:
+        estadisticas.update(
+            esperas=_esperas["cantidad"],
+            espera_total_s=_esperas["total"],
+            espera_maxima_s=_esperas["maxima"],
+        )
+    return estadisticas
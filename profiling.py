@@ -0,0 +1,160 @@
+"""
+Captura de perfiles de requests lentos o pedidos explícitamente por un administrador.
+
+Solo se activa si ``SAID_PROFILE_DIR`` está definido; en ese caso:
+
+- un request de administrador con el encabezado ``X-Profile: 1`` se perfila con cProfile y
+  se guarda como ``.prof`` (legible con ``pstats`` o ``snakeviz``);
+- si ``SAID_PROFILE_SLOW_MS`` es mayor que cero, cada request se muestrea cada
+  ``SAID_PROFILE_INTERVAL_MS`` milisegundos desde un único hilo y, si tarda más que el umbral,
+  las pilas se guardan en formato "folded" (``.folded``, para flamegraph.pl o speedscope).
+
+Los archivos llevan la fecha, el endpoint y la duración en el nombre, y solo se conservan los
+``SAID_PROFILE_MAX_FILES`` más recientes. Sin ``SAID_PROFILE_DIR`` no se registra ningún hook.
+"""
+
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+logger = logging.getLogger('said.perfilado')
+
+
+class MuestreadorPilas:
+    """Hilo único que toma muestras periódicas de las pilas de los hilos registrados."""
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._muestras = {}
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def iniciar(self, id_hilo):
+        with self._lock:
+            self._muestras[id_hilo] = Counter()
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name='said-muestreador', daemon=True)
+                self._hilo.start()
+
+    def detener(self, id_hilo) -> Counter:
+        with self._lock:
+            return self._muestras.pop(id_hilo, Counter())
+
+    def _bucle(self):
+        while True:
+            time.sleep(self.intervalo)
+            with self._lock:
+                if not self._muestras:
+                    continue
+                marcos = sys._current_frames()
+                for id_hilo, muestras in self._muestras.items():
+                    marco = marcos.get(id_hilo)
+                    if marco is not None:
+                        muestras[_pila(marco)] += 1
+
+
+def _pila(marco) -> str:
+    """Convierte un marco en una pila 'folded': funciones desde la raíz separadas por ';'."""
+    funciones = []
+    while marco is not None:
+        codigo = marco.f_code
+        funciones.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}:{marco.f_lineno}")
+        marco = marco.f_back
+    return ";".join(reversed(funciones))
+
+
+def _guardar(directorio, maximo, endpoint, duracion_ms, extension, escribir):
+    """Escribe un perfil con un nombre descriptivo y descarta los más antiguos."""
+    nombre = (
+        f"{datetime.now():%Y%m%dT%H%M%S}-{endpoint}-{int(duracion_ms)}ms-"
+        f"{uuid.uuid4().hex[:6]}.{extension}"
+    )
+    ruta = os.path.join(directorio, nombre)
+    escribir(ruta)
+
+    perfiles = sorted(
+        (os.path.join(directorio, archivo) for archivo in os.listdir(directorio)
+         if archivo.endswith(('.prof', '.folded'))),
+        key=os.path.getmtime,
+    )
+    for viejo in perfiles[:-maximo]:
+        try:
+            os.remove(viejo)
+        except OSError:
+            pass
+    return nombre
+
+
+def registrar_perfilado(app, es_admin):
+    """
+    Registra los hooks de perfilado si ``SAID_PROFILE_DIR`` está configurado.
+
+    :param app: Aplicación Flask.
+    :param es_admin: Función sin argumentos que indica si el request actual es de un administrador.
+    """
+    directorio = app.config.get('SAID_PROFILE_DIR')
+    if not directorio:
+        return
+    os.makedirs(directorio, exist_ok=True)
+    umbral_ms = float(app.config.get('SAID_PROFILE_SLOW_MS') or 0)
+    maximo = int(app.config.get('SAID_PROFILE_MAX_FILES') or 50)
+    muestreador = None
+    if umbral_ms > 0:
+        muestreador = MuestreadorPilas(float(app.config.get('SAID_PROFILE_INTERVAL_MS') or 5) / 1000)
+
+    @app.before_request
+    def iniciar_perfil():
+        g.said_perfil_inicio = time.perf_counter()
+        if request.headers.get('X-Profile') == '1' and es_admin():
+            perfil = cProfile.Profile()
+            g.said_perfil = perfil
+            perfil.enable()
+        elif muestreador is not None:
+            g.said_muestreo = threading.get_ident()
+            muestreador.iniciar(g.said_muestreo)
+
+    @app.after_request
+    def guardar_perfil(response):
+        inicio = g.pop('said_perfil_inicio', None)
+        if inicio is None:
+            return response
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        endpoint = request.endpoint or 'desconocido'
+
+        perfil = g.pop('said_perfil', None)
+        if perfil is not None:
+            perfil.disable()
+            nombre = _guardar(directorio, maximo, endpoint, duracion_ms, 'prof', perfil.dump_stats)
+            response.headers['X-Profile-File'] = nombre
+            return response
+
+        id_hilo = g.pop('said_muestreo', None)
+        if id_hilo is not None:
+            muestras = muestreador.detener(id_hilo)
+            if duracion_ms >= umbral_ms and muestras:
+                def escribir(ruta):
+                    with open(ruta, 'w', encoding='utf-8') as archivo:
+                        for pila, cantidad in muestras.most_common():
+                            archivo.write(f"{pila} {cantidad}\n")
+
+                nombre = _guardar(directorio, maximo, endpoint, duracion_ms, 'folded', escribir)
+                logger.warning("Request lento en %s (%.0f ms), perfil guardado en %s", endpoint, duracion_ms, nombre)
+        return response
+
+    @app.teardown_request
+    def liberar_perfil(exc):
+        # Si el request terminó sin pasar por after_request no debe quedar registrado ni perfilando
+        perfil = g.pop('said_perfil', None)
+        if perfil is not None:
+            perfil.disable()
+        id_hilo = g.pop('said_muestreo', None)
+        if id_hilo is not None:
+            muestreador.detener(id_hilo)
@@ -0,0 +1,183 @@
+"""
+Limitación de pedidos por usuario y por IP con cubos de tokens.
+
+Cada límite tiene la forma ``capacidad/segundos``: se admiten ráfagas de hasta ``capacidad``
+pedidos y el cubo se vuelve a llenar a razón de ``capacidad`` tokens cada ``segundos``. Los
+límites se configuran por endpoint y dimensión en ``SAID_LIMITES``, por ejemplo::
+
+    submit.usuario=5/60,submit.ip=120/60,handle_auth.ip=30/60
+
+Sin ``SAID_LIMITES`` se aplican los ``LIMITES_RECOMENDADOS``; con un valor vacío u ``off`` la
+limitación queda desactivada.
+
+La dimensión ``usuario`` usa el ``user_id`` de la sesión (y se ignora si no hay sesión) e ``ip``
+la dirección del cliente. Al superar un límite se responde 429 con ``Retry-After``, antes de
+tocar la base de datos.
+
+Por defecto los cubos viven en la memoria de cada proceso. Con ``SAID_LIMITES_ALMACEN`` apuntando
+a un archivo SQLite local se comparten entre todos los workers del mismo servidor; si ese archivo
+no responde a tiempo el pedido se admite, para que el limitador nunca frene a la aplicación.
+"""
+
+import logging
+import math
+import sqlite3
+import threading
+import time
+
+from flask import render_template, request, session
+
+from metrics import PEDIDOS_LIMITADOS
+
+logger = logging.getLogger('said.limites')
+
+DIMENSIONES = ('usuario', 'ip')
+LIMITES_RECOMENDADOS = 'submit.usuario=5/60,submit.ip=120/60,patch_preferences.usuario=10/60,handle_auth.ip=30/60'
+
+
+def leer_limites(valor) -> dict:
+    """
+    Convierte ``'submit.usuario=5/60'`` en ``{('submit', 'usuario'): (5.0, 60.0)}``.
+
+    Un valor vacío u ``off`` no define ningún límite.
+    """
+    limites = {}
+    if (valor or '').strip().lower() == 'off':
+        return limites
+    for parte in (valor or '').split(','):
+        if '=' not in parte:
+            continue
+        clave, limite = parte.split('=', 1)
+        endpoint, dimension = clave.strip().rsplit('.', 1)
+        if dimension not in DIMENSIONES:
+            raise ValueError(f"Dimensión de límite desconocida: {dimension}")
+        capacidad, segundos = limite.split('/', 1)
+        limites[(endpoint, dimension)] = (float(capacidad), float(segundos))
+    return limites
+
+
+def consumir_token(tokens, actualizado, ahora, capacidad, segundos):
+    """
+    Aplica un pedido sobre el estado de un cubo.
+
+    :return: Una tupla (admitido, tokens restantes, segundos hasta el próximo token).
+    """
+    tasa = capacidad / segundos
+    tokens = min(capacidad, tokens + (ahora - actualizado) * tasa)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / tasa
+
+
+class AlmacenMemoria:
+    """Cubos en un diccionario del proceso."""
+
+    def __init__(self, maximo=100_000):
+        self._cubos = {}
+        self._lock = threading.Lock()
+        self.maximo = maximo
+
+    def consumir(self, clave, capacidad, segundos):
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, actualizado = self._cubos.get(clave, (capacidad, ahora))
+            admitido, tokens, espera = consumir_token(tokens, actualizado, ahora, capacidad, segundos)
+            self._cubos[clave] = (tokens, ahora)
+            if len(self._cubos) > self.maximo:
+                self._purgar(ahora)
+        return admitido, espera
+
+    def _purgar(self, ahora):
+        # Un cubo sin uso durante un período completo está lleno y equivale a no tenerlo
+        self._cubos = {
+            clave: (tokens, actualizado)
+            for clave, (tokens, actualizado) in self._cubos.items()
+            if ahora - actualizado < 3600
+        }
+
+
+class AlmacenSQLite:
+    """Cubos en un archivo SQLite local compartido por los workers del servidor."""
+
+    def __init__(self, ruta, espera=0.05):
+        self.ruta = ruta
+        self.espera = espera
+        self._local = threading.local()
+        conexion = self._conexion()
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS cubos (clave TEXT PRIMARY KEY, tokens REAL NOT NULL, actualizado REAL NOT NULL)"
+        )
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=self.espera, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=OFF")
+            self._local.conexion = conexion
+        return conexion
+
+    def consumir(self, clave, capacidad, segundos):
+        # Reloj de pared: el monotónico no es comparable entre procesos
+        ahora = time.time()
+        conexion = self._conexion()
+        try:
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                fila = conexion.execute("SELECT tokens, actualizado FROM cubos WHERE clave = ?", (clave,)).fetchone()
+                tokens, actualizado = fila if fila else (capacidad, ahora)
+                admitido, tokens, espera = consumir_token(tokens, actualizado, ahora, capacidad, segundos)
+                conexion.execute(
+                    "INSERT INTO cubos (clave, tokens, actualizado) VALUES (?, ?, ?) "
+                    "ON CONFLICT (clave) DO UPDATE SET tokens = excluded.tokens, actualizado = excluded.actualizado",
+                    (clave, tokens, ahora),
+                )
+                conexion.execute("COMMIT")
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError:
+            logger.warning("El almacén de límites no respondió; se admite el pedido", exc_info=True)
+            return True, 0.0
+        return admitido, espera
+
+
+def registrar_limites(app):
+    """
+    Registra la limitación de pedidos si ``SAID_LIMITES`` define algún límite.
+
+    :return: El almacén de cubos, o None si no hay límites configurados.
+    """
+    limites = leer_limites(app.config.get('SAID_LIMITES'))
+    if not limites:
+        return None
+    ruta = app.config.get('SAID_LIMITES_ALMACEN')
+    almacen = AlmacenSQLite(ruta) if ruta else AlmacenMemoria()
+    por_endpoint = {}
+    for (endpoint, dimension), limite in limites.items():
+        por_endpoint.setdefault(endpoint, []).append((dimension, limite))
+
+    @app.before_request
+    def limitar_pedidos():
+        endpoint = request.endpoint
+        if endpoint not in por_endpoint:
+            return None
+        for dimension, (capacidad, segundos) in por_endpoint[endpoint]:
+            valor = session.get('user_id') if dimension == 'usuario' else request.remote_addr
+            if valor is None:
+                continue
+            admitido, espera = almacen.consumir(f"{endpoint}:{dimension}:{valor}", capacidad, segundos)
+            if not admitido:
+                PEDIDOS_LIMITADOS.labels(endpoint=endpoint, dimension=dimension).inc()
+                return _respuesta_limitada(math.ceil(espera))
+        return None
+
+    return almacen
+
+
+def _respuesta_limitada(segundos):
+    mensaje = f"Demasiados pedidos. Intente nuevamente en {segundos} segundos."
+    encabezados = {'Retry-After': str(segundos)}
+    if request.is_json or not request.accept_mimetypes.accept_html:
+        return {"error": mensaje}, 429, encabezados
+    return render_template('error.html', message=mensaje), 429, encabezados
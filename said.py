@@ -1,19 +1,43 @@
+import hmac
 import json
-from typing import Any, List
-from flask import Flask, render_template, request, redirect, session
+import sys
+from functools import wraps
+from typing import Any, FrozenSet
+import click
+from flask import Flask, Response, make_response, render_template, request, redirect, session, stream_with_context
 import os
 import jwt
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 from entities import db
 from services import (
     guardar_respuesta,
-    obtener_bloques_horarios,
-    verificar_profesor,
-    get_professor_data,
-    get_previous_preferences,
-    listar_turnos_materias_profesor,
+    encolar_respuesta,
+    aplicar_cambios_preferencias,
+    ConflictoVersion,
+    escritura_diferida,
+    cargar_pagina_preferencias,
+    obtener_etag_preferencias,
+    migrar_preferencias_a_grilla,
+    obtener_progreso_envios,
+    listar_profesores_pendientes,
+    reconstruir_progreso_envios,
+    obtener_demanda_bloques,
+    reconstruir_demanda_bloques,
+    listar_materias,
+    listar_turnos,
     decode_hash,
 )
+from assets import registrar_recursos
+from export import FORMATOS, TIPOS_MIME, FormatoNoDisponible, exportar
+from pooling import estadisticas_pool, opciones_motor
+from instrumentation import instrumentar
+from logs import configurar_logs
+from metrics import generar_metricas, registrar_metricas
+from profiling import registrar_perfilado
+from ratelimit import LIMITES_RECOMENDADOS, registrar_limites
+from solver import cargar_problema, guardar_asignaciones, resolver
+from write_behind import ProcesadorEnvios, registrar_escritura_diferida
 from datetime import timedelta
 
 # Load environment variables from .env file
@@ -42,46 +66,121 @@ app.secret_key = SECRET_KEY
 # Flask app configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pool size, overflow, recycle, pre-ping and PgBouncer mode come from SAID_DB_* variables
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opciones_motor(DATABASE_URL)
+# Seconds between checks of the reference data version stamp (blocks, turnos, materias)
+app.config['SAID_REFERENCIA_TTL'] = float(os.getenv('SAID_REFERENCIA_TTL', '30'))
+# Preference storage: 'filas' (one prioridades row per block) or 'grilla' (packed per professor)
+app.config['SAID_ALMACENAMIENTO_PREFERENCIAS'] = os.getenv('SAID_ALMACENAMIENTO_PREFERENCIAS', 'filas')
+# Token required by the /admin routes; without it they are disabled
+app.config['SAID_ADMIN_TOKEN'] = os.getenv('SAID_ADMIN_TOKEN')
+# Opt-in per-request SQL counting, Server-Timing header and statement budgets
+app.config['SAID_INSTRUMENTACION_SQL'] = os.getenv('SAID_INSTRUMENTACION_SQL', '').lower() in ('1', 'true', 'yes')
+app.config['SAID_PRESUPUESTO_SQL'] = int(os.getenv('SAID_PRESUPUESTO_SQL', '0'))
+app.config['SAID_PRESUPUESTOS_SQL'] = os.getenv('SAID_PRESUPUESTOS_SQL', '')
+# Profiling of slow or admin-flagged requests; disabled unless SAID_PROFILE_DIR is set
+app.config['SAID_PROFILE_DIR'] = os.getenv('SAID_PROFILE_DIR')
+app.config['SAID_PROFILE_SLOW_MS'] = float(os.getenv('SAID_PROFILE_SLOW_MS', '0'))
+app.config['SAID_PROFILE_INTERVAL_MS'] = float(os.getenv('SAID_PROFILE_INTERVAL_MS', '5'))
+app.config['SAID_PROFILE_MAX_FILES'] = int(os.getenv('SAID_PROFILE_MAX_FILES', '50'))
+# Write-behind mode: /submit only queues the submission and a background thread applies it
+app.config['SAID_ESCRITURA_DIFERIDA'] = os.getenv('SAID_ESCRITURA_DIFERIDA', '').lower() in ('1', 'true', 'yes')
+app.config['SAID_ESCRITURA_LOTE'] = int(os.getenv('SAID_ESCRITURA_LOTE', '100'))
+app.config['SAID_ESCRITURA_INTERVALO'] = float(os.getenv('SAID_ESCRITURA_INTERVALO', '0.5'))
+# Token-bucket limits per endpoint and user/IP; the recommended ones apply when unset, and an
+# empty value or 'off' disables them
+app.config['SAID_LIMITES'] = os.getenv('SAID_LIMITES', LIMITES_RECOMENDADOS)
+# Optional local SQLite file so the limits are shared by every gunicorn worker
+app.config['SAID_LIMITES_ALMACEN'] = os.getenv('SAID_LIMITES_ALMACEN')
+# Number of reverse proxies (nginx) in front of the app whose X-Forwarded-For can be trusted
+app.config['SAID_PROXIES'] = int(os.getenv('SAID_PROXIES', '0'))
+# Structured JSON logs written from a background thread
+app.config['SAID_LOG_NIVEL'] = os.getenv('SAID_LOG_NIVEL', 'INFO').upper()
+app.config['SAID_LOG_NIVELES'] = os.getenv('SAID_LOG_NIVELES', '')
+app.config['SAID_LOG_MUESTREO_DEBUG'] = float(os.getenv('SAID_LOG_MUESTREO_DEBUG', '1'))
+app.config['SAID_LOG_COLA'] = int(os.getenv('SAID_LOG_COLA', '10000'))
+# Manifest written by build_assets.py; defaults to static/dist/manifest.json
+app.config['SAID_ASSETS_MANIFEST'] = os.getenv('SAID_ASSETS_MANIFEST')
 
 db.init_app(app)
+configurar_logs(app)
+instrumentar(app)
+registrar_metricas(app, db)
+procesador_envios = registrar_escritura_diferida(app)
+registrar_limites(app)
+registrar_recursos(app)
+
+if app.config['SAID_PROXIES']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['SAID_PROXIES'])
+
+
+def is_admin_request() -> bool:
+    """Tell whether the current request carries the admin token.
+
+    The token is read from the ``X-Admin-Token`` header or from an
+    ``Authorization: Bearer`` header.
+    """
+    expected = app.config.get('SAID_ADMIN_TOKEN')
+    token = request.headers.get('X-Admin-Token', '')
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    return bool(expected) and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def admin_required(view):
+    """Restrict a view to requests carrying the admin token."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin_request():
+            return {"error": "No autorizado."}, 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+registrar_perfilado(app, is_admin_request)
 
 
 @app.route('/preferences')
 def index():
     """Render the preferences form for the logged in professor."""
     ci: int | Any = session.get('user_id')
-    print(f"app: index, ci: {ci}")
-    if not verificar_profesor(ci):
+    app.logger.debug("Página de preferencias pedida", extra={"ci": ci})
+
+    # Answer revalidations before loading anything else; a new asset build changes the page too
+    etag = obtener_etag_preferencias(ci)
+    if etag is not None and app.config.get('SAID_ASSETS_VERSION'):
+        etag = f"{etag}-{app.config['SAID_ASSETS_VERSION']}"
+    if etag is not None and request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    pagina = cargar_pagina_preferencias(ci)
+    if pagina is None:
         return render_template('error.html', message="Usted no se encuentra registrado."), 401
 
-    professor_data = get_professor_data(ci)
+    professor_data = pagina["profesor"]
     professor_name = professor_data.get('nombre_completo')
     min_max_dias = professor_data.get('min_max_dias', False)
 
-    # Obtener materias y turnos asignados
-    asignaciones = listar_turnos_materias_profesor(ci)
-    materias_asignadas = asignaciones["materias"]
-    turnos_asignados = asignaciones["turnos"]
+    # Materias y turnos asignados
+    materias_asignadas = pagina["materias"]
+    turnos_asignados = pagina["turnos"]
     if not turnos_asignados:
         return render_template('error.html', message="No se han encontrado turnos asignados para el profesor."), 404
 
-    # Obtener bloques horarios por turno
-    bloques_turno: List[int] = []
-    for turno in turnos_asignados:
-        bt = obtener_bloques_horarios(turno=turno)
-        bloques_turno.extend([b.get("id") for b in bt])
+    # Bloques horarios de los turnos asignados
+    bloques_turno: FrozenSet[int] = pagina["bloques_turno"]
 
-    print("app: bloques_turno:", bloques_turno)
-
-    all_time_blocks = obtener_bloques_horarios(turno=None)
-    previous_preferences = get_previous_preferences(ci)
-    for block in all_time_blocks:
-        block['preference'] = previous_preferences.get(block['id'], 0)
+    app.logger.debug("Bloques de los turnos asignados", extra={"ci": ci, "bloques_turno": sorted(bloques_turno)})
 
+    all_time_blocks = pagina["bloques_horarios"]
     if not all_time_blocks:
         return render_template('error.html', message="Imposible cargar datos del usuario. Inténtelo más tarde."), 500
 
-    return render_template(
+    response = make_response(render_template(
         'index.html',
         bloques_horarios=all_time_blocks,
         ci=ci,
@@ -89,8 +188,13 @@ def index():
         materias_asignadas=materias_asignadas,
         turnos_asignados=turnos_asignados,
         bloques_turno=bloques_turno,
-        min_max_dias=min_max_dias
-    )
+        min_max_dias=min_max_dias,
+        version_preferencias=professor_data.get('version_preferencias', 0),
+    ))
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @app.route('/')
@@ -121,15 +225,60 @@ def submit():
 
         ci = session.get('user_id')
 
-        guardar_respuesta(preferences, ci, min_dias)  # <-- pasa min_dias
+        if escritura_diferida():
+            cambios = encolar_respuesta(preferences, ci, min_dias)
+        else:
+            cambios = guardar_respuesta(preferences, ci, min_dias)  # <-- pasa min_dias
 
-        return {"success": True, "message": "Preferencias guardadas correctament"}, 200
+        return {"success": True, "message": "Preferencias guardadas correctament", "cambios": cambios}, 200
     except json.JSONDecodeError:
         return {"error": "No se ha podido decodificar correctamente el JSON"}, 400
     except Exception as e:
+        app.logger.exception("No se pudieron guardar las preferencias")
         return {"error": str(e)}, 500
 
 
+def version_if_match() -> int | None:
+    """Read the preferences version from an ``If-Match: "<version>"`` header."""
+    for etag in request.if_match.as_set():
+        if etag.isdigit():
+            return int(etag)
+    return None
+
+
+@app.route('/api/preferences', methods=['PATCH'])
+def patch_preferences():
+    """Apply only the grid cells changed since the page was loaded.
+
+    The body is ``{"cambios": {"<bloque_id>": valor, ...}, "min_dias": bool}``, where a
+    value of 0 clears the block, and ``If-Match`` must carry the version the page was
+    rendered with. A stale version is answered with 409 and a missing one with 428.
+    """
+    ci = session.get('user_id')
+    if ci is None:
+        return {"error": "Sesión no iniciada."}, 401
+    version = version_if_match()
+    if version is None:
+        return {"error": "Falta el encabezado If-Match con la versión de las preferencias."}, 428
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict) or not isinstance(datos.get('cambios'), dict):
+        return {"error": "Debes proporcionar los cambios."}, 400
+
+    try:
+        reporte = aplicar_cambios_preferencias(datos['cambios'], ci, version, datos.get('min_dias'))
+    except ConflictoVersion as conflicto:
+        response = make_response({"error": str(conflicto), "version": conflicto.version_actual}, 409)
+        if conflicto.version_actual is not None:
+            response.set_etag(str(conflicto.version_actual))
+        return response
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    response = make_response({"success": True, "message": "Preferencias guardadas correctamente", "cambios": reporte})
+    response.set_etag(str(reporte["version"]))
+    return response
+
+
 @app.route('/auth')
 def handle_auth():
     """Handle JWT based authentication used by the external portal."""
@@ -160,6 +309,136 @@ def handle_auth():
         return render_template('error.html', message="No se ha podido autenticar. Por favor, intente acceder nuevamente."), 500
 
 
+@app.route('/admin/export')
+@admin_required
+def admin_export():
+    """Stream every professor's preferences, assignments and min_max_dias."""
+    formato = request.args.get('format', 'ndjson')
+    if formato not in FORMATOS:
+        return {"error": f"Formato desconocido. Opciones: {', '.join(FORMATOS)}"}, 400
+    try:
+        trozos = exportar(formato)
+    except FormatoNoDisponible as error:
+        return {"error": str(error)}, 501
+    return Response(
+        stream_with_context(trozos),
+        mimetype=TIPOS_MIME[formato],
+        headers={'Content-Disposition': f'attachment; filename=preferencias.{formato}'},
+    )
+
+
+@app.route('/admin/progreso')
+@admin_required
+def admin_progreso():
+    """Report how many professors have submitted, overall and per turno and materia.
+
+    With ``?pendientes=1`` the professors still missing are listed too, optionally
+    restricted with ``turno`` or ``materia``.
+    """
+    informe = obtener_progreso_envios()
+    if request.args.get('pendientes'):
+        informe["pendientes"] = listar_profesores_pendientes(
+            turno=request.args.get('turno'),
+            materia=request.args.get('materia'),
+        )
+    return informe
+
+
+@app.route('/admin/demanda')
+@admin_required
+def admin_demanda():
+    """Render the per-block demand heatmap, overall or for one turno or materia.
+
+    The counts come from the precomputed ``demanda_bloques`` counters; ``?format=json``
+    returns the same data as JSON.
+    """
+    demanda = obtener_demanda_bloques(
+        turno=request.args.get('turno') or None,
+        materia=request.args.get('materia') or None,
+    )
+    if request.args.get('format') == 'json':
+        return demanda
+    return render_template('demanda.html', demanda=demanda, turnos=listar_turnos(), materias=listar_materias())
+
+
+@app.route('/admin/pool')
+@admin_required
+def admin_pool():
+    """Report the state of this worker's database connection pool."""
+    return estadisticas_pool(db.engine)
+
+
+@app.route('/metrics')
+@admin_required
+def metrics():
+    """Expose the Prometheus metrics aggregated across all workers."""
+    contenido, tipo = generar_metricas()
+    return Response(contenido, content_type=tipo)
+
+
+@app.cli.command('migrar-grilla')
+def migrar_grilla():
+    """Pack every professor's prioridades rows into the compact grid column."""
+    migrados = migrar_preferencias_a_grilla()
+    print(f"Grillas migradas: {migrados}")
+
+
+@app.cli.command('reconstruir-progreso')
+def reconstruir_progreso():
+    """Recompute the submission progress counters from scratch."""
+    filas = reconstruir_progreso_envios()
+    print(f"Filas de progreso: {filas}")
+
+
+@app.cli.command('reconstruir-demanda')
+def reconstruir_demanda():
+    """Recompute the per-block demand counters from scratch."""
+    filas = reconstruir_demanda_bloques()
+    print(f"Filas de demanda: {filas}")
+
+
+@app.cli.command('procesar-envios')
+@click.option('--lote', type=int, default=100, show_default=True, help='Envíos por transacción.')
+def procesar_envios(lote):
+    """Apply every queued write-behind submission and exit."""
+    aplicados = ProcesadorEnvios(app, tamano_lote=lote).procesar()
+    print(f"Envíos aplicados: {aplicados}")
+
+
+@app.cli.command('exportar')
+@click.option('--formato', type=click.Choice(FORMATOS), default='ndjson', show_default=True)
+@click.option('--salida', type=click.Path(dir_okay=False), default=None, help='Archivo destino (por defecto stdout).')
+@click.option('--lote', type=int, default=500, show_default=True, help='Profesores por lote.')
+def exportar_command(formato, salida, lote):
+    """Export every professor's preferences for the timetabling pipeline."""
+    try:
+        trozos = exportar(formato, tamano_lote=lote)
+    except FormatoNoDisponible as error:
+        raise click.ClickException(str(error))
+    destino = open(salida, 'wb') if salida else sys.stdout.buffer
+    try:
+        for trozo in trozos:
+            destino.write(trozo)
+    finally:
+        if salida:
+            destino.close()
+
+
+@app.cli.command('asignar-horarios')
+@click.option('--sesiones', type=click.IntRange(1, 5), default=2, show_default=True,
+              help='Bloques semanales de cada grupo, en días distintos.')
+@click.option('--procesos', type=click.IntRange(min=1), default=None, help='Procesos a usar (por defecto, uno por núcleo).')
+def asignar_horarios(sesiones, procesos):
+    """Build the timetable from the stored preferences and replace the asignaciones table."""
+    problema = cargar_problema()
+    resultado = resolver(problema, sesiones=sesiones, procesos=procesos)
+    filas = guardar_asignaciones(resultado)
+    print(f"Profesores: {len(problema.profesores)}")
+    print(f"Grupos asignados: {resultado.grupos_asignados}")
+    print(f"Grupos sin asignar: {resultado.grupos_sin_asignar}")
+    print(f"Bloques asignados: {filas} (costo total {resultado.costo_total})")
+
+
 if __name__ == "__main__":
     app.run(port=5000, debug=True)
 
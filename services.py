@@ -1,5 +1,33 @@
-from typing import Any, List
-from entities import TurnoHorario, db, Prioridad, BloqueHorario, Profesor, Materia, Turno, PuedeDictar
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+from itertools import groupby
+from operator import itemgetter
+from types import MappingProxyType
+from flask import current_app
+from sqlalchemy import and_, bindparam, case, delete, distinct, func, insert, or_, select, tuple_, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import joinedload, lazyload
+from entities import (
+    TurnoHorario,
+    db,
+    Prioridad,
+    BloqueHorario,
+    Profesor,
+    Materia,
+    Turno,
+    PuedeDictar,
+    VersionReferencia,
+    EnvioPendiente,
+    ProgresoEnvios,
+    DemandaBloque,
+    empaquetar_grilla,
+    desempaquetar_grilla,
+)
+from metrics import CACHE_REFERENCIA, ENVIOS_DIFERIDOS, PREFERENCIAS_POR_ENVIO
 
 
 def decode_hash(encoded: str) -> str:
@@ -15,38 +43,855 @@ def decode_hash(encoded: str) -> str:
     return original
 
 
+# Cantidad máxima de filas por sentencia INSERT multi-fila.
+TAMANO_LOTE = 500
+
+
+def upsert_filas(modelo, filas, actualizar, tamano_lote=TAMANO_LOTE):
+    """
+    Inserta o actualiza un conjunto de filas de un modelo con sentencias multi-fila.
+
+    En PostgreSQL y SQLite se usa INSERT ... ON CONFLICT (clave primaria) DO UPDATE, enviando
+    las filas en lotes de a lo sumo ``tamano_lote`` para no superar el límite de parámetros
+    del motor. En otros motores se recurre a ``merge`` fila por fila.
+
+    :param modelo: Clase del modelo a escribir.
+    :param filas: Lista de diccionarios {columna: valor}.
+    :param actualizar: Columnas a sobrescribir cuando la fila ya existe.
+    :param tamano_lote: Cantidad máxima de filas por sentencia.
+    """
+    if not filas:
+        return
+
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialecto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for fila in filas:
+            db.session.merge(modelo(**fila))
+        return
+
+    tabla = modelo.__table__
+    claves = [columna.name for columna in tabla.primary_key.columns]
+    for inicio in range(0, len(filas), tamano_lote):
+        sentencia = insert(tabla).values(filas[inicio:inicio + tamano_lote])
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=claves,
+            set_={columna: sentencia.excluded[columna] for columna in actualizar},
+        )
+        db.session.execute(sentencia)
+
+
+def modo_grilla() -> bool:
+    """Indica si las preferencias se almacenan empaquetadas en Profesor.grilla_preferencias."""
+    return current_app.config.get('SAID_ALMACENAMIENTO_PREFERENCIAS', 'filas') == 'grilla'
+
+
+def escritura_diferida() -> bool:
+    """Indica si los envíos se encolan en envios_pendientes en lugar de escribirse en el request."""
+    return bool(current_app.config.get('SAID_ESCRITURA_DIFERIDA'))
+
+
+def _normalizar_preferencias(preferences, grilla):
+    """Convierte claves y valores a enteros; en la grilla un 0 equivale a no tener preferencia."""
+    preferencias = {
+        int(bloque_horario_id): int(valor_prioridad) if valor_prioridad else 0
+        for bloque_horario_id, valor_prioridad in preferences.items()
+    }
+    if grilla:
+        preferencias = {b: v for b, v in preferencias.items() if v}
+    return preferencias
+
+
+def _diferencias(actuales, preferencias):
+    """Separa las preferencias enviadas en nuevas, modificadas y bloques a eliminar."""
+    nuevas = {b: v for b, v in preferencias.items() if b not in actuales}
+    modificadas = {b: v for b, v in preferencias.items() if b in actuales and actuales[b] != v}
+    eliminadas = [b for b in actuales if b not in preferencias]
+    return nuevas, modificadas, eliminadas
+
+
+def _sentencia_grilla():
+    """UPDATE de la grilla de un profesor, pensado para ejecutarse con executemany."""
+    tabla = Profesor.__table__
+    return (
+        update(tabla)
+        .where(tabla.c.nombre == bindparam('b_nombre'))
+        .values(grilla_preferencias=bindparam('b_grilla'))
+    )
+
+
 def guardar_respuesta(preferences, ci, min_dias=False):
     """
     Guarda las preferencias horarias de un profesor en la base de datos y el valor de min_dias.
+
+    Las preferencias enviadas se comparan con las almacenadas y solo se escriben las diferencias:
+    un DELETE para los bloques que dejaron de figurar y un INSERT ... ON CONFLICT DO UPDATE para
+    los nuevos o modificados. En el modo 'grilla' se reescribe la grilla empaquetada del profesor.
+    Si nada cambió no se escribe nada.
+
+    :param preferences: Diccionario {bloque_horario_id: valor}.
+    :param ci: Cédula del profesor.
+    :param min_dias: Si el profesor prefiere minimizar los días en la facultad.
+    :return: Un diccionario con la cantidad de preferencias insertadas, actualizadas y eliminadas
+        y si el envío no produjo cambios.
     """
-    profesor: Profesor = Profesor.query.filter_by(cedula=str(ci)).first()
-    if not profesor:
-        raise ValueError(f"No se encontró un profesor con la cédula {ci}")
+    PREFERENCIAS_POR_ENVIO.observe(len(preferences))
+    grilla = modo_grilla()
+    # Las diferencias se calculan contra lo almacenado, por lo que la fila del profesor se bloquea
+    # antes de leerlo: dos envíos simultáneos del mismo profesor se aplican uno después del otro.
+    # puede_dictar no se usa al guardar: se evita la consulta extra de su carga 'selectin'
+    if grilla:
+        profesor: Profesor = (
+            Profesor.query.options(lazyload(Profesor.puede_dictar))
+            .filter_by(cedula=str(ci))
+            .with_for_update()
+            .first()
+        )
+        if not profesor:
+            raise ValueError(f"No se encontró un profesor con la cédula {ci}")
+        actuales = desempaquetar_grilla(profesor.grilla_preferencias)
+    else:
+        filas = (
+            db.session.query(Profesor, Prioridad.bloque_horario, Prioridad.valor)
+            .options(lazyload(Profesor.puede_dictar))
+            .outerjoin(Prioridad, Prioridad.profesor == Profesor.nombre)
+            .filter(Profesor.cedula == str(ci))
+            .with_for_update(of=Profesor)
+            .all()
+        )
+        if not filas:
+            raise ValueError(f"No se encontró un profesor con la cédula {ci}")
+        profesor: Profesor = filas[0][0]
+        actuales = {bloque_id: valor for _, bloque_id, valor in filas if bloque_id is not None}
 
+    preferencias = _normalizar_preferencias(preferences, grilla)
+    nuevas, modificadas, eliminadas = _diferencias(actuales, preferencias)
+    reporte = {
+        "insertadas": len(nuevas),
+        "actualizadas": len(modificadas),
+        "eliminadas": len(eliminadas),
+        "sin_cambios": False,
+    }
+
+    if (
+        not (nuevas or modificadas or eliminadas)
+        and profesor.ultima_modificacion is not None
+        and bool(profesor.min_max_dias) == bool(min_dias)
+    ):
+        reporte["sin_cambios"] = True
+        return reporte
+
+    if nuevas:
+        # Los bloques ya almacenados son válidos por la clave foránea; solo se validan los nuevos
+        existentes = {
+            bloque_id
+            for (bloque_id,) in db.session.query(BloqueHorario.id)
+            .filter(BloqueHorario.id.in_(nuevas))
+        }
+        for bloque_horario_id in nuevas:
+            if bloque_horario_id not in existentes:
+                raise ValueError(f"No se encontró un bloque horario con ID {bloque_horario_id}")
+
+    primer_envio = _marcar_primer_envio(profesor.nombre)
     profesor.ultima_modificacion = db.func.now()
     profesor.min_max_dias = min_dias  # <-- Guarda el valor del checkbox
+    profesor.version_preferencias = Profesor.version_preferencias + 1
 
-    # Eliminar preferencias previas
-    Prioridad.query.filter_by(profesor=profesor.nombre).delete()
+    if grilla:
+        profesor.grilla_preferencias = empaquetar_grilla(preferencias)
+    else:
+        if eliminadas:
+            Prioridad.query.filter(
+                Prioridad.profesor == profesor.nombre,
+                Prioridad.bloque_horario.in_(eliminadas),
+            ).delete(synchronize_session=False)
 
-    for bloque_horario_id, valor_prioridad in preferences.items():
-        bloque_horario = BloqueHorario.query.get(bloque_horario_id)
-        if not bloque_horario:
-            raise ValueError(f"No se encontró un bloque horario con ID {bloque_horario_id}")
-        valor_prioridad = valor_prioridad if valor_prioridad else 0
+        upsert_filas(
+            Prioridad,
+            [
+                {"profesor": profesor.nombre, "bloque_horario": bloque_horario_id, "valor": valor}
+                for bloque_horario_id, valor in {**nuevas, **modificadas}.items()
+            ],
+            actualizar=["valor"],
+        )
+
+    _actualizar_demanda({profesor.nombre: _delta_demanda(actuales, preferencias)})
+    _registrar_envio(profesor.nombre, primer_envio)
+    db.session.commit()
+    return reporte
+
+def _marcar_primer_envio(nombre) -> bool:
+    """
+    Registra la primera modificación del profesor si todavía no tenía una.
+
+    Es un UPDATE condicionado a ``ultima_modificacion IS NULL``: de dos primeros envíos
+    simultáneos solo uno lo cumple, por lo que ``enviados`` no se cuenta dos veces.
+
+    :return: True si este es el primer envío del profesor.
+    """
+    resultado = db.session.execute(
+        update(Profesor)
+        .where(Profesor.nombre == nombre, Profesor.ultima_modificacion.is_(None))
+        .values(ultima_modificacion=db.func.now())
+        .execution_options(synchronize_session=False)
+    )
+    return resultado.rowcount == 1
+
+
+def _registrar_envio(nombre, primer_envio):
+    """
+    Suma un envío a los contadores de progreso del total y de cada turno y materia del profesor.
+
+    Es una sola sentencia UPDATE; los turnos y materias salen de subconsultas sobre puede_dictar.
+    Solo el primer envío del profesor incrementa ``enviados``; todos actualizan ``ultimo_envio``.
+    Como toda escritura toma la fila del total, se llama justo antes del commit, para retener
+    ese bloqueo lo menos posible.
+    """
+    turnos = select(PuedeDictar.turno).where(PuedeDictar.profesor == nombre)
+    materias = select(PuedeDictar.materia).where(PuedeDictar.profesor == nombre)
+    db.session.execute(
+        update(ProgresoEnvios)
+        .where(or_(
+            ProgresoEnvios.dimension == 'total',
+            and_(ProgresoEnvios.dimension == 'turno', ProgresoEnvios.clave.in_(turnos)),
+            and_(ProgresoEnvios.dimension == 'materia', ProgresoEnvios.clave.in_(materias)),
+        ))
+        .values(enviados=ProgresoEnvios.enviados + (1 if primer_envio else 0), ultimo_envio=db.func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconstruir_progreso_envios():
+    """
+    Recalcula desde cero los contadores de progreso de envíos.
+
+    Debe llamarse después de cargar profesores o de modificar puede_dictar, ya que los contadores
+    solo se actualizan con los envíos.
+
+    :return: La cantidad de filas de progreso escritas.
+    """
+    enviado = case((Profesor.ultima_modificacion.isnot(None), Profesor.nombre))
+    total, enviados, ultimo = db.session.query(
+        func.count(Profesor.nombre), func.count(enviado), func.max(Profesor.ultima_modificacion),
+    ).one()
+    filas = [{
+        "dimension": "total", "clave": "", "total_profesores": total, "enviados": enviados, "ultimo_envio": ultimo,
+    }]
+    for dimension, columna in (("turno", PuedeDictar.turno), ("materia", PuedeDictar.materia)):
+        consulta = (
+            db.session.query(
+                columna,
+                func.count(distinct(Profesor.nombre)),
+                func.count(distinct(enviado)),
+                func.max(Profesor.ultima_modificacion),
+            )
+            .join(Profesor, Profesor.nombre == PuedeDictar.profesor)
+            .group_by(columna)
+        )
+        filas.extend(
+            {"dimension": dimension, "clave": clave, "total_profesores": total, "enviados": enviados,
+             "ultimo_envio": ultimo}
+            for clave, total, enviados, ultimo in consulta
+        )
+
+    db.session.execute(delete(ProgresoEnvios))
+    db.session.execute(insert(ProgresoEnvios), filas)
+    db.session.commit()
+    return len(filas)
 
-        prioridad = Prioridad.query.filter_by(profesor=profesor.nombre, bloque_horario=bloque_horario_id).first()
-        if prioridad:
-            prioridad.valor = valor_prioridad
+
+def obtener_progreso_envios():
+    """
+    Arma el informe de progreso de envíos con una única consulta a progreso_envios.
+
+    :return: Un diccionario con el progreso total y listas por turno y por materia, cada uno con
+        total de profesores, enviados, pendientes y fecha del último envío.
+    """
+    informe = {"total": None, "turnos": [], "materias": []}
+    for fila in ProgresoEnvios.query.order_by(ProgresoEnvios.dimension, ProgresoEnvios.clave):
+        datos = {
+            "total_profesores": fila.total_profesores,
+            "enviados": fila.enviados,
+            "pendientes": fila.total_profesores - fila.enviados,
+            "ultimo_envio": fila.ultimo_envio.isoformat() if fila.ultimo_envio else None,
+        }
+        if fila.dimension == "total":
+            informe["total"] = datos
         else:
-            nueva_prioridad = Prioridad(
-                profesor=profesor.nombre,
-                bloque_horario=bloque_horario_id,
-                valor=valor_prioridad
+            informe[f"{fila.dimension}s"].append({"nombre": fila.clave, **datos})
+    return informe
+
+
+def listar_profesores_pendientes(turno=None, materia=None):
+    """
+    Lista los profesores que todavía no enviaron sus preferencias, opcionalmente de un turno o materia.
+
+    :return: Una lista de diccionarios con nombre, nombre completo y cédula.
+    """
+    consulta = db.session.query(Profesor.nombre, Profesor.nombre_completo, Profesor.cedula).filter(
+        Profesor.ultima_modificacion.is_(None)
+    )
+    if turno is not None or materia is not None:
+        asignados = select(PuedeDictar.profesor)
+        if turno is not None:
+            asignados = asignados.where(PuedeDictar.turno == turno)
+        if materia is not None:
+            asignados = asignados.where(PuedeDictar.materia == materia)
+        consulta = consulta.filter(Profesor.nombre.in_(asignados))
+    return [
+        {"nombre": nombre, "nombre_completo": nombre_completo, "cedula": cedula}
+        for nombre, nombre_completo, cedula in consulta.order_by(Profesor.nombre)
+    ]
+
+
+def _delta_demanda(anteriores, posteriores):
+    """
+    Diferencia entre dos conjuntos de preferencias de un profesor, como conteos por bloque y valor.
+
+    Los bloques que faltan o valen 0 no cuentan: son los no disponibles.
+
+    :return: Un Counter {(bloque_horario_id, valor): +1 o -1}.
+    """
+    delta = Counter()
+    for bloque_id, valor in anteriores.items():
+        if valor and posteriores.get(bloque_id) != valor:
+            delta[(bloque_id, valor)] -= 1
+    for bloque_id, valor in posteriores.items():
+        if valor and anteriores.get(bloque_id) != valor:
+            delta[(bloque_id, valor)] += 1
+    return delta
+
+
+def _actualizar_demanda(deltas):
+    """
+    Suma a los contadores de demanda la diferencia de los envíos de uno o más profesores.
+
+    Las claves de turno y materia de cada profesor salen de una consulta a puede_dictar; los
+    contadores se incrementan con un único INSERT ... ON CONFLICT DO UPDATE. Todas las rutas de
+    escritura la llaman después de escribir las preferencias y antes de ``_registrar_envio``.
+
+    :param deltas: Diccionario {nombre del profesor: Counter de _delta_demanda}.
+    """
+    deltas = {nombre: delta for nombre, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return
+    claves = {nombre: {("total", "")} for nombre in deltas}
+    for nombre, turno, materia in (
+        db.session.query(PuedeDictar.profesor, PuedeDictar.turno, PuedeDictar.materia)
+        .filter(PuedeDictar.profesor.in_(list(deltas)))
+    ):
+        claves[nombre].update({("turno", turno), ("materia", materia)})
+
+    total = Counter()
+    for nombre, delta in deltas.items():
+        for dimension, clave in claves[nombre]:
+            for (bloque_id, valor), cantidad in delta.items():
+                total[(dimension, clave, bloque_id, valor)] += cantidad
+    # Las filas se escriben en el orden de la clave primaria: dos envíos que tocan los mismos
+    # bloques toman sus bloqueos en el mismo orden y no pueden trabarse entre sí
+    filas = [
+        {"dimension": dimension, "clave": clave, "bloque_horario": bloque_id, "valor": valor, "cantidad": cantidad}
+        for (dimension, clave, bloque_id, valor), cantidad in sorted(total.items())
+        if cantidad
+    ]
+    if not filas:
+        return
+
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+    elif dialecto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+    else:
+        for fila in filas:
+            existente = db.session.get(
+                DemandaBloque, (fila["dimension"], fila["clave"], fila["bloque_horario"], fila["valor"])
+            )
+            if existente is None:
+                db.session.add(DemandaBloque(**fila))
+            else:
+                existente.cantidad += fila["cantidad"]
+        return
+    tabla = DemandaBloque.__table__
+    for inicio in range(0, len(filas), TAMANO_LOTE):
+        sentencia = insert_dialecto(tabla).values(filas[inicio:inicio + TAMANO_LOTE])
+        db.session.execute(sentencia.on_conflict_do_update(
+            index_elements=[columna.name for columna in tabla.primary_key.columns],
+            set_={"cantidad": tabla.c.cantidad + sentencia.excluded.cantidad},
+        ))
+
+
+def reconstruir_demanda_bloques():
+    """
+    Recalcula desde cero los contadores de demanda por bloque.
+
+    En el modo 'filas' se agrupa prioridades en la base; en el modo 'grilla' se desempaquetan
+    las grillas de todos los profesores.
+
+    :return: La cantidad de filas de demanda escritas.
+    """
+    total = Counter()
+    if modo_grilla():
+        claves = {}
+        for nombre, turno, materia in db.session.query(PuedeDictar.profesor, PuedeDictar.turno, PuedeDictar.materia):
+            claves.setdefault(nombre, set()).update({("turno", turno), ("materia", materia)})
+        for nombre, datos in db.session.query(Profesor.nombre, Profesor.grilla_preferencias).filter(
+            Profesor.grilla_preferencias.isnot(None)
+        ):
+            for bloque_id, valor in desempaquetar_grilla(datos).items():
+                for dimension, clave in {("total", ""), *claves.get(nombre, ())}:
+                    total[(dimension, clave, bloque_id, valor)] += 1
+    else:
+        valido = Prioridad.valor.in_((1, 2, 3))
+        for bloque_id, valor, cantidad in (
+            db.session.query(Prioridad.bloque_horario, Prioridad.valor, func.count())
+            .filter(valido)
+            .group_by(Prioridad.bloque_horario, Prioridad.valor)
+        ):
+            total[("total", "", bloque_id, valor)] = cantidad
+        for dimension, columna in (("turno", PuedeDictar.turno), ("materia", PuedeDictar.materia)):
+            consulta = (
+                db.session.query(columna, Prioridad.bloque_horario, Prioridad.valor,
+                                 func.count(distinct(Prioridad.profesor)))
+                .join(PuedeDictar, PuedeDictar.profesor == Prioridad.profesor)
+                .filter(valido)
+                .group_by(columna, Prioridad.bloque_horario, Prioridad.valor)
+            )
+            for clave, bloque_id, valor, cantidad in consulta:
+                total[(dimension, clave, bloque_id, valor)] = cantidad
+
+    filas = [
+        {"dimension": dimension, "clave": clave, "bloque_horario": bloque_id, "valor": valor, "cantidad": cantidad}
+        for (dimension, clave, bloque_id, valor), cantidad in total.items()
+    ]
+    db.session.execute(delete(DemandaBloque))
+    if filas:
+        db.session.execute(insert(DemandaBloque), filas)
+    db.session.commit()
+    return len(filas)
+
+
+def obtener_demanda_bloques(turno=None, materia=None):
+    """
+    Arma el mapa de calor de demanda por bloque con dos consultas por clave primaria.
+
+    :param turno: Restringe a los profesores que pueden dictar en ese turno.
+    :param materia: Restringe a los profesores que pueden dictar esa materia (se ignora si hay turno).
+    :return: Un diccionario con la dimensión, la cantidad de profesores que enviaron y, por cada
+        bloque, las cantidades de 1, 2 y 3 y de no disponibles.
+    """
+    if turno is not None:
+        dimension, clave = "turno", turno
+    elif materia is not None:
+        dimension, clave = "materia", materia
+    else:
+        dimension, clave = "total", ""
+
+    enviados = (
+        db.session.query(ProgresoEnvios.enviados)
+        .filter(ProgresoEnvios.dimension == dimension, ProgresoEnvios.clave == clave)
+        .scalar()
+    ) or 0
+    cantidades = {}
+    for bloque_id, valor, cantidad in (
+        db.session.query(DemandaBloque.bloque_horario, DemandaBloque.valor, DemandaBloque.cantidad)
+        .filter(DemandaBloque.dimension == dimension, DemandaBloque.clave == clave)
+    ):
+        cantidades.setdefault(bloque_id, {})[valor] = cantidad
+
+    referencia = obtener_datos_referencia()
+    bloques_turno = referencia.bloques_por_turno.get(turno, frozenset()) if turno is not None else None
+    bloques = []
+    for bloque in referencia.bloques:
+        conteo = cantidades.get(bloque.id, {})
+        marcados = [conteo.get(valor, 0) for valor in (1, 2, 3)]
+        bloques.append({
+            **bloque._asdict(),
+            "en_turno": bloques_turno is None or bloque.id in bloques_turno,
+            "preferencia_1": marcados[0],
+            "preferencia_2": marcados[1],
+            "preferencia_3": marcados[2],
+            "no_disponible": max(enviados - sum(marcados), 0),
+        })
+    return {"dimension": dimension, "clave": clave, "enviados": enviados, "bloques": bloques}
+
+
+# Valores admitidos por la restricción de Prioridad.valor.
+VALORES_PREFERENCIA = (0, 1, 2, 3)
+
+
+def _validar_preferencias(preferencias):
+    """Valida bloques y valores contra la caché de datos de referencia, sin consultar la base."""
+    bloques_validos = {bloque.id for bloque in obtener_datos_referencia().bloques}
+    for bloque_horario_id, valor in preferencias.items():
+        if bloque_horario_id not in bloques_validos:
+            raise ValueError(f"No se encontró un bloque horario con ID {bloque_horario_id}")
+        if valor not in VALORES_PREFERENCIA:
+            raise ValueError(f"Valor de preferencia inválido para el bloque {bloque_horario_id}: {valor}")
+
+
+def encolar_respuesta(preferences, ci, min_dias=False):
+    """
+    Valida un envío y lo guarda en envios_pendientes para que el procesador lo aplique después.
+
+    Reemplaza el envío pendiente anterior del profesor, si lo hay, y en la misma transacción
+    actualiza su última modificación y min_max_dias, por lo que el ETag de su página cambia de
+    inmediato. Los bloques se validan contra la caché de datos de referencia.
+
+    :param preferences: Diccionario {bloque_horario_id: valor}.
+    :param ci: Cédula del profesor.
+    :param min_dias: Si el profesor prefiere minimizar los días en la facultad.
+    :return: Un diccionario que indica que el envío quedó encolado.
+    """
+    PREFERENCIAS_POR_ENVIO.observe(len(preferences))
+    preferencias = _normalizar_preferencias(preferences, grilla=False)
+    _validar_preferencias(preferencias)
+
+    fila = (
+        db.session.query(Profesor.nombre)
+        .filter(Profesor.cedula == str(ci))
+        .first()
+    )
+    if fila is None:
+        raise ValueError(f"No se encontró un profesor con la cédula {ci}")
+
+    primer_envio = _marcar_primer_envio(fila.nombre)
+    upsert_filas(
+        EnvioPendiente,
+        [{
+            "profesor": fila.nombre,
+            "envio": uuid.uuid4().hex,
+            "preferencias": json.dumps(preferencias),
+            "min_max_dias": bool(min_dias),
+            "recibido": db.func.now(),
+        }],
+        actualizar=["envio", "preferencias", "min_max_dias", "recibido"],
+    )
+    db.session.execute(
+        update(Profesor)
+        .where(Profesor.nombre == fila.nombre)
+        .values(
+            ultima_modificacion=db.func.now(),
+            min_max_dias=bool(min_dias),
+            version_preferencias=Profesor.version_preferencias + 1,
+        )
+    )
+    _registrar_envio(fila.nombre, primer_envio)
+    db.session.commit()
+    ENVIOS_DIFERIDOS.labels(etapa='encolado').inc()
+    return {"encolado": True}
+
+
+class ConflictoVersion(Exception):
+    """Las preferencias del profesor cambiaron desde que el cliente cargó la versión que envía."""
+
+    def __init__(self, version_actual):
+        super().__init__("Las preferencias fueron modificadas desde otra sesión. Recargue la página.")
+        self.version_actual = version_actual
+
+
+def aplicar_cambios_preferencias(cambios, ci, version, min_dias=None):
+    """
+    Aplica solo las celdas de la grilla que el profesor modificó, si nadie más escribió antes.
+
+    La escritura está condicionada a que ``profesores.version_preferencias`` siga valiendo
+    ``version`` (un UPDATE ... WHERE version_preferencias = :version), de modo que dos sesiones
+    no pueden pisarse. En el modo 'filas' se borran los bloques marcados con 0 y se escriben los
+    demás; en el modo 'grilla' se reescribe la grilla. En el modo de escritura diferida, si el
+    profesor tiene un envío pendiente, los cambios se combinan con él.
+
+    :param cambios: Diccionario {bloque_horario_id: valor}; 0 quita la preferencia del bloque.
+    :param ci: Cédula del profesor.
+    :param version: Versión de las preferencias sobre la que se hicieron los cambios.
+    :param min_dias: Nuevo valor de min_max_dias, o None para no modificarlo.
+    :raises ConflictoVersion: Si la versión almacenada no es ``version``.
+    :return: Un diccionario con la nueva versión, la cantidad de bloques escritos y eliminados y
+        si el envío no produjo cambios.
+    """
+    PREFERENCIAS_POR_ENVIO.observe(len(cambios))
+    cambios = _normalizar_preferencias(cambios, grilla=False)
+    _validar_preferencias(cambios)
+
+    fila = (
+        db.session.query(
+            Profesor.nombre,
+            Profesor.version_preferencias,
+            Profesor.ultima_modificacion,
+            Profesor.min_max_dias,
+            Profesor.grilla_preferencias,
+        )
+        .filter(Profesor.cedula == str(ci))
+        .first()
+    )
+    if fila is None:
+        raise ValueError(f"No se encontró un profesor con la cédula {ci}")
+    if fila.version_preferencias != version:
+        db.session.rollback()
+        raise ConflictoVersion(fila.version_preferencias)
+
+    min_dias = bool(fila.min_max_dias) if min_dias is None else bool(min_dias)
+    escribir = {b: v for b, v in cambios.items() if v}
+    eliminar = [b for b, v in cambios.items() if not v]
+    reporte = {"version": version, "escritas": len(escribir), "eliminadas": len(eliminar), "sin_cambios": False}
+    if not cambios and fila.ultima_modificacion is not None and bool(fila.min_max_dias) == min_dias:
+        db.session.rollback()
+        reporte["sin_cambios"] = True
+        return reporte
+
+    grilla = modo_grilla()
+    pendientes = _preferencias_pendientes(fila.nombre, grilla)
+    valores = {
+        "ultima_modificacion": db.func.now(),
+        "min_max_dias": min_dias,
+        "version_preferencias": Profesor.version_preferencias + 1,
+    }
+    anteriores = {}
+    if grilla and pendientes is None:
+        preferencias = desempaquetar_grilla(fila.grilla_preferencias)
+        anteriores = {b: preferencias[b] for b in cambios if b in preferencias}
+        preferencias.update(escribir)
+        for bloque_id in eliminar:
+            preferencias.pop(bloque_id, None)
+        valores["grilla_preferencias"] = empaquetar_grilla(preferencias)
+    elif pendientes is None and cambios:
+        anteriores = dict(
+            db.session.query(Prioridad.bloque_horario, Prioridad.valor)
+            .filter(Prioridad.profesor == fila.nombre, Prioridad.bloque_horario.in_(list(cambios)))
+        )
+    primer_envio = _marcar_primer_envio(fila.nombre)
+    resultado = db.session.execute(
+        update(Profesor)
+        .where(Profesor.nombre == fila.nombre, Profesor.version_preferencias == version)
+        .values(**valores)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount != 1:
+        db.session.rollback()
+        raise ConflictoVersion(
+            db.session.query(Profesor.version_preferencias).filter(Profesor.nombre == fila.nombre).scalar()
+        )
+
+    if pendientes is not None:
+        # Un envío nuevo (otro identificador) para que el procesador no lo borre si ya tomó el anterior
+        combinadas = {b: v for b, v in {**pendientes, **cambios}.items() if v}
+        upsert_filas(
+            EnvioPendiente,
+            [{
+                "profesor": fila.nombre,
+                "envio": uuid.uuid4().hex,
+                "preferencias": json.dumps(combinadas),
+                "min_max_dias": min_dias,
+                "recibido": db.func.now(),
+            }],
+            actualizar=["envio", "preferencias", "min_max_dias", "recibido"],
+        )
+    elif not grilla:
+        if eliminar:
+            db.session.execute(
+                delete(Prioridad)
+                .where(Prioridad.profesor == fila.nombre, Prioridad.bloque_horario.in_(eliminar))
             )
-            db.session.add(nueva_prioridad)
+        upsert_filas(
+            Prioridad,
+            [
+                {"profesor": fila.nombre, "bloque_horario": bloque_id, "valor": valor}
+                for bloque_id, valor in escribir.items()
+            ],
+            actualizar=["valor"],
+        )
+    if pendientes is None:
+        # Con un envío pendiente la demanda se actualiza cuando el procesador lo aplica
+        _actualizar_demanda({fila.nombre: _delta_demanda(anteriores, cambios)})
+    _registrar_envio(fila.nombre, primer_envio)
+    db.session.commit()
+    reporte["version"] = version + 1
+    return reporte
 
+
+class EnvioPendienteInvalido(Exception):
+    """Un envío de la cola de escritura diferida no pudo aplicarse."""
+
+    def __init__(self, profesor, envio):
+        super().__init__(f"No se pudo aplicar el envío {envio} de {profesor}")
+        self.profesor = profesor
+        self.envio = envio
+
+
+def aplicar_envios_pendientes(tamano_lote=100):
+    """
+    Aplica un lote de envíos pendientes en una sola transacción y los quita de la cola.
+
+    Las filas se toman con FOR UPDATE SKIP LOCKED, de modo que varios procesadores pueden
+    trabajar a la vez sin aplicar dos veces el mismo envío. Solo se borran los envíos leídos:
+    si el profesor volvió a enviar mientras tanto, el envío nuevo queda en la cola.
+
+    :param tamano_lote: Cantidad máxima de envíos a aplicar.
+    :raises EnvioPendienteInvalido: Si los datos de un envío son inválidos (JSON, valores o restricciones
+        de la base) y puede identificarse cuál; con un lote de uno, siempre. Los errores transitorios
+        de la base se propagan sin descartar nada.
+    :return: La cantidad de envíos aplicados.
+    """
+    pendientes = (
+        db.session.query(EnvioPendiente.profesor, EnvioPendiente.envio, EnvioPendiente.preferencias)
+        .order_by(EnvioPendiente.recibido)
+        .limit(tamano_lote)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not pendientes:
+        db.session.rollback()
+        return 0
+
+    grilla = modo_grilla()
+    nombres = [pendiente.profesor for pendiente in pendientes]
+    # Como en guardar_respuesta, las filas de los profesores se bloquean antes de leer sus
+    # preferencias, y en orden de nombre para que dos lotes no se esperen mutuamente
+    if grilla:
+        actuales = {
+            nombre: desempaquetar_grilla(datos)
+            for nombre, datos in db.session.query(Profesor.nombre, Profesor.grilla_preferencias)
+            .filter(Profesor.nombre.in_(nombres))
+            .order_by(Profesor.nombre)
+            .with_for_update()
+        }
+    else:
+        db.session.query(Profesor.nombre).filter(Profesor.nombre.in_(nombres)).order_by(Profesor.nombre).with_for_update().all()
+        actuales = {nombre: {} for nombre in nombres}
+        for nombre, bloque_id, valor in (
+            db.session.query(Prioridad.profesor, Prioridad.bloque_horario, Prioridad.valor)
+            .filter(Prioridad.profesor.in_(nombres))
+        ):
+            actuales[nombre][bloque_id] = valor
+
+    grillas, eliminar, escribir, deltas = [], [], [], {}
+    for pendiente in pendientes:
+        try:
+            preferencias = _normalizar_preferencias(json.loads(pendiente.preferencias), grilla)
+        except (ValueError, TypeError) as error:
+            db.session.rollback()
+            raise EnvioPendienteInvalido(pendiente.profesor, pendiente.envio) from error
+        deltas[pendiente.profesor] = _delta_demanda(actuales.get(pendiente.profesor) or {}, preferencias)
+        if grilla:
+            if preferencias != actuales.get(pendiente.profesor):
+                grillas.append({"b_nombre": pendiente.profesor, "b_grilla": empaquetar_grilla(preferencias)})
+            continue
+        nuevas, modificadas, eliminadas = _diferencias(actuales[pendiente.profesor], preferencias)
+        eliminar.extend((pendiente.profesor, bloque_id) for bloque_id in eliminadas)
+        escribir.extend(
+            {"profesor": pendiente.profesor, "bloque_horario": bloque_id, "valor": valor}
+            for bloque_id, valor in {**nuevas, **modificadas}.items()
+        )
+
+    try:
+        if grillas:
+            db.session.execute(_sentencia_grilla(), grillas)
+        for inicio in range(0, len(eliminar), TAMANO_LOTE):
+            db.session.execute(
+                delete(Prioridad)
+                .where(tuple_(Prioridad.profesor, Prioridad.bloque_horario).in_(eliminar[inicio:inicio + TAMANO_LOTE]))
+            )
+        upsert_filas(Prioridad, escribir, actualizar=["valor"])
+        _actualizar_demanda(deltas)
+        db.session.execute(
+            delete(EnvioPendiente)
+            .where(tuple_(EnvioPendiente.profesor, EnvioPendiente.envio).in_([(p.profesor, p.envio) for p in pendientes]))
+        )
+        db.session.commit()
+    except (IntegrityError, DataError) as error:
+        db.session.rollback()
+        # Con un solo envío en el lote se sabe cuál falló; con varios hay que reintentar de a uno
+        if len(pendientes) == 1:
+            raise EnvioPendienteInvalido(pendientes[0].profesor, pendientes[0].envio) from error
+        raise
+    except Exception:
+        # Errores de la base (conexión, deadlock, serialización): el envío queda en la cola
+        db.session.rollback()
+        raise
+    ENVIOS_DIFERIDOS.labels(etapa='aplicado').inc(len(pendientes))
+    return len(pendientes)
+
+
+def descartar_envio_pendiente(profesor, envio):
+    """
+    Quita de la cola un envío pendiente que no pudo aplicarse.
+
+    Solo se borra la fila con ese profesor y ese identificador de envío: si el profesor volvió a
+    enviar mientras tanto, o si otro procesador la tiene tomada, no se borra nada.
+
+    :return: La fila descartada como diccionario, o None si ya no estaba en la cola.
+    """
+    pendiente = (
+        EnvioPendiente.query
+        .filter_by(profesor=profesor, envio=envio)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if pendiente is None:
+        db.session.rollback()
+        return None
+    descartado = {
+        "profesor": pendiente.profesor,
+        "envio": pendiente.envio,
+        "preferencias": pendiente.preferencias,
+        "min_max_dias": pendiente.min_max_dias,
+    }
+    db.session.delete(pendiente)
     db.session.commit()
+    ENVIOS_DIFERIDOS.labels(etapa='descartado').inc()
+    return descartado
+
+
+def _preferencias_pendientes(nombre, grilla):
+    """Devuelve el envío pendiente del profesor, o None si no tiene uno o no se usa la escritura diferida."""
+    if not escritura_diferida():
+        return None
+    datos = (
+        db.session.query(EnvioPendiente.preferencias)
+        .filter(EnvioPendiente.profesor == nombre)
+        .scalar()
+    )
+    if datos is None:
+        return None
+    return _normalizar_preferencias(json.loads(datos), grilla)
+
+
+def migrar_preferencias_a_grilla(tamano_lote=TAMANO_LOTE):
+    """
+    Empaqueta las filas de prioridades de todos los profesores en Profesor.grilla_preferencias.
+
+    Las filas se recorren ordenadas por profesor con un cursor del lado del servidor y las
+    grillas se escriben en lotes. La tabla prioridades no se modifica, por lo que se puede
+    volver al modo 'filas' sin pérdida.
+
+    :param tamano_lote: Cantidad de profesores por sentencia UPDATE.
+    :return: La cantidad de profesores migrados.
+    """
+    sentencia = _sentencia_grilla()
+    consulta = (
+        db.session.query(Prioridad.profesor, Prioridad.bloque_horario, Prioridad.valor)
+        .order_by(Prioridad.profesor)
+        .yield_per(tamano_lote)
+    )
+
+    migrados = 0
+    lote = []
+    for nombre, filas in groupby(consulta, key=itemgetter(0)):
+        grilla = empaquetar_grilla({bloque_id: valor for _, bloque_id, valor in filas})
+        lote.append({"b_nombre": nombre, "b_grilla": grilla})
+        if len(lote) >= tamano_lote:
+            db.session.execute(sentencia, lote)
+            migrados += len(lote)
+            lote = []
+    if lote:
+        db.session.execute(sentencia, lote)
+        migrados += len(lote)
+
+    db.session.commit()
+    return migrados
+
 
 def obtener_bloques_horarios(turno=None):
     """
@@ -55,27 +900,12 @@ def obtener_bloques_horarios(turno=None):
     :param turno: Nombre del turno (opcional).
     :return: Una lista de diccionarios con bloques horarios y días de la semana.
     """
+    referencia = obtener_datos_referencia()
     if turno is None:
-        # Obtener todos los bloques horarios
-        bloques_horarios = BloqueHorario.query.all()
-    else:
-        # Unir TurnoHorario con BloqueHorario usando el id de bloque
-        bloques_horarios = (
-            db.session.query(BloqueHorario)
-            .join(TurnoHorario, BloqueHorario.hora_inicio == TurnoHorario.hora_inicio and BloqueHorario.hora_fin == TurnoHorario.hora_fin)
-            .filter(TurnoHorario.turno == turno)
-            .all()
-        )
+        return [bloque._asdict() for bloque in referencia.bloques]
 
-    return [
-        {
-            "id": bloque.id,
-            "dia": bloque.dia,
-            "hora_inicio": bloque.hora_inicio.strftime("%H:%M"),
-            "hora_fin": bloque.hora_fin.strftime("%H:%M")
-        }
-        for bloque in bloques_horarios
-    ]
+    bloques_turno = referencia.bloques_por_turno.get(turno, frozenset())
+    return [bloque._asdict() for bloque in referencia.bloques if bloque.id in bloques_turno]
 
 
 def verificar_profesor(ci: int) -> bool:
@@ -94,13 +924,13 @@ def listar_materias():
 
     :return: Una lista de materias.
     """
-    materias: List[Any] = Materia.query.all()
+    materias = obtener_datos_referencia().materias
     return [
         {
-            "nombre": materia.nombre,
-            "nombre_completo": materia.nombre_completo,
+            "nombre": nombre,
+            "nombre_completo": nombre_completo,
         }
-        for materia in materias
+        for nombre, nombre_completo in materias.items()
     ]
 
 def listar_turnos():
@@ -109,8 +939,7 @@ def listar_turnos():
 
     :return: Una lista de turnos.
     """
-    turnos = Turno.query.all()
-    return [turno.nombre for turno in turnos]
+    return list(obtener_datos_referencia().turnos)
 
 
 def get_professor_data(ci: int):
@@ -137,6 +966,11 @@ def get_previous_preferences(ci):
     profesor = Profesor.query.filter_by(cedula=str(ci)).first()
     if not profesor:
         return {}
+    pendientes = _preferencias_pendientes(profesor.nombre, modo_grilla())
+    if pendientes is not None:
+        return pendientes
+    if modo_grilla():
+        return desempaquetar_grilla(profesor.grilla_preferencias)
     preferencias = Prioridad.query.filter_by(profesor=profesor.nombre).all()
     return {p.bloque_horario: p.valor for p in preferencias}
 
@@ -148,29 +982,246 @@ def listar_turnos_materias_profesor(ci):
     :param ci: Cédula del profesor.
     :return: Un diccionario con dos listas: 'materias' y 'turnos'.
     """
-    profesor: Profesor = Profesor.query.filter_by(cedula=str(ci)).first()
-    if not profesor:
+    # Una sola consulta trae al profesor con todas sus filas de PuedeDictar y las materias;
+    # el LEFT JOIN garantiza al menos una fila si el profesor existe.
+    filas = (
+        db.session.query(Profesor.nombre, Materia.nombre, Materia.nombre_completo, PuedeDictar.turno)
+        .outerjoin(PuedeDictar, PuedeDictar.profesor == Profesor.nombre)
+        .outerjoin(Materia, Materia.nombre == PuedeDictar.materia)
+        .filter(Profesor.cedula == str(ci))
+        .order_by(PuedeDictar.materia, PuedeDictar.turno)
+        .all()
+    )
+    if not filas:
         raise ValueError(f"No se encontró un profesor con la cédula {ci}")
 
-    # Buscar todas las filas de PuedeDictar para este profesor
-    puede_dictar = PuedeDictar.query.filter_by(profesor=profesor.nombre).all()
     lista_materias = []
-    lista_turnos = set()
+    lista_turnos = {}
     codigos_materias = set()
 
-    for pd in puede_dictar:
-        materia = Materia.query.filter_by(nombre=pd.materia).first()
-        turno = Turno.query.filter_by(nombre=pd.turno).first()
-        if materia and materia.nombre not in codigos_materias:
+    for _, codigo_materia, nombre_completo, turno in filas:
+        if codigo_materia and codigo_materia not in codigos_materias:
             lista_materias.append({
-                "nombre": materia.nombre,
-                "nombre_completo": materia.nombre_completo,
+                "nombre": codigo_materia,
+                "nombre_completo": nombre_completo,
             })
-            codigos_materias.add(materia.nombre)
+            codigos_materias.add(codigo_materia)
         if turno:
-            lista_turnos.add(turno.nombre)
+            lista_turnos[turno] = None
 
     return {
         "materias": lista_materias,
         "turnos": list(lista_turnos)
     }
+
+
+def cargar_pagina_preferencias(ci):
+    """
+    Carga todos los datos que necesita la vista de preferencias en dos consultas.
+
+    La primera trae al profesor junto con sus filas de PuedeDictar y la segunda sus
+    preferencias previas (innecesaria en el modo 'grilla'); bloques, turnos y materias salen de la caché de datos de referencia.
+    En el modo de escritura diferida se muestra el envío pendiente del profesor, si lo tiene.
+
+    :param ci: Cédula del profesor.
+    :return: Un diccionario con los datos de la página, o None si el profesor no existe.
+    """
+    profesor: Profesor = (
+        Profesor.query
+        .options(
+            joinedload(Profesor.puede_dictar).options(
+                lazyload(PuedeDictar.materia_puede_dic),
+                lazyload(PuedeDictar.turno_puede_dic),
+            )
+        )
+        .filter_by(cedula=str(ci))
+        .first()
+    )
+    if not profesor:
+        return None
+
+    referencia = obtener_datos_referencia()
+
+    lista_materias = []
+    codigos_materias = set()
+    turnos = {}
+    for pd in profesor.puede_dictar:
+        if pd.materia in referencia.materias and pd.materia not in codigos_materias:
+            lista_materias.append({
+                "nombre": pd.materia,
+                "nombre_completo": referencia.materias[pd.materia],
+            })
+            codigos_materias.add(pd.materia)
+        turnos[pd.turno] = None
+
+    previas = _preferencias_pendientes(profesor.nombre, modo_grilla())
+    if previas is None and modo_grilla():
+        previas = desempaquetar_grilla(profesor.grilla_preferencias)
+    elif previas is None:
+        previas = dict(
+            db.session.query(Prioridad.bloque_horario, Prioridad.valor)
+            .filter(Prioridad.profesor == profesor.nombre)
+            .all()
+        )
+
+    bloques_turno = frozenset().union(
+        *(referencia.bloques_por_turno.get(turno, frozenset()) for turno in turnos)
+    )
+    bloques = []
+    for bloque in referencia.bloques:
+        datos = bloque._asdict()
+        datos["preference"] = previas.get(bloque.id) or 0
+        bloques.append(datos)
+
+    return {
+        "profesor": {
+            "nombre": profesor.nombre,
+            "nombre_completo": profesor.nombre_completo,
+            "min_max_dias": profesor.min_max_dias,
+            "version_preferencias": profesor.version_preferencias,
+        },
+        "materias": lista_materias,
+        "turnos": list(turnos),
+        "bloques_turno": bloques_turno,
+        "bloques_horarios": bloques,
+    }
+
+
+def obtener_etag_preferencias(ci):
+    """
+    Calcula el ETag de la página de preferencias de un profesor con una única consulta indexada.
+
+    Combina la cédula, la versión y la última modificación de sus preferencias y el sello de los
+    datos de referencia, de modo que cambia ante un nuevo envío o ante cambios administrativos.
+    La versión es necesaria porque ``ultima_modificacion`` tiene resolución de un segundo en
+    SQLite y MySQL: dos envíos en el mismo segundo darían el mismo ETag.
+
+    :param ci: Cédula del profesor.
+    :return: El ETag, o None si el profesor no existe o los datos de referencia no tienen sello.
+    """
+    fila = (
+        db.session.query(Profesor.ultima_modificacion, Profesor.version_preferencias)
+        .filter(Profesor.cedula == str(ci))
+        .first()
+    )
+    if fila is None:
+        return None
+    version = obtener_datos_referencia().version
+    if version is None:
+        return None
+    ultima_modificacion = fila.ultima_modificacion.isoformat() if fila.ultima_modificacion else ""
+    base = f"{ci}|{fila.version_preferencias}|{ultima_modificacion}|{version}"
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()[:32]
+
+
+# Datos de referencia: bloques, turnos y materias cambian a lo sumo una vez por semestre, por lo
+# que cada proceso guarda una copia inmutable identificada por el sello de VersionReferencia.
+Bloque = namedtuple('Bloque', ['id', 'dia', 'hora_inicio', 'hora_fin'])
+DatosReferencia = namedtuple('DatosReferencia', ['version', 'bloques', 'materias', 'turnos', 'bloques_por_turno'])
+
+ID_VERSION_REFERENCIA = 1
+
+_cache_referencia = {"datos": None, "verificado": 0.0}
+_cache_referencia_lock = threading.Lock()
+
+
+def _formatear_hora(hora) -> str:
+    return hora.strftime("%H:%M")
+
+
+def _leer_version_referencia():
+    """Lee el sello vigente de los datos de referencia, o None si todavía no existe."""
+    return (
+        db.session.query(VersionReferencia.version)
+        .filter(VersionReferencia.id == ID_VERSION_REFERENCIA)
+        .scalar()
+    )
+
+
+def _cargar_datos_referencia(version) -> DatosReferencia:
+    """Lee de la base de datos una copia completa de los datos de referencia."""
+    bloques = tuple(
+        Bloque(bloque.id, bloque.dia, _formatear_hora(bloque.hora_inicio), _formatear_hora(bloque.hora_fin))
+        for bloque in BloqueHorario.query.order_by(BloqueHorario.id)
+    )
+    materias = MappingProxyType({
+        nombre: nombre_completo
+        for nombre, nombre_completo in db.session.query(Materia.nombre, Materia.nombre_completo).order_by(Materia.nombre)
+    })
+    turnos = tuple(nombre for (nombre,) in db.session.query(Turno.nombre).order_by(Turno.nombre))
+    # Índice turno -> ids de bloque; un bloque pertenece a un turno si coinciden inicio y fin
+    bloques_por_turno = {}
+    for turno, bloque_id in (
+        db.session.query(TurnoHorario.turno, BloqueHorario.id)
+        .join(
+            BloqueHorario,
+            and_(
+                BloqueHorario.hora_inicio == TurnoHorario.hora_inicio,
+                BloqueHorario.hora_fin == TurnoHorario.hora_fin,
+            ),
+        )
+    ):
+        bloques_por_turno.setdefault(turno, set()).add(bloque_id)
+    bloques_por_turno = MappingProxyType({
+        turno: frozenset(ids) for turno, ids in bloques_por_turno.items()
+    })
+    return DatosReferencia(version, bloques, materias, turnos, bloques_por_turno)
+
+
+def obtener_datos_referencia() -> DatosReferencia:
+    """
+    Devuelve la copia vigente de los datos de referencia de este proceso.
+
+    El sello de versión se vuelve a consultar como máximo una vez cada ``SAID_REFERENCIA_TTL``
+    segundos y la copia se recarga solo si el sello cambió. Sin fila de versión no hay forma de
+    detectar cambios, por lo que los datos se leen de la base en cada llamada.
+
+    :return: Una tupla inmutable DatosReferencia.
+    """
+    ttl = current_app.config.get('SAID_REFERENCIA_TTL', 30)
+    datos = _cache_referencia["datos"]
+    ahora = time.monotonic()
+    if datos is not None and ahora - _cache_referencia["verificado"] < ttl:
+        CACHE_REFERENCIA.labels('acierto').inc()
+        return datos
+
+    version = _leer_version_referencia()
+    if version is None:
+        CACHE_REFERENCIA.labels('sin_version').inc()
+        return _cargar_datos_referencia(None)
+    if datos is not None and datos.version == version:
+        CACHE_REFERENCIA.labels('verificado').inc()
+        _cache_referencia["verificado"] = ahora
+        return datos
+
+    CACHE_REFERENCIA.labels('recarga').inc()
+
+    with _cache_referencia_lock:
+        datos = _cache_referencia["datos"]
+        if datos is None or datos.version != version:
+            datos = _cargar_datos_referencia(version)
+        _cache_referencia.update(datos=datos, verificado=ahora)
+    return datos
+
+
+def limpiar_cache_referencia():
+    """Descarta la copia local de los datos de referencia de este proceso."""
+    with _cache_referencia_lock:
+        _cache_referencia.update(datos=None, verificado=0.0)
+
+
+def invalidar_datos_referencia():
+    """
+    Registra un cambio en los datos de referencia.
+
+    Debe llamarse después de cualquier escritura administrativa sobre bloques, horarios, turnos,
+    materias o asignaciones. Este proceso descarta su copia de inmediato y el resto la recarga
+    en su próxima verificación del sello.
+    """
+    upsert_filas(
+        VersionReferencia,
+        [{"id": ID_VERSION_REFERENCIA, "version": uuid.uuid4().hex, "actualizado": db.func.now()}],
+        actualizar=["version", "actualizado"],
+    )
+    db.session.commit()
+    limpiar_cache_referencia()
@@ -0,0 +1,199 @@
+"""
+Armado de horarios a partir de las preferencias recolectadas.
+
+Cada fila de ``puede_dictar`` habilita al profesor a dictar hasta ``grupos_max`` grupos de esa
+materia en ese turno, y cada grupo necesita ``sesiones`` bloques semanales en días distintos,
+dentro de los bloques del turno (``turnos_horarios``) y entre los que el profesor marcó con 1, 2
+o 3. Un profesor no puede estar en dos grupos en el mismo bloque.
+
+Los datos se cargan en matrices de NumPy: ``costos`` (profesor × bloque, con la preferencia y 0
+para los no disponibles) y ``membresia`` (turno × bloque); la disponibilidad de un profesor para
+una materia y turno es el producto de ambas. Como las restricciones son todas de un mismo
+profesor, el problema se separa por profesor y los lotes se resuelven en paralelo en todos los
+núcleos. Cada profesor se resuelve con una heurística voraz: primero las filas con menos bloques
+posibles y, para cada sesión, el bloque de menor costo; si el profesor prefiere minimizar los
+días, abrir un día nuevo suma ``penalizacion_dia`` al costo. Los grupos que no entran quedan sin
+asignar y se informan.
+
+``flask --app said asignar-horarios`` reemplaza la tabla ``asignaciones`` con el resultado. Los
+envíos pendientes de la escritura diferida no se consideran, por lo que conviene correr antes
+``flask --app said procesar-envios``.
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from entities import db, Asignacion
+from export import iterar_profesores
+from services import TAMANO_LOTE, obtener_datos_referencia
+
+DIAS = ('lun', 'mar', 'mie', 'jue', 'vie')
+# Mayor que la diferencia entre la mejor y la peor preferencia: con min_max_dias se prefiere un
+# bloque peor en un día ya ocupado antes que abrir un día nuevo
+PENALIZACION_DIA = 4.0
+PROFESORES_POR_TAREA = 256
+
+Problema = namedtuple('Problema', [
+    'profesores',  # nombres, en el orden de las filas de costos
+    'bloques',     # ids de bloque, en el orden de las columnas
+    'dias',        # índice de día (0 a 4) de cada columna
+    'turnos',      # nombres, en el orden de las filas de membresia
+    'membresia',   # bool turno × bloque
+    'costos',      # int8 profesor × bloque; 0 es no disponible
+    'min_dias',    # bool por profesor
+    'grupos',      # (índice de profesor, materia, índice de turno, grupos_max) por fila de puede_dictar
+])
+Resultado = namedtuple('Resultado', ['asignaciones', 'grupos_asignados', 'grupos_sin_asignar', 'costo_total'])
+
+
+def cargar_problema(tamano_lote=TAMANO_LOTE) -> Problema:
+    """Carga bloques, turnos, preferencias y asignaciones posibles en matrices de NumPy."""
+    referencia = obtener_datos_referencia()
+    bloques = np.array([bloque.id for bloque in referencia.bloques], dtype=np.int64)
+    columna = {int(bloque_id): i for i, bloque_id in enumerate(bloques)}
+    dias = np.array([DIAS.index(bloque.dia) for bloque in referencia.bloques], dtype=np.int8)
+    turnos = tuple(referencia.turnos)
+    indice_turno = {turno: t for t, turno in enumerate(turnos)}
+    membresia = np.zeros((len(turnos), len(bloques)), dtype=bool)
+    for turno, t in indice_turno.items():
+        for bloque_id in referencia.bloques_por_turno.get(turno, ()):
+            membresia[t, columna[bloque_id]] = True
+
+    profesores, filas, min_dias, grupos = [], [], [], []
+    for lote in iterar_profesores(tamano_lote):
+        for registro in lote:
+            fila = np.zeros(len(bloques), dtype=np.int8)
+            for preferencia in registro["preferencias"]:
+                if preferencia["bloque_horario"] in columna:
+                    fila[columna[preferencia["bloque_horario"]]] = preferencia["valor"]
+            indice = len(profesores)
+            profesores.append(registro["profesor"])
+            filas.append(fila)
+            min_dias.append(bool(registro["min_max_dias"]))
+            grupos.extend(
+                (indice, pd["materia"], indice_turno[pd["turno"]], pd["grupos_max"] or 1)
+                for pd in registro["puede_dictar"]
+                if pd["turno"] in indice_turno
+            )
+    costos = np.vstack(filas) if filas else np.zeros((0, len(bloques)), dtype=np.int8)
+    return Problema(tuple(profesores), bloques, dias, turnos, membresia, costos,
+                    np.array(min_dias, dtype=bool), grupos)
+
+
+def resolver_profesor(costos, dias, mascaras, grupos_max, min_dias, sesiones=2, penalizacion_dia=PENALIZACION_DIA):
+    """
+    Ubica los grupos de un profesor.
+
+    :param costos: Preferencia por bloque (0 = no disponible).
+    :param dias: Índice de día de cada bloque.
+    :param mascaras: Matriz bool fila de puede_dictar × bloque con los bloques de su turno.
+    :param grupos_max: Grupos a ubicar de cada fila.
+    :param min_dias: Si abrir un día nuevo se penaliza.
+    :return: Una tupla (lista de (fila, grupo, índice de bloque), grupos sin asignar).
+    """
+    libre = costos > 0
+    base = costos.astype(np.float64)
+    dias_usados = np.zeros(len(DIAS), dtype=bool)
+    asignadas = []
+    sin_asignar = 0
+    # Primero las filas con menos bloques posibles, que son las más fáciles de dejar sin lugar
+    for fila in np.argsort((mascaras & libre).sum(axis=1), kind='stable'):
+        for grupo in range(1, int(grupos_max[fila]) + 1):
+            elegidos = []
+            dias_grupo = np.zeros(len(DIAS), dtype=bool)
+            for _ in range(sesiones):
+                candidatos = libre & mascaras[fila] & ~dias_grupo[dias]
+                if not candidatos.any():
+                    break
+                costo = base + penalizacion_dia * ~dias_usados[dias] if min_dias else base
+                bloque = int(np.argmin(np.where(candidatos, costo, np.inf)))
+                elegidos.append(bloque)
+                libre[bloque] = False
+                dias_grupo[dias[bloque]] = True
+            if len(elegidos) < sesiones:
+                # Si un grupo no entra, los siguientes de la misma fila tampoco
+                libre[elegidos] = True
+                sin_asignar += int(grupos_max[fila]) - grupo + 1
+                break
+            dias_usados[dias[elegidos]] = True
+            asignadas.extend((int(fila), grupo, bloque) for bloque in elegidos)
+    return asignadas, sin_asignar
+
+
+def _resolver_tarea(tarea):
+    """Resuelve un lote de profesores; corre en un proceso aparte."""
+    dias, sesiones, penalizacion_dia, profesores = tarea
+    return [
+        (indice, *resolver_profesor(costos, dias, mascaras, grupos_max, min_dias, sesiones, penalizacion_dia))
+        for indice, costos, mascaras, grupos_max, min_dias in profesores
+    ]
+
+
+def resolver(problema: Problema, sesiones=2, procesos=None, penalizacion_dia=PENALIZACION_DIA) -> Resultado:
+    """
+    Arma el horario de toda la facultad.
+
+    :param sesiones: Bloques semanales de cada grupo, en días distintos.
+    :param procesos: Procesos a usar (por defecto, uno por núcleo); con 1 se resuelve en este proceso.
+    :return: Las asignaciones, la cantidad de grupos asignados y sin asignar y el costo total.
+    """
+    if not 1 <= sesiones <= len(DIAS):
+        raise ValueError(f"sesiones debe estar entre 1 y {len(DIAS)}")
+
+    filas_por_profesor = {}
+    for numero, (indice, *_) in enumerate(problema.grupos):
+        filas_por_profesor.setdefault(indice, []).append(numero)
+    profesores = []
+    for indice, numeros in filas_por_profesor.items():
+        mascaras = problema.membresia[[problema.grupos[n][2] for n in numeros]]
+        grupos_max = np.array([problema.grupos[n][3] for n in numeros])
+        profesores.append((indice, problema.costos[indice], mascaras, grupos_max, bool(problema.min_dias[indice])))
+    tareas = [
+        (problema.dias, sesiones, penalizacion_dia, profesores[inicio:inicio + PROFESORES_POR_TAREA])
+        for inicio in range(0, len(profesores), PROFESORES_POR_TAREA)
+    ]
+
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1 or len(tareas) <= 1:
+        soluciones = map(_resolver_tarea, tareas)
+    else:
+        with ProcessPoolExecutor(max_workers=min(procesos, len(tareas))) as ejecutor:
+            soluciones = list(ejecutor.map(_resolver_tarea, tareas))
+
+    asignaciones = []
+    sin_asignar = 0
+    for solucion in soluciones:
+        for indice, asignadas, faltantes in solucion:
+            sin_asignar += faltantes
+            numeros = filas_por_profesor[indice]
+            for fila, grupo, bloque in asignadas:
+                _, materia, turno, _ = problema.grupos[numeros[fila]]
+                asignaciones.append({
+                    "profesor": problema.profesores[indice],
+                    "materia": materia,
+                    "turno": problema.turnos[turno],
+                    "grupo": grupo,
+                    "bloque_horario": int(problema.bloques[bloque]),
+                    "valor": int(problema.costos[indice, bloque]),
+                })
+    asignados = len(asignaciones) // sesiones
+    return Resultado(asignaciones, asignados, sin_asignar, sum(a["valor"] for a in asignaciones))
+
+
+def guardar_asignaciones(resultado: Resultado) -> int:
+    """
+    Reemplaza la tabla asignaciones con el resultado del solver en una transacción.
+
+    :return: La cantidad de filas escritas.
+    """
+    generado = datetime.now()
+    db.session.execute(db.delete(Asignacion))
+    filas = [{**asignacion, "generado": generado} for asignacion in resultado.asignaciones]
+    for inicio in range(0, len(filas), TAMANO_LOTE):
+        db.session.execute(db.insert(Asignacion), filas[inicio:inicio + TAMANO_LOTE])
+    db.session.commit()
+    return len(filas)
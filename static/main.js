@@ -1,9 +1,14 @@
+// Cells changed since the page was loaded (or last saved): data-id -> value saved on the server
+const savedValues = new Map();
+
+function cellValue(cell) {
+  const value = parseInt(cell.innerText);
+  return isNaN(value) ? 0 : value;
+}
+
 // Cycle through preferences 0 to 3 on click
 function cyclePreference(cell) {
-  let current = parseInt(cell.innerText);
-  if (isNaN(current)) {
-    current = 0;
-  }
+  let current = cellValue(cell);
   let newValue = (current + 1) % 4;
   if (newValue === 0) {
     cell.innerText = "X";
@@ -18,47 +23,93 @@ function cyclePreference(cell) {
   if (newValue !== 0) {
     cell.classList.add("value-" + newValue);
   }
+
+  // Track the change; a cell cycled back to its saved value is no longer dirty
+  const id = cell.getAttribute("data-id");
+  if (!savedValues.has(id)) {
+    savedValues.set(id, current);
+  } else if (savedValues.get(id) === newValue) {
+    savedValues.delete(id);
+  }
 }
 
 // Handle form submission
 function handleFormSubmit(event) {
   event.preventDefault();
 
-  const preferences = {};
-  document.querySelectorAll(".time-slot").forEach((cell) => {
-    const id = cell.getAttribute("data-id");
-    const value = parseInt(cell.innerText);
-    if (isNaN(value)) return;
-    if (id && value !== 0) preferences[id] = value;
+  // Ignore double clicks while a submission is in flight
+  const submitButton = event.target.querySelector('button[type="submit"]');
+  if (submitButton && submitButton.disabled) return;
+  if (submitButton) submitButton.disabled = true;
+
+  // Only the dirty cells are sent; 0 clears a block
+  const changes = {};
+  const sent = new Map();
+  savedValues.forEach((_, id) => {
+    const cell = document.querySelector(`.time-slot[data-id="${id}"]`);
+    if (!cell) return;
+    changes[id] = cellValue(cell);
+    sent.set(id, changes[id]);
   });
+  const form = event.target;
 
   // Obtener el valor del checkbox
   const minDias = document.getElementById("minDiasCheckbox").checked;
 
-  fetch("/submit", {
-    method: "POST",
+  const confirmation = document.getElementById("confirmation");
+  const showMessage = (ok, message) => {
+    confirmation.classList.remove("d-none", "alert-danger", "alert-success");
+    confirmation.classList.add(ok ? "alert-success" : "alert-danger");
+    confirmation.innerHTML = `<p>${message}</p>`;
+  };
+
+  fetch("/api/preferences", {
+    method: "PATCH",
     headers: {
       "Content-Type": "application/json",
+      "If-Match": `"${form.dataset.version}"`,
     },
-    body: JSON.stringify({ preferences, min_dias: minDias }),
+    body: JSON.stringify({ cambios: changes, min_dias: minDias }),
   })
-    .then((response) => response.json())
+    .then((response) => {
+      if (response.status === 429) {
+        // Rate limited: keep the button disabled until the server accepts requests again
+        const retryAfter = parseInt(response.headers.get("Retry-After")) || 5;
+        showMessage(false, `Demasiados envíos seguidos. Podrá volver a enviar en ${retryAfter} segundos.`);
+        setTimeout(() => {
+          if (submitButton) submitButton.disabled = false;
+        }, retryAfter * 1000);
+        return null;
+      }
+      if (submitButton) submitButton.disabled = false;
+      if (response.status === 409) {
+        // Someone saved from another window: keep the edits and ask for a reload
+        showMessage(
+          false,
+          "Sus preferencias fueron modificadas desde otra sesión. Recargue la página para ver la versión actual."
+        );
+        return null;
+      }
+      return response.json();
+    })
     .then((data) => {
-      const confirmation = document.getElementById("confirmation");
-      confirmation.classList.remove("d-none", "alert-danger", "alert-success");
+      if (data === null) return;
       if (data.error) {
-        confirmation.classList.add("alert-danger");
-        confirmation.innerHTML = `<p>Error: ${data.error}</p>`;
+        showMessage(false, `Error: ${data.error}`);
       } else {
-        confirmation.classList.add("alert-success");
-        confirmation.innerHTML = `<p>Preferencias enviadas correctamente.</p>`;
+        form.dataset.version = data.cambios.version;
+        // Cells edited again while the request was in flight stay dirty
+        sent.forEach((value, id) => {
+          const cell = document.querySelector(`.time-slot[data-id="${id}"]`);
+          if (cell && cellValue(cell) === value) savedValues.delete(id);
+          else savedValues.set(id, value);
+        });
+        showMessage(true, "Preferencias enviadas correctamente.");
       }
     })
     .catch((error) => {
-      const confirmation = document.getElementById("confirmation");
-      confirmation.classList.remove("d-none", "alert-success");
-      confirmation.classList.add("alert-danger");
-      confirmation.innerHTML = `<p>Error: ${error.message}</p>`;
+      if (submitButton) submitButton.disabled = false;
+      showMessage(false, `Error: ${error.message}`);
     });
 }
 
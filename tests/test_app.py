@@ -11,9 +11,11 @@ os.environ.setdefault("POSTGRES_DB", "test")
 os.environ.setdefault("POSTGRES_USER", "test")
 os.environ.setdefault("POSTGRES_PASSWORD", "test")
 os.environ.setdefault("SECRET_KEY", "testing")
+os.environ.setdefault("SAID_LIMITES", "off")
 os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
 
 from said import app
+from services import invalidar_datos_referencia, limpiar_cache_referencia
 from entities import (
     db,
     Persona,
@@ -50,6 +52,7 @@ class TestAppEndpoints(unittest.TestCase):
 
     def setUp(self):
         db.create_all()
+        limpiar_cache_referencia()
         self.client = app.test_client()
         # Insert minimal data
         persona = Persona(cedula="1", nombre="juan")
@@ -93,6 +96,90 @@ class TestAppEndpoints(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertIn(b"Juan Perez", res.data)
 
+    def test_index_conditional_get(self):
+        """A matching If-None-Match is answered with 304 until preferences change."""
+        invalidar_datos_referencia()
+        with self.client.session_transaction() as sess:
+            sess["user_id"] = "1"
+        res = self.client.get("/preferences")
+        etag = res.headers.get("ETag")
+        self.assertIsNotNone(etag)
+        res = self.client.get("/preferences", headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b"")
+        self.client.post("/submit", json={"preferences": {"1": 2}})
+        res = self.client.get("/preferences", headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers.get("ETag"), etag)
+
+    def test_etag_changes_within_the_same_second(self):
+        """Two saves with the same ultima_modificacion still produce different ETags."""
+        invalidar_datos_referencia()
+        with self.client.session_transaction() as sess:
+            sess["user_id"] = "1"
+        self.client.post("/submit", json={"preferences": {"1": 2}})
+        etag = self.client.get("/preferences").headers.get("ETag")
+        instante = Profesor.query.filter_by(cedula="1").one().ultima_modificacion
+        self.client.post("/submit", json={"preferences": {"1": 3}})
+        # Simulate a database that stores timestamps with one-second resolution
+        Profesor.query.filter_by(cedula="1").update({"ultima_modificacion": instante})
+        db.session.commit()
+        res = self.client.get("/preferences", headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 200)
+
+    def test_patch_preferences(self):
+        """Only changed cells are sent and a stale version is answered with 409."""
+        with self.client.session_transaction() as sess:
+            sess["user_id"] = "1"
+        res = self.client.get("/preferences")
+        self.assertIn(b'data-version="0"', res.data)
+
+        res = self.client.patch("/api/preferences", json={"cambios": {"1": 2, "2": 3}}, headers={"If-Match": '"0"'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers["ETag"], '"1"')
+        self.assertEqual(res.get_json()["cambios"]["escritas"], 2)
+
+        res = self.client.patch("/api/preferences", json={"cambios": {"2": 0}}, headers={"If-Match": '"1"'})
+        self.assertEqual(res.get_json()["cambios"]["version"], 2)
+        prefs = {p.bloque_horario: p.valor for p in Prioridad.query.filter_by(profesor="juan")}
+        self.assertEqual(prefs, {1: 2})
+
+        res = self.client.patch("/api/preferences", json={"cambios": {"1": 1}}, headers={"If-Match": '"1"'})
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(res.get_json()["version"], 2)
+        self.assertEqual(res.headers["ETag"], '"2"')
+
+        res = self.client.patch("/api/preferences", json={"cambios": {"1": 1}})
+        self.assertEqual(res.status_code, 428)
+        res = self.client.patch("/api/preferences", json={"cambios": {"99": 1}}, headers={"If-Match": '"2"'})
+        self.assertEqual(res.status_code, 400)
+        res = self.client.patch("/api/preferences", json=[1], headers={"If-Match": '"2"'})
+        self.assertEqual(res.status_code, 400)
+
+    def test_patch_preferences_unauthenticated(self):
+        res = self.client.patch("/api/preferences", json={"cambios": {}}, headers={"If-Match": '"0"'})
+        self.assertEqual(res.status_code, 401)
+
+    def test_admin_demanda(self):
+        """The heatmap is rendered for admins from the precomputed counters."""
+        self.client.post("/submit", json={"preferences": {"1": 2}})
+        with self.client.session_transaction() as sess:
+            sess["user_id"] = "1"
+        self.client.post("/submit", json={"preferences": {"1": 2}})
+        self.assertEqual(self.client.get("/admin/demanda").status_code, 403)
+        app.config["SAID_ADMIN_TOKEN"] = "secreto"
+        try:
+            headers = {"X-Admin-Token": "secreto"}
+            res = self.client.get("/admin/demanda?turno=Mañana", headers=headers)
+            self.assertEqual(res.status_code, 200)
+            self.assertIn("Demanda por bloque horario", res.get_data(as_text=True))
+            datos = self.client.get("/admin/demanda?format=json&turno=&materia=MAT101", headers=headers).get_json()
+            self.assertEqual(datos["dimension"], "materia")
+            bloque = next(b for b in datos["bloques"] if b["id"] == 1)
+            self.assertEqual(bloque["preferencia_2"], 1)
+        finally:
+            app.config["SAID_ADMIN_TOKEN"] = None
+
     def test_entry_missing_hash(self):
         res = self.client.get("/")
         self.assertEqual(res.status_code, 401)
@@ -0,0 +1,130 @@
+"""Tests for the asset build in :mod:`build_assets` and its Flask integration in :mod:`assets`."""
+
+import base64
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+
+from flask import Flask, render_template_string, url_for
+
+from assets import CACHE_INMUTABLE, RECURSOS_EXTERNOS, registrar_recursos
+from build_assets import construir, main, verificar_integridad
+
+JS = """// Comment line
+function saludar(nombre) {
+  /* block
+     comment */
+  const plantilla = `hola
+    ${nombre}`;
+  return plantilla;
+}
+"""
+
+
+class TestIntegridad(unittest.TestCase):
+    def test_integrity(self):
+        contenido = b"body{}"
+        digest = base64.b64encode(hashlib.sha384(contenido).digest()).decode()
+        self.assertTrue(verificar_integridad(contenido, f"sha384-{digest}"))
+        self.assertFalse(verificar_integridad(b"otro", f"sha384-{digest}"))
+
+
+class TestRecursos(unittest.TestCase):
+    """Build into a temporary static folder and serve it from a small app."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.static = self.tmpdir.name
+        with open(os.path.join(self.static, "main.js"), "w") as archivo:
+            archivo.write(JS)
+        with open(os.path.join(self.static, "styles.css"), "w") as archivo:
+            archivo.write(".a {\n  color: red;\n}\n")
+        os.makedirs(os.path.join(self.static, "vendor"))
+        with open(os.path.join(self.static, "vendor", "fastbootstrap.min.css"), "w") as archivo:
+            archivo.write(".btn{color:blue}")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _app(self):
+        app = Flask(__name__, static_folder=self.static, static_url_path="/static")
+        registrar_recursos(app)
+
+        @app.route("/")
+        def pagina():
+            return render_template_string(
+                "{{ url_for('static', filename='main.js') }}|"
+                "{{ recurso_externo('fastbootstrap.min.css').url }}|"
+                "{{ recurso_externo('bootstrap.bundle.min.js').url }}"
+            )
+
+        return app
+
+    def test_build_is_reproducible(self):
+        primero = construir(self.static)
+        segundo = construir(self.static)
+        self.assertEqual(primero, segundo)
+        self.assertEqual(set(primero["archivos"]), {"main.js", "styles.css", "vendor/fastbootstrap.min.css"})
+        publicado = os.path.join(self.static, primero["archivos"]["styles.css"])
+        with open(publicado, "rb") as archivo:
+            contenido = archivo.read()
+        # Own assets are published as-is; only the compressed variants differ
+        self.assertEqual(contenido, b".a {\n  color: red;\n}\n")
+        with open(publicado + ".gz", "rb") as archivo:
+            self.assertEqual(gzip.decompress(archivo.read()), contenido)
+        with open(os.path.join(self.static, "dist", "manifest.json")) as archivo:
+            self.assertEqual(json.load(archivo), primero)
+
+    def test_missing_vendor_fails_unless_cdn_allowed(self):
+        with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo), contextlib.redirect_stderr(nulo):
+            self.assertEqual(main(["--static", self.static, "--offline"]), 1)
+            self.assertEqual(main(["--static", self.static, "--offline", "--allow-cdn"]), 0)
+
+    def test_urls_are_rewritten(self):
+        manifiesto = construir(self.static)
+        app = self._app()
+        self.assertEqual(app.config["SAID_ASSETS_VERSION"], manifiesto["version"])
+        main, vendor, cdn = app.test_client().get("/").get_data(as_text=True).split("|")
+        self.assertEqual(main, "/static/" + manifiesto["archivos"]["main.js"])
+        self.assertEqual(vendor, "/static/" + manifiesto["archivos"]["vendor/fastbootstrap.min.css"])
+        # Without a local copy the CDN is used
+        self.assertEqual(cdn, RECURSOS_EXTERNOS["bootstrap.bundle.min.js"][0])
+
+    def test_hashed_assets_are_immutable_and_precompressed(self):
+        construir(self.static)
+        app = self._app()
+        with app.test_request_context():
+            url = url_for("static", filename="main.js")
+        cliente = app.test_client()
+
+        comprimida = cliente.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(comprimida.status_code, 200)
+        self.assertEqual(comprimida.headers["Content-Encoding"], "gzip")
+        self.assertEqual(comprimida.headers["Cache-Control"], CACHE_INMUTABLE)
+        self.assertIn("Accept-Encoding", comprimida.headers["Vary"])
+        self.assertTrue(comprimida.mimetype.endswith("javascript"))
+        plana = cliente.get(url)
+        self.assertNotIn("Content-Encoding", plana.headers)
+        self.assertEqual(gzip.decompress(comprimida.data), plana.data)
+
+        # Original names are still served, without the long-lived cache
+        original = cliente.get("/static/main.js")
+        self.assertEqual(original.status_code, 200)
+        self.assertNotEqual(original.headers.get("Cache-Control"), CACHE_INMUTABLE)
+        for respuesta in (comprimida, plana, original):
+            respuesta.close()
+
+    def test_without_manifest(self):
+        app = self._app()
+        self.assertIsNone(app.config["SAID_ASSETS_VERSION"])
+        main, vendor, _ = app.test_client().get("/").get_data(as_text=True).split("|")
+        self.assertEqual(main, "/static/main.js")
+        self.assertEqual(vendor, "/static/vendor/fastbootstrap.min.css")
+
+
+if __name__ == "__main__":
+    unittest.main()
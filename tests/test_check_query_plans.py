@@ -0,0 +1,74 @@
+"""Tests for the query-plan check in :mod:`check_query_plans`."""
+
+import os
+import unittest
+
+# Provide default environment so said.py can be imported without errors
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("POSTGRES_DB", "test")
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("SECRET_KEY", "testing")
+os.environ.setdefault("SAID_LIMITES", "off")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from sqlalchemy import text
+
+from said import app
+from entities import db, Profesor
+from check_query_plans import capturar_consultas, verificar_planes
+from initialize_db import generar_datos_sinteticos
+from services import limpiar_cache_referencia
+
+
+class TestVerificarPlanes(unittest.TestCase):
+    """Run the check against a small synthetic database with a low row threshold."""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.ctx = app.app_context()
+        cls.ctx.push()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.ctx.pop()
+
+    def setUp(self):
+        generar_datos_sinteticos(profesores=120, materias=10, bloques_por_dia=4, densidad=0.5, semilla=3)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        limpiar_cache_referencia()
+
+    def test_captures_hot_queries(self):
+        cedula = db.session.query(Profesor.cedula).first()[0]
+        consultas = capturar_consultas(app, [cedula])
+        funciones = {funcion for funcion, _, _ in consultas}
+        self.assertIn("verificar_profesor", funciones)
+        self.assertIn("cargar_pagina_preferencias", funciones)
+        self.assertTrue(all(sentencia.lstrip().upper().startswith("SELECT") for _, sentencia, _ in consultas))
+
+    def test_indexed_lookups_pass(self):
+        verificadas, problemas = verificar_planes(app, min_filas=100)
+        self.assertGreater(verificadas, 0)
+        self.assertEqual(problemas, [])
+
+    def test_missing_index_is_reported(self):
+        db.session.execute(text("DROP INDEX ix_profesores_cedula"))
+        db.session.commit()
+        _, problemas = verificar_planes(app, min_filas=100)
+        self.assertTrue(problemas)
+        self.assertEqual({p["tabla"] for p in problemas}, {"profesores"})
+        self.assertIn("verificar_profesor", {p["funcion"] for p in problemas})
+
+        # Below the threshold the scan is tolerated
+        _, problemas = verificar_planes(app, min_filas=10_000)
+        self.assertEqual(problemas, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,9 +18,11 @@ from entities import (
     Turno,
     TurnoHorario,
     PuedeDictar,
+    empaquetar_grilla,
+    desempaquetar_grilla,
 )
 from flask import Flask
-from sqlalchemy import inspect
+from sqlalchemy import event, inspect
 
 class TestEntities(unittest.TestCase):
     """Validate that ORM models map correctly to the database schema."""
@@ -133,6 +135,47 @@ class TestEntities(unittest.TestCase):
         self.assertIsNotNone(found)
         self.assertEqual(found.grupos_max, 2)
 
+    def test_puede_dictar_eager_loading(self):
+        """Assignments and their subjects load without one query per row."""
+        persona = Persona(cedula="123", nombre="juan")
+        profesor = Profesor(cedula="123", nombre="juan", nombre_completo="Juan Perez")
+        materias = [Materia(nombre=f"MAT{i}", nombre_completo=f"Materia {i}") for i in range(5)]
+        turno = Turno(nombre="Mañana")
+        db.session.add_all([persona, profesor, turno, *materias])
+        db.session.commit()
+        db.session.add_all([
+            PuedeDictar(profesor="juan", materia=m.nombre, turno="Mañana") for m in materias
+        ])
+        db.session.commit()
+        db.session.expunge_all()
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            found = Profesor.query.filter_by(cedula="123").first()
+            nombres = sorted(pd.materia_puede_dic.nombre_completo for pd in found.puede_dictar)
+            turnos = {pd.turno_puede_dic.nombre for pd in found.puede_dictar}
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual(nombres, [f"Materia {i}" for i in range(5)])
+        self.assertEqual(turnos, {"Mañana"})
+        self.assertEqual(len(statements), 2)
+
+    def test_grilla_empaquetada(self):
+        """Packed grids round-trip and use two bits per block."""
+        preferencias = {0: 1, 1: 3, 5: 2, 13: 1}
+        datos = empaquetar_grilla(preferencias)
+        self.assertEqual(len(datos), 4)
+        self.assertEqual(desempaquetar_grilla(datos), preferencias)
+        self.assertEqual(empaquetar_grilla({2: 0}), b'')
+        self.assertEqual(desempaquetar_grilla(None), {})
+        with self.assertRaises(ValueError):
+            empaquetar_grilla({1: 4})
+
     def test_model_table_consistency(self):
         inspector = inspect(db.engine)
         # Get all table names from the database
@@ -172,6 +215,7 @@ def type_equivalent(model_type, db_type):
         'datetime': ['datetime', 'timestamp'],
         'date': ['date'],
         'time': ['time'],
+        'largebinary': ['largebinary', 'blob', 'bytea'],
     }
     model_type = model_type.lower()
     db_type = db_type.lower()
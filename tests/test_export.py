@@ -0,0 +1,149 @@
+"""Tests for the streaming preferences export."""
+
+import csv
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+from datetime import time
+
+# Provide default environment so said.py can be imported without errors
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("POSTGRES_DB", "test")
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("SECRET_KEY", "testing")
+os.environ.setdefault("SAID_LIMITES", "off")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from said import app
+from entities import (
+    db,
+    Persona,
+    Profesor,
+    Materia,
+    Horario,
+    BloqueHorario,
+    Turno,
+    PuedeDictar,
+    Prioridad,
+)
+from export import FormatoNoDisponible, exportar
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+class TestExport(unittest.TestCase):
+    """Export every professor from a temporary SQLite database."""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.ctx = app.app_context()
+        cls.ctx.push()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.ctx.pop()
+
+    def setUp(self):
+        db.create_all()
+        db.session.add_all([
+            Turno(nombre="Mañana"),
+            Horario(hora_inicio=time(8, 0), hora_fin=time(10, 0)),
+            Materia(nombre="MAT101", nombre_completo="Matemática"),
+        ])
+        for i in range(5):
+            db.session.add(Persona(cedula=str(i), nombre=f"prof{i}"))
+            db.session.add(Profesor(cedula=str(i), nombre=f"p{i}", nombre_completo=f"Profesor {i}"))
+        db.session.add_all([
+            BloqueHorario(id=i, dia=dia, hora_inicio=time(8, 0), hora_fin=time(10, 0))
+            for i, dia in enumerate(["lun", "mar", "mie"], start=1)
+        ])
+        db.session.commit()
+        db.session.add_all([
+            PuedeDictar(profesor="p0", materia="MAT101", turno="Mañana", grupos_max=2),
+            Prioridad(profesor="p0", bloque_horario=1, valor=3),
+            Prioridad(profesor="p0", bloque_horario=2, valor=1),
+            Prioridad(profesor="p3", bloque_horario=3, valor=2),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_ndjson(self):
+        """Every professor becomes one JSON line, batch by batch."""
+        trozos = list(exportar("ndjson", tamano_lote=2))
+        self.assertEqual(len(trozos), 3)
+        registros = [json.loads(linea) for linea in b"".join(trozos).decode().splitlines()]
+        self.assertEqual([r["profesor"] for r in registros], ["p0", "p1", "p2", "p3", "p4"])
+        self.assertEqual(
+            registros[0]["puede_dictar"],
+            [{"materia": "MAT101", "turno": "Mañana", "grupos_max": 2}],
+        )
+        self.assertEqual(
+            registros[0]["preferencias"],
+            [{"bloque_horario": 1, "valor": 3}, {"bloque_horario": 2, "valor": 1}],
+        )
+        self.assertEqual(registros[3]["preferencias"], [{"bloque_horario": 3, "valor": 2}])
+        self.assertEqual(registros[1]["preferencias"], [])
+
+    def test_csv(self):
+        """CSV output has a header and one row per professor."""
+        contenido = b"".join(exportar("csv", tamano_lote=2)).decode()
+        filas = list(csv.DictReader(io.StringIO(contenido)))
+        self.assertEqual(len(filas), 5)
+        self.assertEqual(json.loads(filas[0]["preferencias"])[0], {"bloque_horario": 1, "valor": 3})
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet(self):
+        """Parquet output is a valid file with nested columns."""
+        import pyarrow.parquet as pq
+
+        contenido = b"".join(exportar("parquet", tamano_lote=2))
+        tabla = pq.read_table(io.BytesIO(contenido))
+        self.assertEqual(tabla.num_rows, 5)
+        self.assertEqual(tabla.column("preferencias")[0].as_py()[0], {"bloque_horario": 1, "valor": 3})
+
+    def test_parquet_without_pyarrow(self):
+        """A missing pyarrow is reported before any byte is streamed."""
+        client = app.test_client()
+        app.config["SAID_ADMIN_TOKEN"] = "secreto"
+        try:
+            with mock.patch.dict(sys.modules, {"pyarrow": None, "pyarrow.parquet": None}):
+                with self.assertRaises(FormatoNoDisponible):
+                    exportar("parquet")
+                res = client.get("/admin/export?format=parquet", headers={"X-Admin-Token": "secreto"})
+            self.assertEqual(res.status_code, 501)
+            self.assertIn("pyarrow", res.get_json()["error"])
+        finally:
+            app.config["SAID_ADMIN_TOKEN"] = None
+
+    def test_admin_route_requires_token(self):
+        """The export route is only available with the admin token."""
+        client = app.test_client()
+        app.config["SAID_ADMIN_TOKEN"] = "secreto"
+        try:
+            self.assertEqual(client.get("/admin/export").status_code, 403)
+            res = client.get("/admin/export?format=csv", headers={"X-Admin-Token": "secreto"})
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.mimetype, "text/csv")
+            self.assertEqual(len(res.data.decode().splitlines()), 6)
+            res = client.get("/admin/export?format=xml", headers={"Authorization": "Bearer secreto"})
+            self.assertEqual(res.status_code, 400)
+        finally:
+            app.config["SAID_ADMIN_TOKEN"] = None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+"""Tests for the bulk roster importer and the synthetic dataset generator in :mod:`initialize_db`."""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+# Provide default environment so said.py can be imported without errors
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("POSTGRES_DB", "test")
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("SECRET_KEY", "testing")
+os.environ.setdefault("SAID_LIMITES", "off")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from said import app
+from entities import db, Persona, Profesor, PuedeDictar, Prioridad, TurnoHorario, BloqueHorario
+from services import limpiar_cache_referencia
+
+try:
+    import openpyxl
+    import pandas  # noqa: F401
+    HAS_EXCEL = True
+except ImportError:
+    HAS_EXCEL = False
+
+
+@unittest.skipUnless(HAS_EXCEL, "pandas and openpyxl are required")
+class TestCargarPersonas(unittest.TestCase):
+    """Import a generated workbook into a temporary database."""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.ctx = app.app_context()
+        cls.ctx.push()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.ctx.pop()
+
+    def setUp(self):
+        db.create_all()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.tmpdir.cleanup()
+
+    def _workbook(self, rows):
+        path = os.path.join(self.tmpdir.name, "profesores.xlsx")
+        libro = openpyxl.Workbook()
+        hoja = libro.active
+        hoja.append(["Cedula", "Nombre", "Mail"])
+        for row in rows:
+            hoja.append(row)
+        libro.save(path)
+        return path
+
+    def test_import_and_update(self):
+        """Rows are inserted, then updated, with invalid and repeated rows skipped."""
+        from initialize_db import cargar_personas_desde_excel
+
+        path = self._workbook([
+            (1001, "Juan Pérez", "juan@um.edu.uy"),
+            ("1002", "Ana  María Gómez", None),
+            (None, "Sin Cédula", None),
+            (1001, "Juan Repetido", None),
+        ])
+        reporte = cargar_personas_desde_excel(path, tamano_lote=2)
+        self.assertEqual(reporte["personas"], {"insertadas": 2, "actualizadas": 0})
+        self.assertEqual(reporte["profesores"], {"insertados": 2, "actualizados": 0, "omitidos": 0})
+        self.assertEqual(reporte["omitidas"], 2)
+        self.assertEqual(db.session.get(Persona, "1001").mail, "juan@um.edu.uy")
+        self.assertEqual(db.session.get(Profesor, "amg").cedula, "1002")
+
+        path = self._workbook([(1001, "Juan Pérez", "nuevo@um.edu.uy"), (1003, "Luis Ruiz", "")])
+        reporte = cargar_personas_desde_excel(path)
+        self.assertEqual(reporte["personas"], {"insertadas": 1, "actualizadas": 1})
+        self.assertEqual(reporte["profesores"], {"insertados": 1, "actualizados": 1, "omitidos": 0})
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Persona, "1001").mail, "nuevo@um.edu.uy")
+        self.assertEqual(Profesor.query.count(), 3)
+
+    def test_duplicate_initials_are_reported(self):
+        """Rows whose short name collides with a later row in the batch count as omitted."""
+        from initialize_db import cargar_personas_desde_excel
+
+        path = self._workbook([(1001, "Juan Pérez", None), (1002, "José Paz", None), (1003, "Ana Gómez", None)])
+        salida = io.StringIO()
+        with contextlib.redirect_stdout(salida):
+            reporte = cargar_personas_desde_excel(path)
+        self.assertEqual(reporte["profesores"], {"insertados": 2, "actualizados": 0, "omitidos": 1})
+        self.assertEqual(reporte["personas"], {"insertadas": 3, "actualizadas": 0})
+        self.assertIn("'Juan Pérez' (1001) y 'José Paz' (1002)", salida.getvalue())
+        self.assertEqual(db.session.get(Profesor, "jp").cedula, "1002")
+
+    def test_cedula_owned_by_other_professor(self):
+        """A cédula already used by another short name is reported instead of violating the unique index."""
+        from initialize_db import cargar_personas_desde_excel
+
+        cargar_personas_desde_excel(self._workbook([(1001, "Juan Pérez", None)]))
+        reporte = cargar_personas_desde_excel(self._workbook([(1001, "Juan Pablo Gómez", None)]))
+        self.assertEqual(reporte["profesores"], {"insertados": 0, "actualizados": 0, "omitidos": 1})
+        self.assertEqual(reporte["personas"], {"insertadas": 0, "actualizadas": 1})
+        self.assertEqual([p.nombre for p in Profesor.query], ["jp"])
+
+
+class TestGenerarDatosSinteticos(unittest.TestCase):
+    """Generate small synthetic datasets in a temporary database."""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.ctx = app.app_context()
+        cls.ctx.push()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.ctx.pop()
+
+    def setUp(self):
+        limpiar_cache_referencia()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        limpiar_cache_referencia()
+
+    def _prioridades(self):
+        return sorted(db.session.query(Prioridad.profesor, Prioridad.bloque_horario, Prioridad.valor))
+
+    def test_consistent_and_reproducible(self):
+        """Preferences only fall on blocks of the professor's turnos, and the seed fixes the data."""
+        from initialize_db import generar_datos_sinteticos
+
+        reporte = generar_datos_sinteticos(profesores=30, materias=5, bloques_por_dia=6, densidad=0.5,
+                                           semilla=7, tamano_lote=8)
+        self.assertEqual(reporte["profesores"], 30)
+        self.assertEqual(reporte["bloques_horarios"], 30)
+        self.assertEqual(Persona.query.count(), 30)
+        self.assertEqual(PuedeDictar.query.count(), reporte["puede_dictar"])
+        primera = self._prioridades()
+        self.assertEqual(len(primera), reporte["prioridades"])
+        self.assertTrue(primera)
+
+        horas_turno = {}
+        for fila in TurnoHorario.query:
+            horas_turno.setdefault(fila.turno, set()).add((fila.hora_inicio, fila.hora_fin))
+        bloques = {b.id: (b.hora_inicio, b.hora_fin) for b in BloqueHorario.query}
+        turnos = {}
+        for fila in PuedeDictar.query:
+            turnos.setdefault(fila.profesor, set()).add(fila.turno)
+        for profesor, bloque, valor in primera:
+            self.assertIn(valor, (1, 2, 3))
+            self.assertTrue(any(bloques[bloque] in horas_turno[t] for t in turnos[profesor]))
+        self.assertIsNotNone(db.session.get(Profesor, primera[0][0]).ultima_modificacion)
+
+        db.session.remove()
+        generar_datos_sinteticos(profesores=30, materias=5, bloques_por_dia=6, densidad=0.5, semilla=7)
+        self.assertEqual(self._prioridades(), primera)
+
+    def test_grid_mode(self):
+        """In grid mode preferences are packed on the professor instead of stored as rows."""
+        from initialize_db import generar_datos_sinteticos
+
+        app.config["SAID_ALMACENAMIENTO_PREFERENCIAS"] = "grilla"
+        try:
+            generar_datos_sinteticos(profesores=10, materias=3, bloques_por_dia=3, densidad=1.0)
+        finally:
+            app.config["SAID_ALMACENAMIENTO_PREFERENCIAS"] = "filas"
+        self.assertEqual(Prioridad.query.count(), 0)
+        self.assertTrue(all(p.grilla_preferencias for p in Profesor.query))
+
+
+if __name__ == "__main__":
+    unittest.main()
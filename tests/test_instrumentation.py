@@ -0,0 +1,61 @@
+"""Tests for the opt-in per-request SQL instrumentation."""
+
+import unittest
+
+from flask import Flask, render_template_string
+
+from entities import db, Materia
+from instrumentation import instrumentar, leer_presupuestos
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Run a small app with instrumentation enabled."""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SAID_INSTRUMENTACION_SQL"] = True
+        self.app.config["SAID_PRESUPUESTOS_SQL"] = "materias=1"
+        db.init_app(self.app)
+        instrumentar(self.app)
+
+        @self.app.route("/materias")
+        def materias():
+            Materia.query.all()
+            Materia.query.count()
+            return render_template_string("{{ n }}", n=1)
+
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_server_timing_and_budget(self):
+        with self.assertLogs("said.instrumentacion", level="INFO") as logs:
+            res = self.app.test_client().get("/materias")
+        timing = res.headers["Server-Timing"]
+        self.assertIn('desc="2 consultas"', timing)
+        self.assertIn("render;dur=", timing)
+        self.assertIn("total;dur=", timing)
+        registro = logs.records[0]
+        self.assertEqual(registro.endpoint, "materias")
+        self.assertEqual(registro.sentencias, 2)
+        self.assertEqual(logs.records[1].levelname, "WARNING")
+
+    def test_disabled_registers_nothing(self):
+        app = Flask(__name__)
+        instrumentar(app)
+        self.assertEqual(app.before_request_funcs, {})
+        self.assertEqual(app.after_request_funcs, {})
+
+    def test_leer_presupuestos(self):
+        self.assertEqual(leer_presupuestos("index=3, submit=6"), {"index": 3, "submit": 6})
+        self.assertEqual(leer_presupuestos(""), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
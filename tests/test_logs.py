@@ -0,0 +1,87 @@
+"""Tests for the queue-backed structured logging."""
+
+import json
+import logging
+import queue
+import sys
+import unittest
+
+from flask import Flask
+
+from logs import (
+    FiltroContexto,
+    FiltroMuestreo,
+    FormateadorJSON,
+    ManejadorCola,
+    configurar_logs,
+    leer_niveles,
+)
+
+
+class TestLogs(unittest.TestCase):
+
+    def _registro(self, nivel=logging.INFO, mensaje="hola %s", args=("mundo",), **extra):
+        registro = logging.makeLogRecord({
+            "name": "said.prueba", "levelno": nivel, "levelname": logging.getLevelName(nivel),
+            "msg": mensaje, "args": args,
+        })
+        registro.__dict__.update(extra)
+        return registro
+
+    def test_request_id_and_duration(self):
+        app = Flask(__name__)
+        configurar_logs(app)
+
+        @app.route("/")
+        def inicio():
+            return "ok"
+
+        client = app.test_client()
+        with self.assertLogs("said.requests", level="INFO") as logs:
+            res = client.get("/", headers={"X-Request-ID": "abc123"})
+        self.assertEqual(res.headers["X-Request-ID"], "abc123")
+        self.assertEqual(logs.records[0].estado, 200)
+        self.assertGreaterEqual(logs.records[0].duracion_ms, 0)
+        self.assertEqual(len(client.get("/").headers["X-Request-ID"]), 32)
+
+        with app.test_request_context("/"):
+            app.preprocess_request()
+            registro = self._registro(ci="1001")
+            FiltroContexto().filter(registro)
+            datos = json.loads(FormateadorJSON().format(registro))
+        self.assertEqual(datos["mensaje"], "hola mundo")
+        self.assertEqual(datos["ci"], "1001")
+        self.assertEqual(len(datos["request_id"]), 32)
+
+    def test_full_queue_drops_records(self):
+        manejador = ManejadorCola(queue.Queue(1))
+        manejador.handle(self._registro())
+        manejador.handle(self._registro())
+        self.assertEqual(manejador.descartados, 1)
+        self.assertEqual(manejador.queue.get_nowait().msg, "hola mundo")
+
+    def test_exception_is_formatted_before_queueing(self):
+        manejador = ManejadorCola(queue.Queue())
+        try:
+            raise ValueError("falla")
+        except ValueError:
+            manejador.handle(self._registro(logging.ERROR, exc_info=sys.exc_info()))
+        datos = json.loads(FormateadorJSON().format(manejador.queue.get_nowait()))
+        self.assertIn("ValueError: falla", datos["excepcion"])
+
+    def test_debug_sampling(self):
+        filtro = FiltroMuestreo(0)
+        self.assertFalse(filtro.filter(self._registro(logging.DEBUG)))
+        self.assertTrue(filtro.filter(self._registro(logging.INFO)))
+        self.assertTrue(FiltroMuestreo(1).filter(self._registro(logging.DEBUG)))
+
+    def test_leer_niveles(self):
+        self.assertEqual(
+            leer_niveles("said.requests=warning, sqlalchemy.engine=INFO"),
+            {"said.requests": "WARNING", "sqlalchemy.engine": "INFO"},
+        )
+        self.assertEqual(leer_niveles(""), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Tests for the Prometheus metrics endpoint."""
+
+import os
+import unittest
+from datetime import time
+
+# Provide default environment so said.py can be imported without errors
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("POSTGRES_DB", "test")
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("SECRET_KEY", "testing")
+os.environ.setdefault("SAID_LIMITES", "off")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from said import app
+from entities import db, Persona, Profesor, Horario, BloqueHorario
+from services import guardar_respuesta, limpiar_cache_referencia, listar_turnos
+
+
+class TestMetrics(unittest.TestCase):
+    """Scrape /metrics after exercising the application."""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.ctx = app.app_context()
+        cls.ctx.push()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.ctx.pop()
+
+    def setUp(self):
+        db.create_all()
+        limpiar_cache_referencia()
+        app.config["SAID_ADMIN_TOKEN"] = "secreto"
+        self.client = app.test_client()
+
+    def tearDown(self):
+        app.config["SAID_ADMIN_TOKEN"] = None
+        db.session.remove()
+        db.drop_all()
+
+    def _scrape(self):
+        res = self.client.get("/metrics", headers={"Authorization": "Bearer secreto"})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.content_type.startswith("text/plain"))
+        return res.data.decode()
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+    def test_request_counts_and_latency(self):
+        self.client.get("/")
+        contenido = self._scrape()
+        self.assertIn('said_requests_total{endpoint="entry",method="GET",status="401"}', contenido)
+        self.assertIn('said_request_duration_seconds_bucket{endpoint="entry"', contenido)
+
+    def test_submit_sizes_and_cache(self):
+        db.session.add_all([
+            Persona(cedula="1", nombre="juan"),
+            Profesor(cedula="1", nombre="juan", nombre_completo="Juan Perez"),
+            Horario(hora_inicio=time(8, 0), hora_fin=time(10, 0)),
+            BloqueHorario(id=1, dia="lun", hora_inicio=time(8, 0), hora_fin=time(10, 0)),
+        ])
+        db.session.commit()
+        guardar_respuesta({1: 2}, "1")
+        listar_turnos()
+        contenido = self._scrape()
+        self.assertIn("said_submit_preferences_count", contenido)
+        self.assertIn('said_reference_cache_total{resultado="sin_version"}', contenido)
+        self.assertIn("said_db_pool_wait_seconds_count", contenido)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Tests for the Alembic migrations in ``migrations/``."""
+
+import os
+import unittest
+
+from sqlalchemy import create_engine, inspect
+
+try:
+    from alembic import command
+    from alembic.autogenerate import compare_metadata
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    HAS_ALEMBIC = True
+except ImportError:
+    HAS_ALEMBIC = False
+
+from entities import db
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@unittest.skipUnless(HAS_ALEMBIC, "alembic is required")
+class TestMigrations(unittest.TestCase):
+    """Apply the migrations to an empty database and compare the result with the models."""
+
+    def setUp(self):
+        self.motor = create_engine("sqlite://")
+        self.config = Config(os.path.join(RAIZ, "alembic.ini"))
+        self.config.attributes["configurar_logs"] = False
+
+    def tearDown(self):
+        self.motor.dispose()
+
+    def _ejecutar(self, comando, revision):
+        with self.motor.begin() as conexion:
+            self.config.attributes["connection"] = conexion
+            comando(self.config, revision)
+
+    def test_head_matches_models(self):
+        self._ejecutar(command.upgrade, "head")
+        with self.motor.connect() as conexion:
+            diferencias = compare_metadata(MigrationContext.configure(conexion), db.metadata)
+        self.assertEqual(diferencias, [])
+
+    def test_legacy_baseline_upgrades_to_models(self):
+        """A database with only the original tables, stamped 0001, reaches the full schema."""
+        self._ejecutar(command.upgrade, "0001")
+        tablas = set(inspect(self.motor).get_table_names())
+        self.assertNotIn("envios_pendientes", tablas)
+        self.assertNotIn("progreso_envios", tablas)
+        self.assertNotIn("grilla_preferencias", {c["name"] for c in inspect(self.motor).get_columns("profesores")})
+
+        self._ejecutar(command.upgrade, "head")
+        with self.motor.connect() as conexion:
+            diferencias = compare_metadata(MigrationContext.configure(conexion), db.metadata)
+        self.assertEqual(diferencias, [])
+
+    def test_indexes_and_downgrade(self):
+        self._ejecutar(command.upgrade, "head")
+        indices = {i["name"]: i for i in inspect(self.motor).get_indexes("profesores")}
+        self.assertTrue(indices["ix_profesores_cedula"]["unique"])
+
+        self._ejecutar(command.downgrade, "0001a")
+        self.assertEqual(inspect(self.motor).get_indexes("profesores"), [])
+
+        self._ejecutar(command.downgrade, "base")
+        self.assertEqual(inspect(self.motor).get_table_names(), ["alembic_version"])
+
+
+if __name__ == "__main__":
+    unittest.main()
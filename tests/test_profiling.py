@@ -0,0 +1,75 @@
+"""Tests for the on-demand and slow-request profiler."""
+
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+from flask import Flask
+
+from profiling import registrar_perfilado
+
+
+class TestProfiling(unittest.TestCase):
+    """Profile a small app writing into a temporary directory."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _app(self, **config):
+        app = Flask(__name__)
+        app.config.update(SAID_PROFILE_DIR=self.tmpdir.name, **config)
+        registrar_perfilado(app, lambda: True)
+
+        @app.route("/lento")
+        def lento():
+            fin = time.perf_counter() + 0.05
+            while time.perf_counter() < fin:
+                pass
+            return "ok"
+
+        @app.route("/rapido")
+        def rapido():
+            return "ok"
+
+        return app.test_client()
+
+    def _archivos(self, extension):
+        return sorted(f for f in os.listdir(self.tmpdir.name) if f.endswith(extension))
+
+    def test_slow_requests_are_sampled(self):
+        client = self._app(SAID_PROFILE_SLOW_MS=20, SAID_PROFILE_INTERVAL_MS=1)
+        client.get("/rapido")
+        self.assertEqual(self._archivos(".folded"), [])
+        client.get("/lento")
+        archivos = self._archivos(".folded")
+        self.assertEqual(len(archivos), 1)
+        self.assertIn("-lento-", archivos[0])
+        with open(os.path.join(self.tmpdir.name, archivos[0]), encoding="utf-8") as archivo:
+            self.assertIn("test_profiling.py:lento", archivo.read())
+
+    def test_admin_header_uses_cprofile(self):
+        client = self._app()
+        res = client.get("/rapido", headers={"X-Profile": "1"})
+        nombre = res.headers["X-Profile-File"]
+        self.assertTrue(nombre.endswith(".prof"))
+        pstats.Stats(os.path.join(self.tmpdir.name, nombre))
+
+    def test_rotation(self):
+        client = self._app(SAID_PROFILE_MAX_FILES=2)
+        for _ in range(4):
+            client.get("/rapido", headers={"X-Profile": "1"})
+        self.assertEqual(len(self._archivos(".prof")), 2)
+
+    def test_disabled_without_directory(self):
+        app = Flask(__name__)
+        registrar_perfilado(app, lambda: True)
+        self.assertEqual(app.before_request_funcs, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
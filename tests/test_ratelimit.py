@@ -0,0 +1,107 @@
+"""Tests for the token-bucket rate limiter."""
+
+import os
+import tempfile
+import unittest
+
+from flask import Flask, session
+
+from ratelimit import (
+    LIMITES_RECOMENDADOS,
+    AlmacenMemoria,
+    AlmacenSQLite,
+    consumir_token,
+    leer_limites,
+    registrar_limites,
+)
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+
+class TestRateLimit(unittest.TestCase):
+
+    def test_consumir_token(self):
+        self.assertEqual(consumir_token(2, 0, 0, 2, 10), (True, 1, 0.0))
+        admitido, tokens, espera = consumir_token(0.5, 0, 0, 2, 10)
+        self.assertFalse(admitido)
+        self.assertAlmostEqual(espera, 2.5)
+        # Five seconds refill one token at 2 tokens every 10 seconds
+        self.assertTrue(consumir_token(0, 0, 5, 2, 10)[0])
+
+    def test_leer_limites(self):
+        self.assertEqual(
+            leer_limites("submit.usuario=5/60, handle_auth.ip=20/30"),
+            {("submit", "usuario"): (5.0, 60.0), ("handle_auth", "ip"): (20.0, 30.0)},
+        )
+        self.assertEqual(leer_limites(""), {})
+        self.assertEqual(leer_limites(" OFF "), {})
+        self.assertEqual(leer_limites(LIMITES_RECOMENDADOS)[("patch_preferences", "usuario")], (10.0, 60.0))
+        with self.assertRaises(ValueError):
+            leer_limites("submit.cookie=1/1")
+
+    def test_memory_store(self):
+        almacen = AlmacenMemoria()
+        resultados = [almacen.consumir("a", 3, 60)[0] for _ in range(4)]
+        self.assertEqual(resultados, [True, True, True, False])
+        self.assertTrue(almacen.consumir("b", 3, 60)[0])
+
+    def test_sqlite_store_is_shared(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ruta = os.path.join(tmpdir, "limites.db")
+            primero, segundo = AlmacenSQLite(ruta), AlmacenSQLite(ruta)
+            self.assertTrue(primero.consumir("a", 2, 60)[0])
+            self.assertTrue(segundo.consumir("a", 2, 60)[0])
+            admitido, espera = primero.consumir("a", 2, 60)
+            self.assertFalse(admitido)
+            self.assertGreater(espera, 0)
+
+    def _app(self, limites):
+        app = Flask(__name__, template_folder=TEMPLATES)
+        app.secret_key = "testing"
+        app.config["SAID_LIMITES"] = limites
+        registrar_limites(app)
+
+        @app.route("/login/<usuario>")
+        def login(usuario):
+            session["user_id"] = usuario
+            return "ok"
+
+        @app.route("/submit", methods=["POST"])
+        def submit():
+            return {"success": True}
+
+        return app
+
+    def test_submit_limited_per_user(self):
+        app = self._app("submit.usuario=2/60,submit.ip=100/60")
+        cliente = app.test_client()
+        cliente.get("/login/1")
+        estados = [cliente.post("/submit", json={}).status_code for _ in range(3)]
+        self.assertEqual(estados, [200, 200, 429])
+        res = cliente.post("/submit", json={})
+        self.assertIn("error", res.get_json())
+        self.assertGreaterEqual(int(res.headers["Retry-After"]), 1)
+
+        otro = app.test_client()
+        otro.get("/login/2")
+        self.assertEqual(otro.post("/submit", json={}).status_code, 200)
+
+    def test_limited_per_ip_renders_page(self):
+        app = self._app("login.ip=1/60")
+        cliente = app.test_client()
+        self.assertEqual(cliente.get("/login/1").status_code, 200)
+        res = cliente.get("/login/1", headers={"Accept": "text/html"})
+        self.assertEqual(res.status_code, 429)
+        self.assertIn("Demasiados pedidos", res.get_data(as_text=True))
+
+    def test_disabled_registers_nothing(self):
+        app = Flask(__name__)
+        self.assertIsNone(registrar_limites(app))
+        self.assertEqual(app.before_request_funcs, {})
+        app.config["SAID_LIMITES"] = "off"
+        self.assertIsNone(registrar_limites(app))
+        self.assertEqual(app.before_request_funcs, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
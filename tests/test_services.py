@@ -1,9 +1,12 @@
 """Integration tests for service layer functions."""
 
 import os
+from contextlib import contextmanager
 from datetime import time
 import unittest
 
+from sqlalchemy import event
+
 # Provide default environment so said.py can be imported without errors
 os.environ.setdefault("POSTGRES_HOST", "localhost")
 os.environ.setdefault("POSTGRES_PORT", "5432")
@@ -11,6 +14,7 @@ os.environ.setdefault("POSTGRES_DB", "test")
 os.environ.setdefault("POSTGRES_USER", "test")
 os.environ.setdefault("POSTGRES_PASSWORD", "test")
 os.environ.setdefault("SECRET_KEY", "testing")
+os.environ.setdefault("SAID_LIMITES", "off")
 os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
 
 from said import app
@@ -25,6 +29,7 @@ from entities import (
     Turno,
     TurnoHorario,
     PuedeDictar,
+    EnvioPendiente,
 )
 from services import (
     guardar_respuesta,
@@ -35,6 +40,21 @@ from services import (
     get_professor_data,
     get_previous_preferences,
     listar_turnos_materias_profesor,
+    cargar_pagina_preferencias,
+    obtener_datos_referencia,
+    invalidar_datos_referencia,
+    limpiar_cache_referencia,
+    migrar_preferencias_a_grilla,
+    encolar_respuesta,
+    aplicar_envios_pendientes,
+    reconstruir_progreso_envios,
+    obtener_progreso_envios,
+    listar_profesores_pendientes,
+    aplicar_cambios_preferencias,
+    ConflictoVersion,
+    obtener_demanda_bloques,
+    reconstruir_demanda_bloques,
+    _marcar_primer_envio,
 )
 
 
@@ -55,11 +75,26 @@ class TestServices(unittest.TestCase):
 
     def setUp(self):
         db.create_all()
+        limpiar_cache_referencia()
 
     def tearDown(self):
         db.session.remove()
         db.drop_all()
 
+    @contextmanager
+    def _count_queries(self):
+        """Collect the SQL statements executed inside the block."""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
     def _create_basic_data(self):
         """Insert a professor, a schedule block and related records."""
         persona = Persona(cedula="1", nombre="juan")
@@ -93,6 +128,65 @@ class TestServices(unittest.TestCase):
         self.assertIsNotNone(pref)
         self.assertEqual(pref.valor, 2)
 
+    def test_guardar_respuesta_reemplaza_preferencias(self):
+        """A new submission overwrites changed blocks and drops missing ones."""
+        self._create_basic_data()
+        guardar_respuesta({1: 2, 2: 3}, "1")
+        guardar_respuesta({"2": 1, "3": 3}, "1")
+        prefs = {p.bloque_horario: p.valor for p in Prioridad.query.filter_by(profesor="juan")}
+        self.assertEqual(prefs, {2: 1, 3: 3})
+
+    def test_guardar_respuesta_bloque_inexistente(self):
+        """Unknown blocks are rejected before anything is written."""
+        self._create_basic_data()
+        guardar_respuesta({1: 2}, "1")
+        with self.assertRaises(ValueError):
+            guardar_respuesta({1: 3, 99: 1}, "1")
+        db.session.rollback()
+        self.assertEqual(Prioridad.query.filter_by(profesor="juan").one().valor, 2)
+
+    def test_guardar_respuesta_consultas_constantes(self):
+        """The number of statements does not grow with the size of the grid."""
+        self._create_basic_data()
+        db.session.expire_all()
+        with self._count_queries() as pocas:
+            guardar_respuesta({1: 1}, "1")
+        db.session.expire_all()
+        with self._count_queries() as muchas:
+            guardar_respuesta({i: i % 4 for i in range(1, 6)}, "1")
+        self.assertEqual(len(pocas), len(muchas))
+
+    def test_guardar_respuesta_reporta_diferencias(self):
+        """Only the changed cells are written and reported."""
+        self._create_basic_data()
+        reporte = guardar_respuesta({1: 2, 2: 3, 3: 1}, "1")
+        self.assertEqual(reporte["insertadas"], 3)
+        reporte = guardar_respuesta({1: 2, 2: 1, 4: 3}, "1")
+        self.assertEqual(
+            reporte,
+            {"insertadas": 1, "actualizadas": 1, "eliminadas": 1, "sin_cambios": False},
+        )
+        prefs = {p.bloque_horario: p.valor for p in Prioridad.query.filter_by(profesor="juan")}
+        self.assertEqual(prefs, {1: 2, 2: 1, 4: 3})
+
+    def test_guardar_respuesta_sin_cambios(self):
+        """Re-submitting the stored set costs one read and no writes."""
+        self._create_basic_data()
+        guardar_respuesta({1: 2, 2: 3}, "1", min_dias=True)
+        db.session.expire_all()
+        with self._count_queries() as statements:
+            reporte = guardar_respuesta({"1": 2, "2": 3}, "1", min_dias=True)
+        self.assertTrue(reporte["sin_cambios"])
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].lstrip().upper().startswith("SELECT"))
+
+    def test_guardar_respuesta_primer_envio_vacio(self):
+        """An empty first submission is still recorded."""
+        self._create_basic_data()
+        reporte = guardar_respuesta({}, "1")
+        self.assertFalse(reporte["sin_cambios"])
+        self.assertIsNotNone(Profesor.query.filter_by(cedula="1").one().ultima_modificacion)
+
     def test_obtener_bloques_horarios(self):
         """Retrieve blocks with and without filtering by turn."""
         self._create_basic_data()
@@ -102,6 +196,30 @@ class TestServices(unittest.TestCase):
         self.assertEqual(len(morning), 5)
         self.assertEqual(all_blocks[0]["id"], 1)
 
+    def test_bloques_por_turno_coincidencia_compuesta(self):
+        """A block belongs to a turno only if both start and end times match."""
+        self._create_basic_data()
+        db.session.add_all([
+            Horario(hora_inicio=time(8, 0), hora_fin=time(9, 0)),
+            Turno(nombre="Tarde"),
+            Horario(hora_inicio=time(14, 0), hora_fin=time(16, 0)),
+        ])
+        db.session.commit()
+        db.session.add_all([
+            BloqueHorario(id=6, dia="lun", hora_inicio=time(8, 0), hora_fin=time(9, 0)),
+            BloqueHorario(id=7, dia="lun", hora_inicio=time(14, 0), hora_fin=time(16, 0)),
+            TurnoHorario(hora_inicio=time(14, 0), hora_fin=time(16, 0), turno="Tarde"),
+        ])
+        db.session.commit()
+        invalidar_datos_referencia()
+        indice = obtener_datos_referencia().bloques_por_turno
+        self.assertEqual(indice["Mañana"], frozenset({1, 2, 3, 4, 5}))
+        self.assertEqual(indice["Tarde"], frozenset({7}))
+        with self._count_queries() as statements:
+            tarde = obtener_bloques_horarios("Tarde")
+        self.assertEqual(statements, [])
+        self.assertEqual([b["id"] for b in tarde], [7])
+
     def test_verificar_profesor(self):
         """Check existence of a professor by id."""
         self._create_basic_data()
@@ -141,6 +259,361 @@ class TestServices(unittest.TestCase):
         self.assertEqual(res["materias"][0]["nombre"], "MAT101")
         self.assertEqual(res["turnos"], ["Mañana"])
 
+    def test_listar_turnos_materias_profesor_una_consulta(self):
+        """Many assignments are resolved with a single query."""
+        self._create_basic_data()
+        db.session.add_all([
+            Turno(nombre="Tarde"),
+            Materia(nombre="FIS101", nombre_completo="Física"),
+        ])
+        db.session.add_all([
+            PuedeDictar(profesor="juan", materia="FIS101", turno="Mañana"),
+            PuedeDictar(profesor="juan", materia="FIS101", turno="Tarde"),
+            PuedeDictar(profesor="juan", materia="MAT101", turno="Tarde"),
+        ])
+        db.session.commit()
+        with self._count_queries() as statements:
+            res = listar_turnos_materias_profesor("1")
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([m["nombre"] for m in res["materias"]], ["FIS101", "MAT101"])
+        self.assertEqual(sorted(res["turnos"]), ["Mañana", "Tarde"])
+
+    def test_listar_turnos_materias_profesor_inexistente(self):
+        """An unknown professor raises an error."""
+        self._create_basic_data()
+        with self.assertRaises(ValueError):
+            listar_turnos_materias_profesor("2")
+
+    def test_cargar_pagina_preferencias(self):
+        """The page loader returns everything the view needs in two queries."""
+        self._create_basic_data()
+        db.session.add(Prioridad(profesor="juan", bloque_horario=2, valor=1))
+        db.session.commit()
+        invalidar_datos_referencia()
+        obtener_datos_referencia()
+        db.session.expire_all()
+        with self._count_queries() as statements:
+            pagina = cargar_pagina_preferencias("1")
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(pagina["profesor"]["nombre_completo"], "Juan Perez")
+        self.assertEqual(pagina["materias"][0]["nombre"], "MAT101")
+        self.assertEqual(pagina["turnos"], ["Mañana"])
+        self.assertEqual(pagina["bloques_turno"], frozenset({1, 2, 3, 4, 5}))
+        preferencias = {b["id"]: b["preference"] for b in pagina["bloques_horarios"]}
+        self.assertEqual(preferencias, {1: 0, 2: 1, 3: 0, 4: 0, 5: 0})
+
+    def test_cargar_pagina_preferencias_profesor_inexistente(self):
+        """An unknown professor yields no page data."""
+        self._create_basic_data()
+        self.assertIsNone(cargar_pagina_preferencias("2"))
+
+    def test_datos_referencia_en_cache(self):
+        """With a version stamp the catalog is served without touching the database."""
+        self._create_basic_data()
+        invalidar_datos_referencia()
+        primera = obtener_datos_referencia()
+        with self._count_queries() as statements:
+            bloques = obtener_bloques_horarios()
+            materias = listar_materias()
+            turnos = listar_turnos()
+        self.assertEqual(statements, [])
+        self.assertEqual(len(bloques), 5)
+        self.assertEqual(materias[0]["nombre"], "MAT101")
+        self.assertEqual(turnos, ["Mañana"])
+        self.assertIs(obtener_datos_referencia(), primera)
+
+    def test_datos_referencia_invalidacion(self):
+        """Admin writes followed by an invalidation are visible immediately."""
+        self._create_basic_data()
+        invalidar_datos_referencia()
+        version = obtener_datos_referencia().version
+        db.session.add(Materia(nombre="FIS101", nombre_completo="Física"))
+        db.session.commit()
+        self.assertEqual(len(listar_materias()), 1)
+        invalidar_datos_referencia()
+        self.assertEqual(len(listar_materias()), 2)
+        self.assertNotEqual(obtener_datos_referencia().version, version)
+
+    def test_datos_referencia_ttl(self):
+        """Once the TTL expires only the version stamp is checked."""
+        self._create_basic_data()
+        invalidar_datos_referencia()
+        datos = obtener_datos_referencia()
+        app.config["SAID_REFERENCIA_TTL"] = 0
+        try:
+            with self._count_queries() as statements:
+                self.assertIs(obtener_datos_referencia(), datos)
+        finally:
+            app.config["SAID_REFERENCIA_TTL"] = 30
+        self.assertEqual(len(statements), 1)
+
+    def test_modo_grilla(self):
+        """In packed mode preferences live in one column with the same read API."""
+        self._create_basic_data()
+        app.config["SAID_ALMACENAMIENTO_PREFERENCIAS"] = "grilla"
+        try:
+            guardar_respuesta({1: 2, 3: 1, 4: 0}, "1")
+            self.assertEqual(Prioridad.query.count(), 0)
+            self.assertEqual(get_previous_preferences("1"), {1: 2, 3: 1})
+            reporte = guardar_respuesta({"1": 2, "3": 1}, "1")
+            self.assertTrue(reporte["sin_cambios"])
+            reporte = guardar_respuesta({1: 3}, "1")
+            self.assertEqual((reporte["actualizadas"], reporte["eliminadas"]), (1, 1))
+            pagina = cargar_pagina_preferencias("1")
+            preferencias = {b["id"]: b["preference"] for b in pagina["bloques_horarios"]}
+            self.assertEqual(preferencias[1], 3)
+        finally:
+            app.config["SAID_ALMACENAMIENTO_PREFERENCIAS"] = "filas"
+
+    def test_migrar_preferencias_a_grilla(self):
+        """Existing rows are packed into each professor's grid."""
+        self._create_basic_data()
+        guardar_respuesta({1: 2, 5: 3}, "1")
+        self.assertEqual(migrar_preferencias_a_grilla(), 1)
+        app.config["SAID_ALMACENAMIENTO_PREFERENCIAS"] = "grilla"
+        try:
+            self.assertEqual(get_previous_preferences("1"), {1: 2, 5: 3})
+        finally:
+            app.config["SAID_ALMACENAMIENTO_PREFERENCIAS"] = "filas"
+
+    def test_escritura_diferida(self):
+        """Queued submissions are read back at once and applied later, latest one only."""
+        self._create_basic_data()
+        guardar_respuesta({1: 1, 2: 1}, "1")
+        app.config["SAID_ESCRITURA_DIFERIDA"] = True
+        try:
+            self.assertEqual(encolar_respuesta({1: 3, 4: 2}, "1", min_dias=True), {"encolado": True})
+            encolar_respuesta({"1": 2, "5": 3}, "1", min_dias=True)
+            self.assertEqual(EnvioPendiente.query.count(), 1)
+            self.assertEqual(get_previous_preferences("1"), {1: 2, 5: 3})
+            pagina = cargar_pagina_preferencias("1")
+            self.assertTrue(pagina["profesor"]["min_max_dias"])
+            self.assertEqual({b["id"]: b["preference"] for b in pagina["bloques_horarios"]}[5], 3)
+            self.assertEqual(dict(db.session.query(Prioridad.bloque_horario, Prioridad.valor)), {1: 1, 2: 1})
+
+            self.assertEqual(aplicar_envios_pendientes(), 1)
+            self.assertEqual(aplicar_envios_pendientes(), 0)
+            self.assertEqual(EnvioPendiente.query.count(), 0)
+            self.assertEqual(dict(db.session.query(Prioridad.bloque_horario, Prioridad.valor)), {1: 2, 5: 3})
+            self.assertEqual(get_previous_preferences("1"), {1: 2, 5: 3})
+        finally:
+            app.config["SAID_ESCRITURA_DIFERIDA"] = False
+
+    def test_encolar_respuesta_valida(self):
+        """Invalid submissions are rejected before being queued."""
+        self._create_basic_data()
+        with self.assertRaises(ValueError):
+            encolar_respuesta({99: 1}, "1")
+        with self.assertRaises(ValueError):
+            encolar_respuesta({1: 7}, "1")
+        with self.assertRaises(ValueError):
+            encolar_respuesta({1: 1}, "999")
+        self.assertEqual(EnvioPendiente.query.count(), 0)
+
+    def test_progreso_envios(self):
+        """Counters follow each first submission and match a full rebuild."""
+        self._create_basic_data()
+        db.session.add_all([
+            Persona(cedula="2", nombre="ana"),
+            Profesor(cedula="2", nombre="ana", nombre_completo="Ana Gomez"),
+        ])
+        db.session.commit()
+        db.session.add(PuedeDictar(profesor="ana", materia="MAT101", turno="Mañana"))
+        db.session.commit()
+        self.assertEqual(reconstruir_progreso_envios(), 3)
+        self.assertEqual(obtener_progreso_envios()["total"]["pendientes"], 2)
+
+        guardar_respuesta({1: 2}, "1")
+        guardar_respuesta({1: 3}, "1")
+        with self._count_queries() as statements:
+            informe = obtener_progreso_envios()
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(
+            (informe["total"]["enviados"], informe["total"]["pendientes"]), (1, 1)
+        )
+        self.assertEqual(informe["turnos"][0]["nombre"], "Mañana")
+        self.assertEqual(informe["turnos"][0]["enviados"], 1)
+        self.assertEqual(informe["materias"][0]["enviados"], 1)
+        self.assertIsNotNone(informe["materias"][0]["ultimo_envio"])
+
+        def contadores(datos):
+            return [(f["enviados"], f["pendientes"]) for f in [datos["total"], *datos["turnos"], *datos["materias"]]]
+
+        reconstruir_progreso_envios()
+        self.assertEqual(contadores(obtener_progreso_envios()), contadores(informe))
+        self.assertEqual(
+            [p["nombre"] for p in listar_profesores_pendientes(turno="Mañana")], ["ana"]
+        )
+        self.assertEqual(listar_profesores_pendientes(materia="FIS101"), [])
+
+    def test_primer_envio_atomico(self):
+        """Only one writer sees the NULL -> timestamp transition, whatever it read before."""
+        self._create_basic_data()
+        reconstruir_progreso_envios()
+        self.assertTrue(_marcar_primer_envio("juan"))
+        self.assertFalse(_marcar_primer_envio("juan"))
+        db.session.rollback()
+
+        encolar_respuesta({1: 2}, "1")
+        aplicar_cambios_preferencias({2: 1}, "1", 1)
+        guardar_respuesta({1: 3}, "1")
+        self.assertEqual(obtener_progreso_envios()["total"]["enviados"], 1)
+
+    def test_aplicar_cambios_preferencias(self):
+        """Only the changed cells are written, guarded by the stored version."""
+        self._create_basic_data()
+        guardar_respuesta({1: 1, 2: 1}, "1")
+        version = db.session.query(Profesor.version_preferencias).scalar()
+        self.assertEqual(version, 1)
+
+        invalidar_datos_referencia()
+        obtener_datos_referencia()
+        with self._count_queries() as statements:
+            reporte = aplicar_cambios_preferencias({"2": 0, "3": 2}, "1", version, min_dias=True)
+        self.assertEqual(reporte, {"version": 2, "escritas": 1, "eliminadas": 1, "sin_cambios": False})
+        self.assertFalse(any("FROM bloques_horarios" in s for s in statements))
+        self.assertEqual(dict(db.session.query(Prioridad.bloque_horario, Prioridad.valor)), {1: 1, 3: 2})
+        self.assertTrue(get_professor_data("1")["min_max_dias"])
+
+        # A stale version is rejected without writing anything
+        with self.assertRaises(ConflictoVersion) as conflicto:
+            aplicar_cambios_preferencias({1: 3}, "1", version)
+        self.assertEqual(conflicto.exception.version_actual, 2)
+        self.assertEqual(get_previous_preferences("1"), {1: 1, 3: 2})
+
+        self.assertTrue(aplicar_cambios_preferencias({}, "1", 2)["sin_cambios"])
+        with self.assertRaises(ValueError):
+            aplicar_cambios_preferencias({99: 1}, "1", 2)
+        with self.assertRaises(ValueError):
+            aplicar_cambios_preferencias({1: 1}, "999", 0)
+
+        # Full submissions also move the version forward
+        guardar_respuesta({1: 2}, "1")
+        with self.assertRaises(ConflictoVersion):
+            aplicar_cambios_preferencias({1: 3}, "1", 2)
+
+    def test_aplicar_cambios_preferencias_grilla_y_pendientes(self):
+        """The delta is merged into the packed grid or into a queued submission."""
+        self._create_basic_data()
+        app.config["SAID_ALMACENAMIENTO_PREFERENCIAS"] = "grilla"
+        try:
+            guardar_respuesta({1: 2, 3: 1}, "1")
+            reporte = aplicar_cambios_preferencias({1: 0, 4: 3}, "1", 1)
+            self.assertEqual(reporte["version"], 2)
+            self.assertEqual(get_previous_preferences("1"), {3: 1, 4: 3})
+        finally:
+            app.config["SAID_ALMACENAMIENTO_PREFERENCIAS"] = "filas"
+
+        app.config["SAID_ESCRITURA_DIFERIDA"] = True
+        try:
+            encolar_respuesta({1: 1, 2: 2}, "1")
+            aplicar_cambios_preferencias({2: 0, 5: 3}, "1", 3)
+            self.assertEqual(EnvioPendiente.query.count(), 1)
+            self.assertEqual(get_previous_preferences("1"), {1: 1, 5: 3})
+            aplicar_envios_pendientes()
+            self.assertEqual(dict(db.session.query(Prioridad.bloque_horario, Prioridad.valor)), {1: 1, 5: 3})
+        finally:
+            app.config["SAID_ESCRITURA_DIFERIDA"] = False
+
+    def _demanda(self, **filtro):
+        """Map block id -> (count of 1, 2, 3, unavailable) for one dimension."""
+        return {
+            b["id"]: (b["preferencia_1"], b["preferencia_2"], b["preferencia_3"], b["no_disponible"])
+            for b in obtener_demanda_bloques(**filtro)["bloques"]
+        }
+
+    def _con_ana(self):
+        """Add a second professor who teaches a different materia in the same turno."""
+        self._create_basic_data()
+        db.session.add_all([
+            Persona(cedula="2", nombre="ana"),
+            Profesor(cedula="2", nombre="ana", nombre_completo="Ana Gomez"),
+            Materia(nombre="FIS101", nombre_completo="Física"),
+        ])
+        db.session.commit()
+        db.session.add(PuedeDictar(profesor="ana", materia="FIS101", turno="Mañana"))
+        db.session.commit()
+        reconstruir_progreso_envios()
+        reconstruir_demanda_bloques()
+
+    def test_demanda_bloques_incremental(self):
+        """Counters follow every write path and match a full rebuild."""
+        self._con_ana()
+        guardar_respuesta({1: 1, 2: 2}, "1")
+        guardar_respuesta({1: 1, 3: 3}, "2")
+        guardar_respuesta({1: 2, 3: 3}, "1")
+        aplicar_cambios_preferencias({3: 0, 4: 1}, "2", 1)
+
+        total = self._demanda()
+        self.assertEqual(total[1], (1, 1, 0, 0))
+        self.assertEqual(total[3], (0, 0, 1, 1))
+        self.assertEqual(total[4], (1, 0, 0, 1))
+        self.assertEqual(total[5], (0, 0, 0, 2))
+        self.assertEqual(self._demanda(materia="FIS101")[4], (1, 0, 0, 0))
+        self.assertEqual(self._demanda(materia="MAT101")[4], (0, 0, 0, 1))
+        self.assertEqual(self._demanda(turno="Mañana"), total)
+
+        app.config["SAID_ESCRITURA_DIFERIDA"] = True
+        try:
+            encolar_respuesta({5: 3}, "1")
+            self.assertEqual(self._demanda()[5], (0, 0, 0, 2))
+            aplicar_envios_pendientes()
+        finally:
+            app.config["SAID_ESCRITURA_DIFERIDA"] = False
+        self.assertEqual(self._demanda()[5], (0, 0, 1, 1))
+
+        filtros = ({}, {"materia": "FIS101"}, {"turno": "Mañana"})
+        incremental = [self._demanda(**filtro) for filtro in filtros]
+        reconstruir_demanda_bloques()
+        self.assertEqual([self._demanda(**filtro) for filtro in filtros], incremental)
+
+    def test_demanda_bloques_orden(self):
+        """Counter rows are written in primary key order, whatever the submission order."""
+        self._con_ana()
+        escritas = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO demanda_bloques"):
+                escritas.extend(fila for fila in context.compiled_parameters)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            guardar_respuesta({5: 3, 1: 2, 3: 1}, "1")
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        claves = [
+            tuple(fila[f"{columna}_m{i}"] for columna in ("dimension", "clave", "bloque_horario", "valor"))
+            for fila in escritas
+            for i in range(len(fila) // 5)
+        ]
+        self.assertTrue(claves)
+        self.assertEqual(claves, sorted(claves))
+
+    def test_demanda_bloques_grilla(self):
+        """In packed mode the counters come from the grids."""
+        self._con_ana()
+        app.config["SAID_ALMACENAMIENTO_PREFERENCIAS"] = "grilla"
+        try:
+            guardar_respuesta({1: 1, 2: 2}, "1")
+            guardar_respuesta({1: 3}, "2")
+            aplicar_cambios_preferencias({2: 0}, "1", 1)
+            incremental = self._demanda()
+            self.assertEqual(incremental[1], (1, 0, 1, 0))
+            self.assertEqual(incremental[2], (0, 0, 0, 2))
+            reconstruir_demanda_bloques()
+            self.assertEqual(self._demanda(), incremental)
+        finally:
+            app.config["SAID_ALMACENAMIENTO_PREFERENCIAS"] = "filas"
+
+    def test_demanda_bloques_consultas(self):
+        """The heatmap reads two small indexed queries once reference data is cached."""
+        self._con_ana()
+        invalidar_datos_referencia()
+        obtener_datos_referencia()
+        with self._count_queries() as statements:
+            obtener_demanda_bloques(turno="Mañana")
+        self.assertLessEqual(len(statements), 2)
+
 
 if __name__ == "__main__":
     unittest.main()
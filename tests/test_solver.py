@@ -0,0 +1,199 @@
+"""Tests for the timetable solver."""
+
+import os
+import unittest
+from datetime import datetime, time
+
+import numpy as np
+
+# Provide default environment so said.py can be imported without errors
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("POSTGRES_DB", "test")
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("SECRET_KEY", "testing")
+os.environ.setdefault("SAID_LIMITES", "off")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from said import app
+from entities import (
+    db,
+    Asignacion,
+    Persona,
+    Profesor,
+    Materia,
+    Horario,
+    BloqueHorario,
+    Turno,
+    TurnoHorario,
+    PuedeDictar,
+    Prioridad,
+)
+from services import limpiar_cache_referencia
+from solver import Problema, cargar_problema, guardar_asignaciones, resolver, resolver_profesor
+
+DIAS = ["lun", "mar", "mie", "jue", "vie"]
+
+
+class TestResolverProfesor(unittest.TestCase):
+    """Solve a single professor on a hand-built week of two blocks per day."""
+
+    def setUp(self):
+        # Columns 0-4 are the morning blocks of each day, 5-9 the afternoon ones
+        self.dias = np.array(list(range(5)) * 2, dtype=np.int8)
+        self.manana = np.array([True] * 5 + [False] * 5)
+
+    def test_picks_preferred_blocks_on_distinct_days(self):
+        """Each session of a group goes to the cheapest free block on a new day."""
+        costos = np.array([3, 1, 1, 3, 3, 1, 1, 1, 1, 1], dtype=np.int8)
+        asignadas, sin_asignar = resolver_profesor(costos, self.dias, self.manana[None, :], [1], False)
+        self.assertEqual(sin_asignar, 0)
+        self.assertEqual(sorted(b for _, _, b in asignadas), [1, 2])
+
+    def test_respects_turno_and_availability(self):
+        """Blocks outside the turno or marked unavailable are never used."""
+        costos = np.array([0, 0, 0, 2, 0, 1, 1, 1, 1, 1], dtype=np.int8)
+        asignadas, sin_asignar = resolver_profesor(costos, self.dias, self.manana[None, :], [2], False)
+        self.assertEqual(asignadas, [])
+        self.assertEqual(sin_asignar, 2)
+
+    def test_no_double_booking(self):
+        """Groups of different rows never share a block."""
+        costos = np.ones(10, dtype=np.int8)
+        mascaras = np.array([self.manana, self.manana])
+        asignadas, sin_asignar = resolver_profesor(costos, self.dias, mascaras, [2, 1], False)
+        bloques = [b for _, _, b in asignadas]
+        self.assertEqual(len(bloques), len(set(bloques)))
+        self.assertEqual(len(bloques), 4)
+        self.assertEqual(sin_asignar, 1)
+
+    def test_min_days_reuses_days(self):
+        """With min_max_dias a worse block on an already used day beats a new day."""
+        costos = np.array([1, 1, 3, 3, 3, 3, 3, 1, 1, 1], dtype=np.int8)
+        todos = np.ones((1, 10), dtype=bool)
+        asignadas, _ = resolver_profesor(costos, self.dias, np.repeat(todos, 2, axis=0), [1, 1], True)
+        self.assertEqual(len({int(self.dias[b]) for _, _, b in asignadas}), 2)
+        asignadas, _ = resolver_profesor(costos, self.dias, np.repeat(todos, 2, axis=0), [1, 1], False)
+        self.assertEqual(len({int(self.dias[b]) for _, _, b in asignadas}), 4)
+
+
+class TestResolver(unittest.TestCase):
+    """Solve a generated faculty serially and in worker processes."""
+
+    def test_parallel_matches_serial(self):
+        """Splitting professors across processes does not change the result."""
+        generador = np.random.default_rng(0)
+        dias = np.array(list(range(5)) * 4, dtype=np.int8)
+        membresia = np.array([[True] * 10 + [False] * 10, [False] * 10 + [True] * 10])
+        cantidad = 600
+        costos = generador.integers(0, 4, size=(cantidad, 20), dtype=np.int8)
+        grupos = [(p, "MAT101", p % 2, 1 + p % 3) for p in range(cantidad)]
+        problema = Problema(
+            tuple(f"p{p}" for p in range(cantidad)), np.arange(1, 21), dias, ("Mañana", "Tarde"),
+            membresia, costos, generador.random(cantidad) < 0.5, grupos,
+        )
+        serial = resolver(problema, procesos=1)
+        paralelo = resolver(problema, procesos=2)
+        self.assertEqual(serial, paralelo)
+        self.assertEqual(serial.grupos_asignados + serial.grupos_sin_asignar, sum(g[3] for g in grupos))
+
+    def test_invalid_sessions(self):
+        """A group cannot need more sessions than there are days."""
+        problema = Problema((), np.arange(0), np.zeros(0, dtype=np.int8), (), np.zeros((0, 0), dtype=bool),
+                            np.zeros((0, 0), dtype=np.int8), np.zeros(0, dtype=bool), [])
+        with self.assertRaises(ValueError):
+            resolver(problema, sesiones=6)
+
+
+class TestAsignarHorarios(unittest.TestCase):
+    """Load the problem from a temporary SQLite database and store the timetable."""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.ctx = app.app_context()
+        cls.ctx.push()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.ctx.pop()
+
+    def setUp(self):
+        db.create_all()
+        limpiar_cache_referencia()
+        db.session.add_all([
+            Turno(nombre="Mañana"),
+            Turno(nombre="Tarde"),
+            Horario(hora_inicio=time(8, 0), hora_fin=time(10, 0)),
+            Horario(hora_inicio=time(14, 0), hora_fin=time(16, 0)),
+            Materia(nombre="MAT101", nombre_completo="Matemática"),
+            Persona(cedula="1", nombre="prof1"),
+            Persona(cedula="2", nombre="prof2"),
+            Profesor(cedula="1", nombre="p1", nombre_completo="Profesor 1"),
+            Profesor(cedula="2", nombre="p2", nombre_completo="Profesor 2"),
+        ])
+        db.session.commit()
+        db.session.add_all([
+            TurnoHorario(hora_inicio=time(8, 0), hora_fin=time(10, 0), turno="Mañana"),
+            TurnoHorario(hora_inicio=time(14, 0), hora_fin=time(16, 0), turno="Tarde"),
+        ])
+        bloques = []
+        for i, dia in enumerate(DIAS):
+            bloques.append(BloqueHorario(id=i + 1, dia=dia, hora_inicio=time(8, 0), hora_fin=time(10, 0)))
+            bloques.append(BloqueHorario(id=i + 6, dia=dia, hora_inicio=time(14, 0), hora_fin=time(16, 0)))
+        db.session.add_all(bloques)
+        db.session.commit()
+        db.session.add_all([
+            PuedeDictar(profesor="p1", materia="MAT101", turno="Mañana", grupos_max=2),
+            PuedeDictar(profesor="p2", materia="MAT101", turno="Tarde", grupos_max=1),
+        ])
+        # p1 prefers Monday and Tuesday mornings; p2 never submitted preferences
+        db.session.add_all([
+            Prioridad(profesor="p1", bloque_horario=1, valor=1),
+            Prioridad(profesor="p1", bloque_horario=2, valor=1),
+            Prioridad(profesor="p1", bloque_horario=3, valor=2),
+            Prioridad(profesor="p1", bloque_horario=4, valor=3),
+            Prioridad(profesor="p1", bloque_horario=6, valor=1),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_load_problem(self):
+        """Preferences and turno blocks end up in the matrices."""
+        problema = cargar_problema()
+        self.assertEqual(problema.profesores, ("p1", "p2"))
+        self.assertEqual(problema.costos.shape, (2, 10))
+        self.assertEqual(int(problema.costos[0, list(problema.bloques).index(4)]), 3)
+        self.assertFalse(problema.costos[1].any())
+        manana = problema.membresia[problema.turnos.index("Mañana")]
+        self.assertEqual(sorted(int(b) for b in problema.bloques[manana]), [1, 2, 3, 4, 5])
+
+    def test_cli_stores_timetable(self):
+        """The CLI command replaces the asignaciones table with the solver output."""
+        db.session.add(Asignacion(profesor="p2", materia="MAT101", turno="Tarde", grupo=1,
+                                  bloque_horario=6, valor=1, generado=datetime(2024, 1, 1)))
+        db.session.commit()
+        resultado = app.test_cli_runner().invoke(args=["asignar-horarios", "--procesos", "1"])
+        self.assertEqual(resultado.exit_code, 0, resultado.output)
+        self.assertIn("Grupos asignados: 2", resultado.output)
+        self.assertIn("Grupos sin asignar: 1", resultado.output)
+
+        filas = db.session.execute(db.select(Asignacion).order_by(Asignacion.bloque_horario)).scalars().all()
+        self.assertEqual([(a.profesor, a.grupo, a.bloque_horario) for a in filas],
+                         [("p1", 1, 1), ("p1", 1, 2), ("p1", 2, 3), ("p1", 2, 4)])
+
+    def test_save_replaces_previous_run(self):
+        """Saving twice keeps only the latest timetable."""
+        resultado = resolver(cargar_problema(), procesos=1)
+        self.assertEqual(guardar_asignaciones(resultado), 4)
+        self.assertEqual(guardar_asignaciones(resultado), 4)
+        self.assertEqual(db.session.query(Asignacion).count(), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""Tests for the write-behind submission processor."""
+
+import json
+import os
+import unittest
+from unittest import mock
+from datetime import datetime, time
+
+# Provide default environment so said.py can be imported without errors
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("POSTGRES_DB", "test")
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("SECRET_KEY", "testing")
+os.environ.setdefault("SAID_LIMITES", "off")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from sqlalchemy.exc import OperationalError
+
+from said import app
+from entities import db, Persona, Profesor, BloqueHorario, EnvioPendiente, Prioridad
+from services import descartar_envio_pendiente, limpiar_cache_referencia
+from write_behind import ProcesadorEnvios, registrar_escritura_diferida
+
+
+class TestWriteBehind(unittest.TestCase):
+    """Drain the pending submissions of a temporary SQLite database."""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        cls.ctx = app.app_context()
+        cls.ctx.push()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.ctx.pop()
+
+    def setUp(self):
+        db.create_all()
+        limpiar_cache_referencia()
+        for i in range(3):
+            db.session.add(Persona(cedula=str(i), nombre=f"prof{i}"))
+            db.session.add(Profesor(cedula=str(i), nombre=f"p{i}", nombre_completo=f"Profesor {i}"))
+        db.session.add_all([
+            BloqueHorario(id=i, dia="lun", hora_inicio=time(8 + i, 0), hora_fin=time(9 + i, 0))
+            for i in range(1, 4)
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def _encolar(self, profesor, preferencias, minuto):
+        db.session.add(EnvioPendiente(
+            profesor=profesor,
+            envio=f"{profesor}-{minuto}",
+            preferencias=json.dumps(preferencias),
+            min_max_dias=False,
+            recibido=datetime(2025, 3, 1, 12, minuto),
+        ))
+        db.session.commit()
+
+    def test_failing_submission_is_discarded(self):
+        """A batch with a bad submission is retried one by one and the bad one dropped."""
+        self._encolar("p0", {"1": 2}, 0)
+        self._encolar("p1", {"2": 7}, 1)
+        self._encolar("p2", {"3": 1, "1": 3}, 2)
+        with self.assertLogs("said.escritura_diferida", level="ERROR"):
+            aplicados = ProcesadorEnvios(app, tamano_lote=10).procesar()
+        self.assertEqual(aplicados, 2)
+        self.assertEqual(EnvioPendiente.query.count(), 0)
+        self.assertEqual(
+            sorted(db.session.query(Prioridad.profesor, Prioridad.bloque_horario, Prioridad.valor)),
+            [("p0", 1, 2), ("p2", 1, 3), ("p2", 3, 1)],
+        )
+
+    def test_only_the_failing_submission_is_discarded(self):
+        """When the newer submission is corrupt the older, valid one is still applied."""
+        self._encolar("p0", {"1": 2}, 0)
+        self._encolar("p1", {"2": 7}, 1)
+        with self.assertLogs("said.escritura_diferida", level="ERROR") as logs:
+            aplicados = ProcesadorEnvios(app, tamano_lote=1).procesar()
+        self.assertEqual(aplicados, 1)
+        self.assertEqual(logs.records[0].envio_descartado["envio"], "p1-1")
+        self.assertEqual(EnvioPendiente.query.count(), 0)
+        self.assertEqual(sorted(db.session.query(Prioridad.profesor, Prioridad.bloque_horario, Prioridad.valor)),
+                         [("p0", 1, 2)])
+
+    def test_transient_database_error_keeps_submission(self):
+        """An OperationalError is propagated and the submission stays queued for a retry."""
+        self._encolar("p0", {"1": 2}, 0)
+        error = OperationalError("INSERT", {}, Exception("server closed the connection"))
+        with mock.patch("services.upsert_filas", side_effect=error):
+            with self.assertRaises(OperationalError):
+                ProcesadorEnvios(app, tamano_lote=10).procesar()
+        self.assertEqual([e.envio for e in EnvioPendiente.query], ["p0-0"])
+        self.assertEqual(ProcesadorEnvios(app, tamano_lote=10).procesar(), 1)
+        self.assertEqual(EnvioPendiente.query.count(), 0)
+
+    def test_discard_targets_exact_submission(self):
+        """Discarding deletes only the given row, never the oldest one in the queue."""
+        self._encolar("p0", {"1": 2}, 0)
+        self._encolar("p1", {"2": 7}, 1)
+        self.assertIsNone(descartar_envio_pendiente("p1", "p1-0"))
+        self.assertEqual(descartar_envio_pendiente("p1", "p1-1")["profesor"], "p1")
+        self.assertEqual([e.profesor for e in EnvioPendiente.query], ["p0"])
+
+    def test_disabled_registers_nothing(self):
+        from flask import Flask
+
+        otra = Flask(__name__)
+        self.assertIsNone(registrar_escritura_diferida(otra))
+        self.assertEqual(otra.before_request_funcs, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Procesador en segundo plano del modo de escritura diferida.
+
+Con ``SAID_ESCRITURA_DIFERIDA`` activo, ``/submit`` solo valida el envío y lo guarda en
+``envios_pendientes`` (ver ``services.encolar_respuesta``). Cada worker arranca, con su primer
+request, un hilo que aplica la cola en transacciones de hasta ``SAID_ESCRITURA_LOTE`` envíos y,
+cuando la cola queda vacía, espera ``SAID_ESCRITURA_INTERVALO`` segundos. Si un lote falla se
+reintenta de a un envío, y el envío que sigue fallando se descarta y se registra en el log.
+
+``flask --app said procesar-envios`` vacía la cola desde la línea de comandos, por ejemplo
+antes de exportar al cierre del período.
+"""
+
+import logging
+import os
+import threading
+
+from entities import db
+from services import EnvioPendienteInvalido, aplicar_envios_pendientes, descartar_envio_pendiente
+
+logger = logging.getLogger('said.escritura_diferida')
+
+
+class ProcesadorEnvios:
+    """Hilo que aplica los envíos pendientes de una aplicación."""
+
+    def __init__(self, app, tamano_lote=100, intervalo=0.5):
+        self.app = app
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pid = None
+
+    def iniciar(self):
+        """Arranca el hilo si no está corriendo en este proceso (por ejemplo, después de un fork)."""
+        if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+            return
+        self._pid = os.getpid()
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name='said-escritura-diferida', daemon=True)
+        self._hilo.start()
+
+    def detener(self, espera=None):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(espera)
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                aplicados = self.procesar()
+            except Exception:
+                logger.exception("Error inesperado al aplicar envíos pendientes")
+                aplicados = 0
+            if not aplicados:
+                self._detener.wait(self.intervalo)
+
+    def procesar(self) -> int:
+        """
+        Aplica envíos hasta vaciar la cola.
+
+        :return: La cantidad de envíos aplicados.
+        """
+        total = 0
+        with self.app.app_context():
+            while True:
+                try:
+                    aplicados = aplicar_envios_pendientes(self.tamano_lote)
+                except Exception:
+                    db.session.rollback()
+                    logger.warning("Falló un lote de envíos pendientes; se reintenta de a uno", exc_info=True)
+                    aplicados = self._aplicar_uno()
+                    if aplicados is None:
+                        continue
+                if not aplicados:
+                    return total
+                total += aplicados
+
+    def _aplicar_uno(self):
+        """Aplica el envío más antiguo; si falla descarta ese mismo envío y devuelve None."""
+        try:
+            return aplicar_envios_pendientes(1)
+        except EnvioPendienteInvalido as error:
+            descartado = descartar_envio_pendiente(error.profesor, error.envio)
+            if descartado is not None:
+                logger.error("Se descartó un envío pendiente que no pudo aplicarse", exc_info=True,
+                             extra={"envio_descartado": descartado})
+            return None
+
+
+def registrar_escritura_diferida(app):
+    """
+    Crea el procesador de envíos si ``SAID_ESCRITURA_DIFERIDA`` está activo.
+
+    El hilo se arranca en el primer request de cada proceso, para que los workers creados
+    con fork tengan el suyo.
+
+    :return: El procesador, o None si el modo está desactivado.
+    """
+    if not app.config.get('SAID_ESCRITURA_DIFERIDA'):
+        return None
+    procesador = ProcesadorEnvios(
+        app,
+        tamano_lote=int(app.config.get('SAID_ESCRITURA_LOTE') or 100),
+        intervalo=float(app.config.get('SAID_ESCRITURA_INTERVALO') or 0.5),
+    )
+
+    @app.before_request
+    def iniciar_procesador():
+        procesador.iniciar()
+
+    return procesador